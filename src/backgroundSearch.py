@@ -0,0 +1,122 @@
+"""
+    The AI's search in a background thread, so the game window keeps drawing and answering events while it thinks.
+    The search works on its own copy of the game state and is cancelled through a threading.Event (the cancel token),
+    the main loop asks for the move every frame with getMove.
+
+    While the human thinks the AI can ponder : it guesses the human's reply (the best reply its last search found,
+    from the transposition table) and searches the position after it without a time limit. If the human plays that
+    move the running search simply becomes the AI's search and gets a deadline, so the pondering time isn't lost,
+    otherwise it is cancelled and a normal search starts (the transposition table still keeps what it found).
+
+    ai = BackgroundSearch(transpositionTable, timeLimit = 2)
+    ai.think(gs)
+    ...
+    move = ai.getMove() # None while it is still thinking
+"""
+import threading
+import time
+
+import smartMoveFinder
+from smartMoveFinder import Search, MAX_DEPTH
+
+
+class BackgroundSearch():
+    def __init__(self, transpositionTable, timeLimit, bitbases = None, parallelAI = None):
+        self.transpositionTable = transpositionTable
+        self.timeLimit = timeLimit
+        self.bitbases = bitbases
+        self.parallelAI = parallelAI # a parallelSearch.ParallelSearch to search with instead, it doesn't ponder
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.search = None # Search object of the running search
+        self.validMoves = []
+        self.result = None # SearchResult, set by the thread when it is done
+        self.startTime = 0
+        self.ponderMove = None # packed human move the running search is pondering on
+
+    '''
+        True while it is searching for its own move, a search that is only pondering doesn't count
+    '''
+    def isThinking(self):
+        return self.thread is not None and self.ponderMove is None
+
+    def isPondering(self):
+        return self.thread is not None and self.ponderMove is not None
+
+    '''
+        Start searching for the move of the side to move of gs
+    '''
+    def think(self, gs):
+        self.cancel()
+        self.startSearch(gs.copyForSearch(), self.timeLimit)
+
+    '''
+        The AI's move once the search is done, None while it is still thinking
+    '''
+    def getMove(self):
+        if not self.isThinking() or self.thread.is_alive():
+            return None
+        self.thread.join()
+        self.thread = None
+        self.search = None
+        move = self.result.move if self.result is not None else None
+        return move if move is not None else smartMoveFinder.findRandomMove(self.validMoves)
+
+    '''
+        Guess the reply of the side to move of gs and start searching the position after it.
+        Does nothing if there is no guess or that reply ends the game
+    '''
+    def ponder(self, gs, validMoves):
+        if self.parallelAI is not None:
+            return
+        self.cancel()
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        if entry is None or entry[4] is None or entry[4] not in [move.packed for move in validMoves]:
+            return
+        position = gs.copyForSearch()
+        position.makePackedMove(entry[4])
+        if not position.getValidPackedMoves():
+            return
+        self.startSearch(position, None)
+        self.ponderMove = entry[4]
+
+    '''
+        Tell the AI which move the human played. The pondering search goes on as the AI's search if it was the
+        expected move, it gets the thinking time that is left counting from when it started pondering
+    '''
+    def humanMoved(self, move):
+        if not self.isPondering():
+            return
+        if move.packed != self.ponderMove:
+            self.cancel()
+            return
+        self.ponderMove = None
+        self.search.deadline = max(self.startTime + self.timeLimit, time.perf_counter())
+
+    '''
+        Stop whatever is running and forget its result
+    '''
+    def cancel(self):
+        if self.thread is not None:
+            self.stopEvent.set()
+            self.thread.join()
+        self.thread = None
+        self.search = None
+        self.result = None
+        self.ponderMove = None
+
+    def startSearch(self, gs, timeLimit):
+        stopEvent = self.stopEvent = threading.Event() # a new token, so setting the old one can't stop this search
+        validMoves = self.validMoves = gs.getValidMoves()
+        self.result = None
+        self.startTime = time.perf_counter()
+        if self.parallelAI is not None:
+            search, args = self.parallelAI.search, (gs, validMoves, MAX_DEPTH, timeLimit, stopEvent)
+        else:
+            self.search = Search(gs, self.transpositionTable, timeLimit, None, stopEvent, self.bitbases)
+            search, args = self.search.iterativeDeepening, (validMoves, MAX_DEPTH)
+        self.thread = threading.Thread(target = self.run, args = (search, args), daemon = True)
+        self.thread.start()
+
+    def run(self, search, args):
+        self.result = search(*args)
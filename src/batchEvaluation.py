@@ -0,0 +1,131 @@
+"""
+    Evaluation of many positions at once with NumPy, for analysing games and fitting evaluation weights.
+    A batch of N positions is an int8 array of shape (N, 64) holding the index in chessEngine.PIECES of the piece on
+    every square (row*8 + col, 0 for an empty square), toPlanes turns it into (N, 12, 64) one-hot planes.
+    Every function gives exactly the same numbers as its scalar version in evaluation.py :
+        scoreBatch      evaluation.scoreBoard
+        evaluateBatch   evaluation.evaluateBoard
+        mobilityBatch   evaluation.mobilityCounts
+    Needs numpy (pip install numpy), nothing else in the engine does.
+"""
+import numpy as np
+
+import chessEngine
+from chessEngine import PIECES, PIECE_INDEX
+from evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE_WEIGHTS, TOTAL_PHASE, MOBILITY_PIECES, \
+    MOBILITY_WEIGHTS, MOBILITY_DIRECTIONS
+
+# score of every piece index on every square, row 0 (empty square) is all zeros
+MIDGAME_ARRAY = np.array([[0]*64] + [MIDGAME_SCORES[piece] for piece in PIECES[1:]], dtype = np.int32)
+ENDGAME_ARRAY = np.array([[0]*64] + [ENDGAME_SCORES[piece] for piece in PIECES[1:]], dtype = np.int32)
+PHASE_ARRAY = np.array([0] + [PHASE_WEIGHTS[piece[1]] for piece in PIECES[1:]], dtype = np.int32)
+SQUARES = np.arange(64)
+WHITE_PIECES = [PIECE_INDEX['w' + piece] for piece in 'PNBRQK']
+BLACK_PIECES = [PIECE_INDEX['b' + piece] for piece in 'PNBRQK']
+
+
+"""
+    Squares from which one step in the direction stays on the board, as a 64 bit mask
+"""
+def sourceMask(dRow, dCol):
+    mask = 0
+    for sq in range(64):
+        if 0 <= sq//8 + dRow < 8 and 0 <= sq%8 + dCol < 8:
+            mask |= 1 << sq
+    return np.uint64(mask)
+
+
+# a step in a direction is a shift of the bitboard by 8*dRow + dCol once the squares that would leave the board are masked
+DIRECTION_STEPS = {direction : (sourceMask(*direction), direction[0]*8 + direction[1])
+                   for directions in MOBILITY_DIRECTIONS.values() for direction in directions}
+SQUARE_BITS = np.uint64(1) << np.arange(64, dtype = np.uint64)
+
+
+def step(bitboards, direction):
+    mask, shift = DIRECTION_STEPS[direction]
+    if shift > 0:
+        return (bitboards & mask) << np.uint64(shift)
+    return (bitboards & mask) >> np.uint64(-shift)
+
+
+def popcount(bitboards):
+    if hasattr(np, "bitwise_count"): # numpy 2.0 and later
+        return np.bitwise_count(bitboards).astype(np.int64)
+    return np.unpackbits(bitboards.view(np.uint8).reshape(-1, 8), axis = 1).sum(axis = 1).astype(np.int64)
+
+
+"""
+    uint64 bitboards (bit row*8 + col) of the squares where mask is True, one per position
+"""
+def toBitboards(mask):
+    return np.bitwise_or.reduce(np.where(mask, SQUARE_BITS, np.uint64(0)), axis = 1)
+
+
+"""
+    (N, 64) int8 array of a list of GameStates or 2D boards
+"""
+def encodeBoards(positions):
+    codes = np.empty((len(positions), 64), dtype = np.int8)
+    for i, position in enumerate(positions):
+        board = position.board if isinstance(position, chessEngine.GameState) else position
+        codes[i] = [PIECE_INDEX[piece] for row in board for piece in row]
+    return codes
+
+
+"""
+    One-hot (N, 12, 64) int8 planes, plane k holds the piece PIECES[k + 1]
+"""
+def toPlanes(codes):
+    return (codes[:, None, :] == np.arange(1, 13, dtype = np.int8)[None, :, None]).astype(np.int8)
+
+
+"""
+    Midgame scores, endgame scores and phases of the batch, three int arrays of length N
+"""
+def scoreBatch(codes):
+    codes = codes.astype(np.intp)
+    midgameScores = MIDGAME_ARRAY[codes, SQUARES].sum(axis = 1)
+    endgameScores = ENDGAME_ARRAY[codes, SQUARES].sum(axis = 1)
+    phases = PHASE_ARRAY[codes].sum(axis = 1)
+    return midgameScores, endgameScores, phases
+
+
+def taperedBatch(midgameScores, endgameScores, phases):
+    phases = np.minimum(phases, TOTAL_PHASE)
+    return (midgameScores*phases + endgameScores*(TOTAL_PHASE - phases)) // TOTAL_PHASE # floors like the scalar //
+
+
+"""
+    Material and piece-square score in centipawns, positive when white is better, plus the weighted
+    mobility (evaluation.mobilityScore) if mobility is True
+"""
+def evaluateBatch(codes, mobility = False):
+    scores = taperedBatch(*scoreBatch(codes))
+    if mobility:
+        counts = mobilityBatch(codes)
+        scores = scores + counts @ np.array([MOBILITY_WEIGHTS[piece] for piece in MOBILITY_PIECES])
+    return scores
+
+
+"""
+    (N, len(MOBILITY_PIECES)) array of white's minus black's mobility of every piece type, like mobilityCounts.
+    Every position is turned into bitboards and a whole direction is stepped at once, a step moves every piece of the
+    bitboard to a different square so the popcount of the squares reached counts every (piece, square) pair once
+"""
+def mobilityBatch(codes):
+    empty = toBitboards(codes == 0)
+    counts = np.zeros((len(codes), len(MOBILITY_PIECES)), dtype = np.int64)
+    for color, sign, pieceIndexes in (('w', 1, WHITE_PIECES), ('b', -1, BLACK_PIECES)):
+        notOwn = ~toBitboards(np.isin(codes, pieceIndexes))
+        pawns = toBitboards(codes == PIECE_INDEX[color + 'P'])
+        counts[:, 0] += sign*popcount(step(pawns, (-1, 0) if color == 'w' else (1, 0)) & empty)
+        for column, piece in enumerate(MOBILITY_PIECES[1:], 1):
+            pieces = toBitboards(codes == PIECE_INDEX[color + piece])
+            for direction in MOBILITY_DIRECTIONS[piece]:
+                rays = step(pieces, direction)
+                counts[:, column] += sign*popcount(rays & notOwn)
+                if piece != 'N': # sliders go on through empty squares
+                    for _ in range(6):
+                        rays = step(rays & empty, direction)
+                        counts[:, column] += sign*popcount(rays & notOwn)
+    return counts
@@ -0,0 +1,268 @@
+"""
+    Endgame bitbases : the exact result of every position of the king and queen, king and rook and king and pawn
+    against king endgames (KQK, KRK, KPK). A fixed depth search can't see the mate (or the promotion) at the end of
+    these endgames and only shuffles the pieces, with the bitbases the search knows the result as soon as it gets there.
+
+    The tables are generated offline by retrograde analysis with the engine's own move generation : from the mates
+    backwards, a position is won when one of its moves reaches a lost position and lost when all of its moves reach
+    won positions, everything left is a draw. Every table holds all 2*64*64*64 (side to move, white king, piece,
+    black king) placements with white as the stronger side, and is written bit-packed to <name>.wdl (2 bits per
+    position : DRAW, WIN or LOSS for the side to move) and, unless --no-dtm is given, <name>.dtm (the distance to mate
+    in plies, 1 byte per position). Probing memory maps the files, so loading them reads nothing.
+
+    python bitbases.py                      generate every table into ./bitbases (a few minutes)
+    python bitbases.py KQK KRK -o DIR       only some tables, into another directory
+"""
+import argparse
+import mmap
+import os
+import sys
+import time
+from array import array
+
+import chessEngine
+from chessEngine import PROMOTION_MOVE, PROMOTION_PIECES, KING_MASKS
+from smartMoveFinder import CHECKMATE
+
+# table name and the piece white has besides its king, KPK promotes into KQK and KRK so they are generated first
+TABLES = {'KQK' : 'Q', 'KRK' : 'R', 'KPK' : 'P'}
+DRAW = 0
+WIN = 1
+LOSS = 2
+POSITIONS = 2*64*64*64
+MAX_DTM = 255
+KNOWN_WIN = 20000 # score of a won position when there is no distance to mate table
+DEFAULT_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bitbases")
+
+
+"""
+    Position of a table entry, squares are row*8 + col like everywhere else in the engine
+"""
+def tableIndex(blackToMove, whiteKing, piece, blackKing):
+    return ((blackToMove*64 + whiteKing)*64 + piece)*64 + blackKing
+
+
+"""
+    Result (DRAW, WIN or LOSS for the side to move) and distance to mate in plies of every position of a table,
+    as two bytearrays of POSITIONS entries. promotionTables gives the generated (results, dtm) of the table a
+    pawn promotes into by the promotion piece, other promotions count as draws
+"""
+def generateTable(piece, promotionTables = None):
+    gs = chessEngine.GameState()
+    gs.board = [["--"]*8 for _ in range(8)]
+    gs.castlingRights = 0
+    gs.enPassantPossible = ()
+    whitePiece = 'w' + piece
+    results = bytearray(POSITIONS)
+    dtm = bytearray(POSITIONS)
+    resolved = bytearray(POSITIONS)
+    unresolvedMoves = array('H', [0])*POSITIONS # moves of a black position not yet known to lose
+    parents = array('l') # (child, parent) pairs of all the moves, sorted by child below
+    children = array('l')
+    buckets = [[] for _ in range(MAX_DTM + 1)] # positions to look at by distance to mate
+
+    for index in range(POSITIONS):
+        blackToMove, rest = divmod(index, 64*64*64)
+        whiteKing, rest = divmod(rest, 64*64)
+        pieceSquare, blackKing = divmod(rest, 64)
+        if whiteKing == pieceSquare or pieceSquare == blackKing or (KING_MASKS[whiteKing] >> blackKing) & 1:
+            continue
+        if piece == 'P' and not 8 <= pieceSquare < 56: # no pawns on the first and last rows
+            continue
+        board = gs.board
+        board[whiteKing >> 3][whiteKing & 7] = "wK"
+        board[pieceSquare >> 3][pieceSquare & 7] = whitePiece
+        board[blackKing >> 3][blackKing & 7] = "bK"
+        gs.whiteKingLocation = (whiteKing >> 3, whiteKing & 7)
+        gs.blackKingLocation = (blackKing >> 3, blackKing & 7)
+        gs.whiteToMove = not blackToMove
+        # white to move with the black king in check can't happen
+        if blackToMove or not gs.isSquareAttacked(blackKing >> 3, blackKing & 7, 'w'):
+            moves = gs.getValidPackedMoves()
+            if not moves and blackToMove and gs.inCheck:
+                results[index] = LOSS
+                resolved[index] = 1
+                buckets[0].append(index)
+            for move in moves:
+                start = move & 63
+                end = (move >> 6) & 63
+                if blackToMove:
+                    unresolvedMoves[index] += 1
+                    if not (move >> 16) & 15: # taking the piece is a draw, so it is never resolved
+                        children.append(tableIndex(0, whiteKing, pieceSquare, end))
+                        parents.append(index)
+                elif (move >> 20) & 3 == PROMOTION_MOVE:
+                    table = (promotionTables or {}).get(PROMOTION_PIECES[(move >> 22) & 3])
+                    if table is not None:
+                        child = tableIndex(1, whiteKing, end, blackKing)
+                        if table[0][child] == LOSS and table[1][child] < MAX_DTM:
+                            buckets[table[1][child] + 1].append(index)
+                elif start == whiteKing:
+                    children.append(tableIndex(1, end, pieceSquare, blackKing))
+                    parents.append(index)
+                else:
+                    children.append(tableIndex(1, whiteKing, end, blackKing))
+                    parents.append(index)
+        board[whiteKing >> 3][whiteKing & 7] = "--"
+        board[pieceSquare >> 3][pieceSquare & 7] = "--"
+        board[blackKing >> 3][blackKing & 7] = "--"
+
+    # parents of every position, grouped by child (a counting sort)
+    starts = array('l', [0])*(POSITIONS + 1)
+    for child in children:
+        starts[child + 1] += 1
+    for index in range(POSITIONS):
+        starts[index + 1] += starts[index]
+    sortedParents = array('l', [0])*len(parents)
+    filled = array('l', starts)
+    for child, parent in zip(children, parents):
+        sortedParents[filled[child]] = parent
+        filled[child] += 1
+    del children, parents, filled
+
+    # from the mates backwards, in order of distance to mate so the first one found is the shortest
+    for distance in range(MAX_DTM + 1):
+        for index in buckets[distance]:
+            if index < POSITIONS // 2: # white to move, the first time it is reached is its shortest win
+                if resolved[index]:
+                    continue
+                resolved[index] = 1
+                results[index] = WIN
+            dtm[index] = distance
+            for parent in sortedParents[starts[index] : starts[index + 1]]:
+                if resolved[parent] or distance == MAX_DTM:
+                    continue
+                if parent < POSITIONS // 2:
+                    buckets[distance + 1].append(parent)
+                else: # black loses once every move is known to lose, the last one found is the longest
+                    unresolvedMoves[parent] -= 1
+                    if unresolvedMoves[parent] == 0:
+                        resolved[parent] = 1
+                        results[parent] = LOSS
+                        buckets[distance + 1].append(parent)
+        buckets[distance] = None
+    return results, dtm
+
+
+"""
+    Results as 2 bits per position, 4 positions per byte
+"""
+def packResults(results):
+    packed = bytearray(len(results) // 4)
+    for index in range(0, len(results), 4):
+        packed[index >> 2] = results[index] | results[index + 1] << 2 | results[index + 2] << 4 | results[index + 3] << 6
+    return packed
+
+
+def generate(names, directory, withDTM = True):
+    os.makedirs(directory, exist_ok = True)
+    generated = {}
+    for name in TABLES:
+        if name not in names and not (name in ('KQK', 'KRK') and 'KPK' in names):
+            continue
+        startTime = time.perf_counter()
+        promotionTables = {piece : generated[table] for table, piece in (('KQK', 'Q'), ('KRK', 'R')) if table in generated}
+        results, dtm = generateTable(TABLES[name], promotionTables)
+        generated[name] = results, dtm
+        if name not in names:
+            continue
+        with open(os.path.join(directory, name + ".wdl"), "wb") as file:
+            file.write(packResults(results))
+        if withDTM:
+            with open(os.path.join(directory, name + ".dtm"), "wb") as file:
+                file.write(dtm)
+        print(f"{name}  {results.count(WIN)} wins  {results.count(LOSS)} losses  longest mate {max(dtm)} plies  "
+              f"{time.perf_counter() - startTime:.1f}s")
+
+
+class Bitbases():
+    def __init__(self, directory = DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.tables = {} # white's piece -> (wdl map, dtm map or None) of the tables found in the directory
+        for name, piece in TABLES.items():
+            wdl = self.mapFile(os.path.join(directory, name + ".wdl"), POSITIONS // 4)
+            if wdl is not None:
+                self.tables[piece] = (wdl, self.mapFile(os.path.join(directory, name + ".dtm"), POSITIONS))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    @staticmethod
+    def mapFile(path, size):
+        if not os.path.exists(path):
+            return None
+        with open(path, "rb") as file:
+            if os.fstat(file.fileno()).st_size != size:
+                raise ValueError(f"{path} isn't a bitbase, it should be {size} bytes")
+            return mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+
+    def close(self):
+        for wdl, dtm in self.tables.values():
+            wdl.close()
+            if dtm is not None:
+                dtm.close()
+        self.tables = {}
+
+    '''
+        (result for the side to move, distance to mate in plies or None) of a position of the tables, None for any
+        other position. Cheap for positions with more pieces, the phase and number of pieces rule them out first
+    '''
+    def probe(self, gs):
+        if not self.tables or gs.phase > 4 or sum(row.count("--") for row in gs.board) != 61:
+            return None
+        if gs.castlingRights:
+            return None
+        piece = None
+        for row in range(8):
+            for col in range(8):
+                name = gs.board[row][col]
+                if name != "--" and name[1] != 'K':
+                    piece, pieceSquare = name, row*8 + col
+        if piece is None or piece[1] not in self.tables:
+            return None
+        whiteKing = gs.whiteKingLocation[0]*8 + gs.whiteKingLocation[1]
+        blackKing = gs.blackKingLocation[0]*8 + gs.blackKingLocation[1]
+        blackToMove = not gs.whiteToMove
+        if piece[0] == 'b': # mirror the rows and swap the colors so the stronger side is white
+            whiteKing, blackKing = blackKing ^ 56, whiteKing ^ 56
+            pieceSquare ^= 56
+            blackToMove = not blackToMove
+        wdl, dtm = self.tables[piece[1]]
+        index = tableIndex(blackToMove, whiteKing, pieceSquare, blackKing)
+        result = (wdl[index >> 2] >> ((index & 3)*2)) & 3
+        return result, (dtm[index] if dtm is not None else None)
+
+    '''
+        Search score of the position for the side to move when it is ply plies from the root, mate scores like the
+        search's own when the distance to mate is known. None when the tables don't have the position
+    '''
+    def probeScore(self, gs, ply):
+        found = self.probe(gs)
+        if found is None:
+            return None
+        result, distance = found
+        if result == DRAW:
+            return 0
+        if distance is None:
+            return KNOWN_WIN if result == WIN else -KNOWN_WIN
+        return CHECKMATE - ply - distance if result == WIN else -CHECKMATE + ply + distance
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate the endgame bitbases")
+    parser.add_argument("tables", nargs = "*", help = f"tables to generate out of {', '.join(TABLES)} (default : all)")
+    parser.add_argument("-o", "--output", default = DEFAULT_DIRECTORY, help = "directory to write the tables to")
+    parser.add_argument("--no-dtm", action = "store_true", help = "only write the win/draw/loss tables")
+    args = parser.parse_args(argv)
+    for name in args.tables:
+        if name not in TABLES:
+            parser.error(f"unknown table {name}")
+    generate(args.tables or list(TABLES), args.output, not args.no_dtm)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
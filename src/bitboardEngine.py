@@ -0,0 +1,357 @@
+"""
+    Bitboard backend for the GameState.
+    Every piece type of every color is stored as a 64 bit integer in which bit (row*8 + col) is set when that piece
+    stands on (row, col), so a8 is bit 0 and h1 is bit 63 (the same order as the 2D board list).
+    Attacks of knights, kings and pawns are looked up from precomputed tables and sliding piece attacks are found
+    with precomputed rays, so move generation doesn't have to walk the board square by square.
+    The 2D board is still kept up to date so that chessMain and Move work exactly like before.
+"""
+import chessEngine
+from chessEngine import PIECES, PIECE_INDEX, EN_PASSANT_MOVE, CASTLE_MOVE, PROMOTION_MOVE, PROMOTION_PIECES, \
+    WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE
+
+
+# ray directions as (rowStep, colStep), the first four are orthogonal and the last four are diagonal
+DIRECTIONS = [(-1,0) , (1,0) , (0,-1) , (0,1) , (-1,-1) , (-1,1) , (1,-1) , (1,1)]
+ROOK_DIRECTIONS = [0 , 1 , 2 , 3]
+BISHOP_DIRECTIONS = [4 , 5 , 6 , 7]
+# a ray goes towards the higher square indices if it is heading down the board or right along the row
+POSITIVE_DIRECTIONS = [d[0] > 0 or (d[0] == 0 and d[1] > 0) for d in DIRECTIONS]
+
+
+def onBoard(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def jumpAttacks(offsets):
+    table = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for dRow, dCol in offsets:
+            if onBoard(row + dRow, col + dCol):
+                bb |= 1 << ((row + dRow)*8 + col + dCol)
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = jumpAttacks([(-2,-1) , (-2,1) , (2,-1) , (2,1) , (1,2) , (1,-2) , (-1,2) , (-1,-2)])
+KING_ATTACKS = jumpAttacks(DIRECTIONS)
+# squares attacked by a pawn of the given color standing on a square
+PAWN_ATTACKS = {'w' : jumpAttacks([(-1,-1) , (-1,1)]), 'b' : jumpAttacks([(1,-1) , (1,1)])}
+
+# RAYS[d][sq] is every square reachable from sq in direction d on an empty board
+RAYS = []
+for dRow, dCol in DIRECTIONS:
+    rays = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        bb = 0
+        for i in range(1, 8):
+            if not onBoard(row + dRow*i, col + dCol*i):
+                break
+            bb |= 1 << ((row + dRow*i)*8 + col + dCol*i)
+        rays.append(bb)
+    RAYS.append(rays)
+
+# BETWEEN[a][b] is the squares strictly between a and b if they share a row, column or diagonal, else 0
+BETWEEN = [[0]*64 for _ in range(64)]
+for sq in range(64):
+    for d in range(8):
+        ray = RAYS[d][sq]
+        while ray:
+            bit = ray & -ray
+            target = bit.bit_length() - 1
+            ray ^= bit
+            BETWEEN[sq][target] = RAYS[d][sq] & ~RAYS[d][target] & ~bit
+
+FULL_BOARD = (1 << 64) - 1
+ROW_MASKS = [0xFF << (row*8) for row in range(8)]
+FILE_MASKS = [sum(1 << (row*8 + col) for row in range(8)) for col in range(8)]
+PROMOTION_ROWS = ROW_MASKS[0] | ROW_MASKS[7]
+
+CASTLE_ROOK_MOVES = {(7,6) : (7,7 , 7,5), (7,2) : (7,0 , 7,3), (0,6) : (0,7 , 0,5), (0,2) : (0,0 , 0,3)}
+
+
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[d]:
+                blocker = (blockers & -blockers).bit_length() - 1
+            else:
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker] # everything behind the first blocker is hidden
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+def squares(bb):
+    while bb:
+        bit = bb & -bb
+        yield bit.bit_length() - 1
+        bb ^= bit
+
+
+class BitboardGameState(chessEngine.GameState):
+    def __init__(self):
+        super().__init__()
+        self.loadBitboards()
+
+    '''
+        Build the bitboards from the 2D board
+    '''
+    def loadBitboards(self):
+        self.pieces = {color + piece : 0 for color in 'wb' for piece in 'PNBRQK'}
+        self.colors = {'w' : 0, 'b' : 0}
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    self.pieces[piece] |= 1 << (row*8 + col)
+                    self.colors[piece[0]] |= 1 << (row*8 + col)
+
+    def loadFEN(self, fen):
+        super().loadFEN(fen)
+        self.loadBitboards()
+
+    def makePackedMove(self, move):
+        super().makePackedMove(move)
+        self.toggleMove(move)
+
+    def undoMove(self):
+        if len(self.packedMovesLog) != 0:
+            move = self.packedMovesLog[-1]
+            super().undoMove()
+            self.toggleMove(move)
+
+    '''
+        Every change a move makes to the bitboards is a xor, so playing a move and taking it back are the same operation
+    '''
+    def toggleMove(self, move):
+        startSq = move & 63
+        endSq = (move >> 6) & 63
+        pieceMoved = PIECES[(move >> 12) & 15]
+        pieceCaptured = PIECES[(move >> 16) & 15]
+        kind = (move >> 20) & 3
+        color = pieceMoved[0]
+        start = 1 << startSq
+        end = 1 << endSq
+        self.pieces[pieceMoved] ^= start
+        self.pieces[color + PROMOTION_PIECES[(move >> 22) & 3] if kind == PROMOTION_MOVE else pieceMoved] ^= end
+        self.colors[color] ^= start | end
+        if pieceCaptured != "--":
+            captured = 1 << ((startSq & 56) | (endSq & 7)) if kind == EN_PASSANT_MOVE else end
+            self.pieces[pieceCaptured] ^= captured
+            self.colors[pieceCaptured[0]] ^= captured
+        if kind == CASTLE_MOVE:
+            rookStartRow, rookStartCol, rookEndRow, rookEndCol = CASTLE_ROOK_MOVES[(endSq >> 3, endSq & 7)]
+            rook = (1 << (rookStartRow*8 + rookStartCol)) | (1 << (rookEndRow*8 + rookEndCol))
+            self.pieces[color + 'R'] ^= rook
+            self.colors[color] ^= rook
+
+    '''
+        All the squares holding an enemy piece that attacks sq, given the occupancy of the board
+    '''
+    def attackersTo(self, sq, enemy, occupied):
+        pieces = self.pieces
+        ourColor = 'b' if enemy == 'w' else 'w'
+        return ((KNIGHT_ATTACKS[sq] & pieces[enemy + 'N']) | (KING_ATTACKS[sq] & pieces[enemy + 'K'])
+                | (PAWN_ATTACKS[ourColor][sq] & pieces[enemy + 'P'])
+                | (rookAttacks(sq, occupied) & (pieces[enemy + 'R'] | pieces[enemy + 'Q']))
+                | (bishopAttacks(sq, occupied) & (pieces[enemy + 'B'] | pieces[enemy + 'Q'])))
+
+    '''
+        Every square attacked by enemy, the king of the other color is taken out of the occupancy so that squares
+        behind it on a checking ray count as attacked. Computed once per position for king moves and castling
+    '''
+    def getAttackMap(self, enemy, occupied = None):
+        pieces = self.pieces
+        if occupied is None:
+            ourColor = 'b' if enemy == 'w' else 'w'
+            occupied = (self.colors['w'] | self.colors['b']) ^ pieces[ourColor + 'K']
+        pawns = pieces[enemy + 'P']
+        if enemy == 'w':
+            attacks = ((pawns & ~FILE_MASKS[0]) >> 9) | ((pawns & ~FILE_MASKS[7]) >> 7)
+        else:
+            attacks = ((pawns & ~FILE_MASKS[0]) << 7) | ((pawns & ~FILE_MASKS[7]) << 9)
+        for sq in squares(pieces[enemy + 'N']):
+            attacks |= KNIGHT_ATTACKS[sq]
+        attacks |= KING_ATTACKS[pieces[enemy + 'K'].bit_length() - 1]
+        for sq in squares(pieces[enemy + 'B'] | pieces[enemy + 'Q']):
+            attacks |= bishopAttacks(sq, occupied)
+        for sq in squares(pieces[enemy + 'R'] | pieces[enemy + 'Q']):
+            attacks |= rookAttacks(sq, occupied)
+        return attacks
+
+    '''
+        All moves considering checks as packed ints, same moves as chessEngine.GameState.generateValidPackedMoves
+    '''
+    def generateValidPackedMoves(self):
+        return self.generatePackedMoves()
+
+    '''
+        Only the captures and promotions, same moves as chessEngine.GameState.getCapturePackedMoves
+    '''
+    def getCapturePackedMoves(self):
+        return self.generatePackedMoves(quiets = False)
+
+    '''
+        Only the moves that neither capture nor promote, same moves as chessEngine.GameState.getQuietPackedMoves
+    '''
+    def getQuietPackedMoves(self):
+        return self.generatePackedMoves(captures = False)
+
+    '''
+        The valid moves that capture or promote if captures is True and the other ones if quiets is True
+    '''
+    def generatePackedMoves(self, captures = True, quiets = True):
+        ourColor, enemy = ('w', 'b') if self.whiteToMove else ('b', 'w')
+        pieces = self.pieces
+        board = self.board
+        own = self.colors[ourColor]
+        enemies = self.colors[enemy]
+        occupied = own | enemies
+        kingSq = pieces[ourColor + 'K'].bit_length() - 1
+        kingSquare = divmod(kingSq, 8)
+        king = kingSq | PIECE_INDEX[ourColor + 'K'] << 12
+        checkers = self.attackersTo(kingSq, enemy, occupied)
+        self.inCheck = checkers != 0
+        moves = []
+
+        # king moves, the king itself must not block the ray of a slider that gives check
+        self.attackMap = attacked = self.getAttackMap(enemy, occupied ^ (1 << kingSq))
+        empty = ~occupied & FULL_BOARD
+        landingMask = (enemies if captures else 0) | (empty if quiets else 0)
+        for target in squares(KING_ATTACKS[kingSq] & ~attacked & landingMask):
+            moves.append(king | target << 6 | PIECE_INDEX[board[target >> 3][target & 7]] << 16)
+
+        if checkers & (checkers - 1) == 0: # not a double check, so other pieces can move too
+            if checkers:
+                checker = checkers.bit_length() - 1
+                targetMask = BETWEEN[kingSq][checker] | checkers # block the check or capture the checker
+            else:
+                targetMask = ~own
+            # promotions go with the captures
+            pushMask = targetMask & ((PROMOTION_ROWS if captures else 0) | (~PROMOTION_ROWS if quiets else 0))
+            targetMask &= landingMask
+
+            # pinned pieces can only move along the line between the king and the pinner
+            pinned = {}
+            snipers = ((rookAttacks(kingSq, enemies) & (pieces[enemy + 'R'] | pieces[enemy + 'Q']))
+                       | (bishopAttacks(kingSq, enemies) & (pieces[enemy + 'B'] | pieces[enemy + 'Q'])))
+            for sniper in squares(snipers):
+                blockers = BETWEEN[kingSq][sniper] & occupied
+                if blockers and blockers & (blockers - 1) == 0 and blockers & own:
+                    pinned[blockers.bit_length() - 1] = BETWEEN[kingSq][sniper] | (1 << sniper)
+
+            knight = PIECE_INDEX[ourColor + 'N'] << 12
+            for sq in squares(pieces[ourColor + 'N']):
+                if sq not in pinned: # a pinned knight can never move
+                    for target in squares(KNIGHT_ATTACKS[sq] & targetMask & ~own):
+                        moves.append(sq | target << 6 | knight | PIECE_INDEX[board[target >> 3][target & 7]] << 16)
+            for pieceType, directions in (('B', BISHOP_DIRECTIONS), ('R', ROOK_DIRECTIONS), ('Q', range(8))):
+                slider = PIECE_INDEX[ourColor + pieceType] << 12
+                for sq in squares(pieces[ourColor + pieceType]):
+                    attacks = slidingAttacks(sq, occupied, directions) & targetMask & ~own
+                    if sq in pinned:
+                        attacks &= pinned[sq]
+                    for target in squares(attacks):
+                        moves.append(sq | target << 6 | slider | PIECE_INDEX[board[target >> 3][target & 7]] << 16)
+            self.getPawnMoveBitboards(ourColor, enemy, occupied, targetMask, pushMask, pinned, kingSq, moves, captures)
+            if not checkers and quiets:
+                self.getCastleMoveBitboards(ourColor, attacked, occupied, kingSquare, moves)
+        return moves
+
+    '''
+        Captures must land on targetMask and pushes on pushMask, en passant is only tried if enPassant is True
+    '''
+    def getPawnMoveBitboards(self, ourColor, enemy, occupied, targetMask, pushMask, pinned, kingSq, moves, enPassant = True):
+        board = self.board
+        pawn = PIECE_INDEX[ourColor + 'P'] << 12
+        enemies = self.colors[enemy] & targetMask
+        empty = ~occupied & FULL_BOARD
+        pawns = self.pieces[ourColor + 'P']
+        pinnedPawns = 0
+        for sq in pinned:
+            pinnedPawns |= (1 << sq) & pawns
+        pawns ^= pinnedPawns
+
+        # the unpinned pawns are moved all at once by shifting the whole bitboard
+        if ourColor == 'w':
+            step = -8
+            singlePushes = (pawns >> 8) & empty
+            doublePushes = ((singlePushes & ROW_MASKS[5]) >> 8) & empty & pushMask
+            leftCaptures = ((pawns & ~FILE_MASKS[0]) >> 9) & enemies
+            rightCaptures = ((pawns & ~FILE_MASKS[7]) >> 7) & enemies
+            leftShift, rightShift = -9, -7
+        else:
+            step = 8
+            singlePushes = (pawns << 8) & empty
+            doublePushes = ((singlePushes & ROW_MASKS[2]) << 8) & empty & pushMask
+            leftCaptures = ((pawns & ~FILE_MASKS[0]) << 7) & enemies
+            rightCaptures = ((pawns & ~FILE_MASKS[7]) << 9) & enemies
+            leftShift, rightShift = 7, 9
+        singlePushes &= pushMask
+        for targets, shift in ((singlePushes, step), (doublePushes, 2*step), (leftCaptures, leftShift), (rightCaptures, rightShift)):
+            while targets:
+                bit = targets & -targets
+                target = bit.bit_length() - 1
+                targets ^= bit
+                move = (target - shift) | target << 6 | pawn | PIECE_INDEX[board[target >> 3][target & 7]] << 16
+                if bit & PROMOTION_ROWS:
+                    for promotion in range(len(PROMOTION_PIECES)):
+                        moves.append(move | PROMOTION_MOVE << 20 | promotion << 22)
+                else:
+                    moves.append(move)
+
+        startRow = 6 if ourColor == 'w' else 1
+        for sq in squares(pinnedPawns):
+            allowed = targetMask & pinned[sq]
+            allowedPushes = pushMask & pinned[sq]
+            row, col = divmod(sq, 8)
+            push = sq + step
+            if not (occupied >> push) & 1:
+                if (allowedPushes >> push) & 1:
+                    self.addPawnMove(row, col, push >> 3, push & 7, moves)
+                if row == startRow and not (occupied >> (push + step)) & 1 and (allowedPushes >> (push + step)) & 1:
+                    moves.append(sq | (push + step) << 6 | pawn)
+            for target in squares(PAWN_ATTACKS[ourColor][sq] & enemies & allowed):
+                self.addPawnMove(row, col, target >> 3, target & 7, moves)
+
+        if enPassant and self.enPassantPossible != ():
+            epSq = self.enPassantPossible[0]*8 + self.enPassantPossible[1]
+            capturedSq = epSq - step
+            for sq in squares(PAWN_ATTACKS[enemy][epSq] & self.pieces[ourColor + 'P']):
+                # play the capture out on the occupancy, two pawns leave the same row at once
+                after = occupied ^ (1 << sq) ^ (1 << capturedSq) ^ (1 << epSq)
+                enemyPawns = self.pieces[enemy + 'P']
+                self.pieces[enemy + 'P'] = enemyPawns ^ (1 << capturedSq)
+                safe = not self.attackersTo(kingSq, enemy, after)
+                self.pieces[enemy + 'P'] = enemyPawns
+                if safe:
+                    moves.append(sq | epSq << 6 | pawn | PIECE_INDEX[enemy + 'P'] << 16 | EN_PASSANT_MOVE << 20)
+
+    def getCastleMoveBitboards(self, ourColor, attacked, occupied, kingSquare, moves):
+        row, col = kingSquare
+        if ourColor == 'w':
+            kingSide, queenSide = self.castlingRights & WHITE_KING_SIDE, self.castlingRights & WHITE_QUEEN_SIDE
+        else:
+            kingSide, queenSide = self.castlingRights & BLACK_KING_SIDE, self.castlingRights & BLACK_QUEEN_SIDE
+        sq = row*8 + col
+        if kingSide and not (occupied >> (sq + 1)) & 3:
+            if not (attacked >> (sq + 1)) & 3:
+                moves.append(sq | (sq + 2) << 6 | PIECE_INDEX[ourColor + 'K'] << 12 | CASTLE_MOVE << 20)
+        if queenSide and not (occupied >> (sq - 3)) & 7:
+            if not (attacked >> (sq - 2)) & 3:
+                moves.append(sq | (sq - 2) << 6 | PIECE_INDEX[ourColor + 'K'] << 12 | CASTLE_MOVE << 20)
@@ -0,0 +1,157 @@
+"""
+    Draws the board with dirty rectangles : the squares, the highlight overlays and the text are made once and kept,
+    and every frame only the squares whose piece or highlight changed are drawn again and handed to
+    pygame.display.update, so a frame where nothing changed draws nothing at all. It draws on any surface (the window,
+    a subsurface of a bigger window holding several boards, or an off screen surface to record), the rectangles it
+    returns are in window coordinates.
+
+    renderer = BoardRenderer(screen, IMAGES, SQUARE_SIZE)
+    pg.display.update(renderer.draw(gs.board, {(6, 4) : SELECTED, (4, 4) : MOVE_TARGET}))
+"""
+import math
+
+import pygame as pg
+
+LIGHT_COLOR = 'white'
+DARK_COLOR = 'gray'
+# highlights of a square, and the color and transparency (0 transparent to 255 opaque) of their overlays
+SELECTED = 'selected'
+MOVE_TARGET = 'moveTarget'
+HIGHLIGHT_COLORS = {SELECTED : ('blue', 100), MOVE_TARGET : ('yellow', 100)}
+TEXT_FONT = ("arial", 36, True, False) # name, size, bold, italic
+TEXT_COLOR = 'red'
+FRAMES_PER_SQUARE = 13 # of the move animation
+
+
+class BoardRenderer():
+    def __init__(self, surface, images, squareSize):
+        self.surface = surface
+        self.images = images # piece name -> surface of squareSize
+        self.squareSize = squareSize
+        self.offset = surface.get_abs_offset() # of a subsurface in the window
+        self.background = pg.Surface((squareSize*8, squareSize*8)).convert()
+        colors = [pg.Color(LIGHT_COLOR), pg.Color(DARK_COLOR)]
+        for row in range(8):
+            for col in range(8):
+                self.background.fill(colors[(row + col) % 2], self.squareRect(row, col)) # light squares are even
+        self.overlays = {}
+        for highlight, (color, alpha) in HIGHLIGHT_COLORS.items():
+            overlay = pg.Surface((squareSize, squareSize)).convert()
+            overlay.set_alpha(alpha)
+            overlay.fill(pg.Color(color))
+            self.overlays[highlight] = overlay
+        self.font = None # made on the first text, SysFont is slow
+        self.textSurfaces = {}
+        self.drawn = [None]*64 # (piece, highlight) on every square of the surface, None when it has to be drawn
+        self.text = None # text drawn over the board and its rectangle
+        self.textRect = None
+
+    def squareRect(self, row, col):
+        return pg.Rect(col*self.squareSize, row*self.squareSize, self.squareSize, self.squareSize)
+
+    '''
+        Draw everything again on the next draw, after something else drew on the surface
+    '''
+    def invalidate(self):
+        self.drawn = [None]*64
+        self.text = None
+
+    def drawSquare(self, row, col, piece, highlight = None):
+        rect = self.squareRect(row, col)
+        self.surface.blit(self.background, rect, rect)
+        if highlight is not None:
+            self.surface.blit(self.overlays[highlight], rect)
+        if piece != "--":
+            self.surface.blit(self.images[piece], rect)
+        return rect
+
+    def textSurface(self, text):
+        surface = self.textSurfaces.get(text)
+        if surface is None:
+            if self.font is None:
+                if not pg.font.get_init(): # started by the first text rather than with the window
+                    pg.font.init()
+                self.font = pg.font.SysFont(*TEXT_FONT)
+            surface = self.textSurfaces[text] = self.font.render(text, 0, pg.Color(TEXT_COLOR))
+        return surface
+
+    '''
+        Bring the surface up to date with the board (the 2D list of GameState), highlights ((row, col) -> SELECTED or
+        MOVE_TARGET) and the text shown in the middle (None for none). Returns the rectangles that changed
+    '''
+    def draw(self, board, highlights = None, text = None):
+        highlights = highlights or {}
+        dirty = []
+        if text != self.text and self.textRect is not None: # the old text goes away, draw the squares under it
+            for row, col in self.squaresUnder(self.textRect):
+                self.drawn[row*8 + col] = None
+        for row in range(8):
+            boardRow = board[row]
+            for col in range(8):
+                state = (boardRow[col], highlights.get((row, col)))
+                if self.drawn[row*8 + col] != state:
+                    self.drawn[row*8 + col] = state
+                    dirty.append(self.drawSquare(row, col, *state))
+        if text is not None and (text != self.text or self.textRect.collidelist(dirty) != -1):
+            textSurface = self.textSurface(text)
+            size = self.squareSize*8
+            self.textRect = textSurface.get_rect(topleft = ((size - textSurface.get_width()) // 2,
+                                                            (size - textSurface.get_height()) // 2))
+            self.surface.blit(textSurface, self.textRect)
+            dirty.append(self.textRect)
+        elif text is None:
+            self.textRect = None
+        self.text = text
+        return [rect.move(self.offset) for rect in dirty]
+
+    '''
+        Slide the piece of a move (already made on board) from its start to its end square. The rest of the board is
+        brought up to date first, then every frame only the squares under the piece's last position are drawn again.
+        update is called with the rectangles of every frame
+    '''
+    def animateMove(self, move, board, clock, update = pg.display.update, fps = 80):
+        size = self.squareSize
+        deltaRow = move.endRow - move.startRow
+        deltaCol = move.endCol - move.startCol
+        frameCount = max(math.isqrt(deltaRow*deltaRow + deltaCol*deltaCol)*FRAMES_PER_SQUARE, 1)
+        image = self.images[move.pieceMoved]
+        if self.textRect is not None: # the text isn't shown while the piece moves
+            for row, col in self.squaresUnder(self.textRect):
+                self.drawn[row*8 + col] = None
+            self.text = self.textRect = None
+        dirty = []
+        for row in range(8):
+            for col in range(8):
+                # the moving piece isn't on its end square yet, what it captures there still is
+                if (row, col) == (move.endRow, move.endCol):
+                    piece = "--" if move.isEnPassantMove else move.pieceCaptured
+                else:
+                    piece = board[row][col]
+                if self.drawn[row*8 + col] != (piece, None):
+                    self.drawn[row*8 + col] = (piece, None)
+                    dirty.append(self.drawSquare(row, col, piece))
+        previous = None
+        for frame in range(frameCount + 1):
+            x = round((move.startCol + deltaCol*frame/frameCount)*size)
+            y = round((move.startRow + deltaRow*frame/frameCount)*size)
+            pieceRect = pg.Rect(x, y, size, size)
+            if previous is not None:
+                for row, col in self.squaresUnder(previous):
+                    self.drawSquare(row, col, *self.drawn[row*8 + col])
+                dirty.append(previous)
+            self.surface.blit(image, pieceRect)
+            dirty.append(pieceRect)
+            update([rect.move(self.offset) for rect in dirty])
+            dirty = []
+            previous = pieceRect
+            clock.tick(fps)
+        for row, col in self.squaresUnder(previous):
+            self.drawn[row*8 + col] = None
+
+    '''
+        (row, col) of the squares a rectangle of the surface covers
+    '''
+    def squaresUnder(self, rect):
+        size = self.squareSize
+        return [(row, col) for row in range(max(rect.top // size, 0), min((rect.bottom - 1) // size, 7) + 1)
+                for col in range(max(rect.left // size, 0), min((rect.right - 1) // size, 7) + 1)]
@@ -3,7 +3,84 @@
     It will also generate all the valid moves from the current state.
     It will also contain a log of all the moves played till the current state.
 """
-from typing import Counter
+import copy
+import random
+import re
+from array import array
+import evaluation
+from evaluation import MIDGAME_SCORES, ENDGAME_SCORES, PHASE_WEIGHTS
+
+# Zobrist hashing : every (piece, square), side to move, castling rights and en passant file gets a random 64 bit number
+# and the key of a position is the xor of the numbers of everything in it, so a move only has to xor in what it changes
+# a fixed seed keeps the keys the same between runs
+zobristRandom = random.Random(2021)
+ZOBRIST_PIECES = {color + piece : [zobristRandom.getrandbits(64) for _ in range(64)] for color in 'wb' for piece in 'PNBRQK'}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for _ in range(16)] # indexed by castleRights.getIndex()
+ZOBRIST_EN_PASSANT = [zobristRandom.getrandbits(64) for _ in range(8)] # indexed by the column of the en passant square
+
+# Move generation and search work on moves packed into a single int, Move objects are only built for the UI
+#   bits 0-5   start square (row*8 + col)
+#   bits 6-11  end square
+#   bits 12-15 moved piece (index in PIECES)
+#   bits 16-19 captured piece (index in PIECES, 0 if nothing is captured)
+#   bits 20-21 kind of move (NORMAL_MOVE, EN_PASSANT_MOVE, CASTLE_MOVE or PROMOTION_MOVE)
+#   bits 22-23 promotion piece (index in PROMOTION_PIECES)
+PIECES = ["--", "wP", "wN", "wB", "wR", "wQ", "wK", "bP", "bN", "bB", "bR", "bQ", "bK"]
+PIECE_INDEX = {piece : index for index, piece in enumerate(PIECES)}
+NORMAL_MOVE = 0
+EN_PASSANT_MOVE = 1
+CASTLE_MOVE = 2
+PROMOTION_MOVE = 3
+PROMOTION_PIECES = ['Q', 'R', 'B', 'N']
+
+# castling rights as the bits of one int, the same number as castleRights.getIndex()
+WHITE_KING_SIDE = 1
+WHITE_QUEEN_SIDE = 2
+BLACK_KING_SIDE = 4
+BLACK_QUEEN_SIDE = 8
+ALL_CASTLING_RIGHTS = 15
+# castling rights kept by a move from or to every square, only the king and rook starting squares lose some
+CASTLING_RIGHTS_KEPT = [ALL_CASTLING_RIGHTS]*64
+CASTLING_RIGHTS_KEPT[60] = BLACK_KING_SIDE | BLACK_QUEEN_SIDE
+CASTLING_RIGHTS_KEPT[63] = ALL_CASTLING_RIGHTS & ~WHITE_KING_SIDE
+CASTLING_RIGHTS_KEPT[56] = ALL_CASTLING_RIGHTS & ~WHITE_QUEEN_SIDE
+CASTLING_RIGHTS_KEPT[4] = WHITE_KING_SIDE | WHITE_QUEEN_SIDE
+CASTLING_RIGHTS_KEPT[7] = ALL_CASTLING_RIGHTS & ~BLACK_KING_SIDE
+CASTLING_RIGHTS_KEPT[0] = ALL_CASTLING_RIGHTS & ~BLACK_QUEEN_SIDE
+
+# make and undo never build objects : the coordinates of every square are made once here, and what a move can't
+# give back (castling rights, en passant square and halfmove clock of the position before it) is packed into one
+# int per move in stateLog
+#   bits 0-3   castling rights
+#   bits 4-10  en passant square + 1 (row*8 + col + 1, 0 if there is none)
+#   bits 11-   halfmove clock
+SQUARE_COORDINATES = [(sq >> 3, sq & 7) for sq in range(64)]
+
+FEN_PIECES = set("PNBRQKpnbrqk")
+# standard algebraic notation (SAN) of a move that isn't castling : piece, start file and rank when they are needed to
+# tell moves apart, capture, end square and promotion. Check marks and annotations are stripped before matching
+SAN_PATTERN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?")
+
+
+# squares seen from every square (row*8 + col), used to look for attackers backwards from the attacked square
+KNIGHT_OFFSETS = [(-2,-1) , (-2,1) , (2,-1) , (2,1) , (-1,2) , (1,2) , (1,-2) , (-1,-2)]
+KING_OFFSETS = [(-1,0) , (0,-1) , (1,0) , (0,1) , (-1,-1) , (-1,1) , (1,-1) , (1,1)] # rooks use the first 4, bishops the last 4
+KNIGHT_SQUARES = [[(sq//8 + dRow , sq%8 + dCol) for dRow, dCol in KNIGHT_OFFSETS
+                   if 0 <= sq//8 + dRow < 8 and 0 <= sq%8 + dCol < 8] for sq in range(64)]
+KING_SQUARES = [[(sq//8 + dRow , sq%8 + dCol) for dRow, dCol in KING_OFFSETS
+                 if 0 <= sq//8 + dRow < 8 and 0 <= sq%8 + dCol < 8] for sq in range(64)]
+RAY_SQUARES = [[[(sq//8 + dRow*i , sq%8 + dCol*i) for i in range(1, 8)
+                 if 0 <= sq//8 + dRow*i < 8 and 0 <= sq%8 + dCol*i < 8] for dRow, dCol in KING_OFFSETS] for sq in range(64)]
+# the same squares as bits (1 << (row*8 + col)) for the attack map
+KNIGHT_MASKS = [sum(1 << (row*8 + col) for row, col in KNIGHT_SQUARES[sq]) for sq in range(64)]
+KING_MASKS = [sum(1 << (row*8 + col) for row, col in KING_SQUARES[sq]) for sq in range(64)]
+
+
+def packMove(startRow, startCol, endRow, endCol, board, kind = NORMAL_MOVE, promotion = 0):
+    captured = board[startRow][endCol] if kind == EN_PASSANT_MOVE else board[endRow][endCol]
+    return ((startRow*8 + startCol) | (endRow*8 + endCol) << 6 | PIECE_INDEX[board[startRow][startCol]] << 12
+            | PIECE_INDEX[captured] << 16 | kind << 20 | promotion << 22)
 
 
 class GameState():
@@ -25,133 +102,459 @@ class GameState():
         self.moveFunctions = {'P' : self.getPawnMoves, 'R' : self.getRookMoves, 'N' : self.getKnightMoves,
          'B' : self.getBishopMoves, 'Q' : self.getQueenMoves, 'K' : self.getKingMoves}
         self.whiteToMove = True
-        self.movesLog = []
+        self.packedMovesLog = []
         self.whiteKingLocation = (7,4)
         self.blackKingLocation = (0,4)
         self.inCheck = False
         self.pins = []
         self.checks = []
+        self.attackMap = 0 # squares attacked by the side not to move, as bits (1 << (row*8 + col))
+        self.moveCache = None # moveCache.MoveCache of the legal moves by zobrist key, None to always generate them
+        self.evasions = None # (zobrist key, valid moves) of the last position in check the capture stage generated
         self.enPassantPossible = () # coordinates of the square where en passant capture is possible
         self.checkmate = False   
         self.stalemate = False
-        self.currCastlingRight = castleRights(True , True , True , True)
-        self.castlingRightLog = [castleRights(self.currCastlingRight.wks , self.currCastlingRight.bks,
-                                              self.currCastlingRight.wqs , self.currCastlingRight.bqs)]
+        self.castlingRights = ALL_CASTLING_RIGHTS
+        self.halfmoveClock = 0 # moves since the last capture or pawn move
+        self.startPly = 0 # plies played before the first move of packedMovesLog, for the fullmove number
+        self.stateLog = [] # packed irreversible state of the position before every move of packedMovesLog
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        self.resetEvaluation()
+
+    '''
+        Set up the position of a FEN string (https://www.chessprogramming.org/Forsyth-Edwards_Notation),
+        the move log starts over from that position. The fields after the board can be left out, the clocks
+        default to 0 and 1
+    '''
+    def loadFEN(self, fen):
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8 or (len(fields) > 1 and fields[1] not in ('w', 'b')):
+            raise ValueError(f"invalid FEN : {fen}")
+        for row in range(8):
+            self.board[row] = []
+            for char in rows[row]:
+                if char.isdigit():
+                    self.board[row].extend(["--"] * int(char))
+                elif char not in FEN_PIECES:
+                    raise ValueError(f"invalid FEN : {fen}")
+                else:
+                    self.board[row].append(('w' if char.isupper() else 'b') + char.upper())
+                    if char == 'K':
+                        self.whiteKingLocation = (row, len(self.board[row]) - 1)
+                    elif char == 'k':
+                        self.blackKingLocation = (row, len(self.board[row]) - 1)
+            if len(self.board[row]) != 8:
+                raise ValueError(f"invalid FEN : {fen}")
+        self.whiteToMove = len(fields) < 2 or fields[1] == 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        self.castlingRights = (('K' in castling)*WHITE_KING_SIDE | ('Q' in castling)*WHITE_QUEEN_SIDE
+                               | ('k' in castling)*BLACK_KING_SIDE | ('q' in castling)*BLACK_QUEEN_SIDE)
+        if len(fields) > 3 and fields[3] != '-':
+            self.enPassantPossible = SQUARE_COORDINATES[Move.ranksToRows[fields[3][1]]*8 + Move.filesToCols[fields[3][0]]]
+        else:
+            self.enPassantPossible = ()
+        self.halfmoveClock = int(fields[4]) if len(fields) > 4 and fields[4].isdigit() else 0
+        fullmoveNumber = int(fields[5]) if len(fields) > 5 and fields[5].isdigit() else 1
+        self.startPly = 2*(max(fullmoveNumber, 1) - 1) + (not self.whiteToMove)
+        self.packedMovesLog = []
+        self.stateLog = []
+        self.checkmate = False
+        self.stalemate = False
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        self.resetEvaluation()
+
+    '''
+        The current position as a FEN string, with the halfmove clock and fullmove number unless clocks is False
+    '''
+    def getFEN(self, clocks = True):
+        rows = []
+        for row in self.board:
+            fenRow = ""
+            empty = 0
+            for piece in row:
+                if piece == "--":
+                    empty += 1
+                    continue
+                if empty:
+                    fenRow += str(empty)
+                    empty = 0
+                fenRow += piece[1] if piece[0] == 'w' else piece[1].lower()
+            rows.append(fenRow + (str(empty) if empty else ""))
+        rights = self.castlingRights
+        castling = ''.join(letter for letter, right in (('K', WHITE_KING_SIDE), ('Q', WHITE_QUEEN_SIDE), ('k', BLACK_KING_SIDE),
+                                                        ('q', BLACK_QUEEN_SIDE)) if rights & right)
+        enPassant = Move.colsToFiles[self.enPassantPossible[1]] + Move.rowsToRanks[self.enPassantPossible[0]] if self.enPassantPossible != () else '-'
+        fen = f"{'/'.join(rows)} {'w' if self.whiteToMove else 'b'} {castling or '-'} {enPassant}"
+        if clocks:
+            fen += f" {self.halfmoveClock} {self.getFullmoveNumber()}"
+        return fen
+
+    '''
+        Number of the current move, it starts at 1 and goes up after every black move
+    '''
+    def getFullmoveNumber(self):
+        return (self.startPly + len(self.packedMovesLog)) // 2 + 1
+
+    '''
+        How many times the current position has been on the board, only positions since the last capture or pawn
+        move can be the same. 3 is a draw by threefold repetition
+    '''
+    def getRepetitions(self):
+        return self.zobristKeyLog[-(self.halfmoveClock + 1):].count(self.zobristKey)
+
+    '''
+        True when the position already occurred since the last capture or pawn move, with the same side to move.
+        Cheaper than getRepetitions for the search, which scores a position's first repetition as a draw
+    '''
+    def isRepeated(self):
+        keys = self.zobristKeyLog
+        key = self.zobristKey
+        for index in range(len(keys) - 3, max(len(keys) - 2 - self.halfmoveClock, -1), -2):
+            if keys[index] == key:
+                return True
+        return False
+
+    '''
+        True when neither side can mate anymore : kings alone, or a king and a single bishop or knight against a king
+    '''
+    def isInsufficientMaterial(self):
+        pieces = [piece[1] for row in self.board for piece in row if piece != "--" and piece[1] != 'K']
+        return len(pieces) == 0 or (len(pieces) == 1 and pieces[0] in 'BN')
+
+    '''
+        The legal packed move written in standard algebraic notation (Nf3, exd5, O-O, e8=Q+, Raxd1#, ...).
+        moves are the legal packed moves of the position, generated when they aren't given
+    '''
+    def getSAN(self, move, moves = None):
+        if moves is None:
+            moves = self.getValidPackedMoves()
+        start = move & 63
+        end = (move >> 6) & 63
+        pieceType = PIECES[(move >> 12) & 15][1]
+        kind = (move >> 20) & 3
+        if kind == CASTLE_MOVE:
+            san = "O-O" if end & 7 == 6 else "O-O-O"
+        else:
+            target = Move.colsToFiles[end & 7] + Move.rowsToRanks[end >> 3]
+            capture = "x" if (move >> 16) & 15 else ""
+            if pieceType == 'P':
+                san = (Move.colsToFiles[start & 7] if capture else "") + capture + target
+                if kind == PROMOTION_MOVE:
+                    san += "=" + PROMOTION_PIECES[(move >> 22) & 3]
+            else:
+                # other moves of the same piece to the same square decide how much of the start square is written
+                others = [other & 63 for other in moves if other != move and (other >> 6) & 63 == end
+                          and (other >> 12) & 15 == (move >> 12) & 15]
+                if not others:
+                    disambiguation = ""
+                elif all(other & 7 != start & 7 for other in others):
+                    disambiguation = Move.colsToFiles[start & 7]
+                elif all(other >> 3 != start >> 3 for other in others):
+                    disambiguation = Move.rowsToRanks[start >> 3]
+                else:
+                    disambiguation = Move.colsToFiles[start & 7] + Move.rowsToRanks[start >> 3]
+                san = pieceType + disambiguation + capture + target
+        inCheck = self.inCheck
+        self.makePackedMove(move)
+        replies = self.generateValidPackedMoves() # sets inCheck without touching checkmate and stalemate
+        if self.inCheck:
+            san += "+" if replies else "#"
+        self.undoMove()
+        self.inCheck = inCheck
+        return san
+
+    '''
+        The legal packed move of a move in standard algebraic notation. Check marks, annotations (!, ?) and 0-0 for
+        castling are accepted, a move that is illegal, ambiguous or can't be read raises ValueError
+    '''
+    def parseSAN(self, san, moves = None):
+        if moves is None:
+            moves = self.getValidPackedMoves()
+        text = san.rstrip("+#!?")
+        if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            endCol = 6 if len(text) == 3 else 2
+            found = [move for move in moves if (move >> 20) & 3 == CASTLE_MOVE and (move >> 6) & 7 == endCol]
+        else:
+            match = SAN_PATTERN.fullmatch(text)
+            if match is None:
+                raise ValueError(f"can't read the move {san}")
+            pieceType, file, rank, target, promotion = match.groups()
+            pieceType = pieceType or 'P'
+            end = Move.ranksToRows[target[1]]*8 + Move.filesToCols[target[0]]
+            found = []
+            for move in moves:
+                start = move & 63
+                if (move >> 6) & 63 != end or PIECES[(move >> 12) & 15][1] != pieceType:
+                    continue
+                if (file and Move.filesToCols[file] != start & 7) or (rank and Move.ranksToRows[rank] != start >> 3):
+                    continue
+                if (move >> 20) & 3 == PROMOTION_MOVE and PROMOTION_PIECES[(move >> 22) & 3] != (promotion or "").upper():
+                    continue
+                found.append(move)
+        if len(found) != 1:
+            raise ValueError(f"{'ambiguous' if found else 'illegal'} move {san}")
+        return found[0]
 
+    '''
+        Score the board from scratch, makeMove and undoMove keep it updated after that
+        self.evaluation is the material and piece-square score in centipawns, positive when white is better
+    '''
+    def resetEvaluation(self):
+        self.midgameScore , self.endgameScore , self.phase = evaluation.scoreBoard(self.board)
+        self.evaluation = evaluation.taperedScore(self.midgameScore , self.endgameScore , self.phase)
+
+    '''
+        Add (sign = 1) or take back (sign = -1) what a packed move changes in the evaluation
+    '''
+    def updateEvaluation(self, move, sign):
+        start = move & 63
+        end = (move >> 6) & 63
+        pieceMoved = PIECES[(move >> 12) & 15]
+        kind = (move >> 20) & 3
+        placedPiece = pieceMoved[0] + PROMOTION_PIECES[(move >> 22) & 3] if kind == PROMOTION_MOVE else pieceMoved
+        midgameScore = MIDGAME_SCORES[placedPiece][end] - MIDGAME_SCORES[pieceMoved][start]
+        endgameScore = ENDGAME_SCORES[placedPiece][end] - ENDGAME_SCORES[pieceMoved][start]
+        phase = PHASE_WEIGHTS[placedPiece[1]] - PHASE_WEIGHTS[pieceMoved[1]]
+        if (move >> 16) & 15:
+            pieceCaptured = PIECES[(move >> 16) & 15]
+            captured = (start & 56) | (end & 7) if kind == EN_PASSANT_MOVE else end
+            midgameScore -= MIDGAME_SCORES[pieceCaptured][captured]
+            endgameScore -= ENDGAME_SCORES[pieceCaptured][captured]
+            phase -= PHASE_WEIGHTS[pieceCaptured[1]]
+        elif kind == CASTLE_MOVE:
+            rook = pieceMoved[0] + 'R'
+            if end > start:
+                rookStart , rookEnd = end + 1 , end - 1
+            else:
+                rookStart , rookEnd = end - 2 , end + 1
+            midgameScore += MIDGAME_SCORES[rook][rookEnd] - MIDGAME_SCORES[rook][rookStart]
+            endgameScore += ENDGAME_SCORES[rook][rookEnd] - ENDGAME_SCORES[rook][rookStart]
+        self.midgameScore += sign*midgameScore
+        self.endgameScore += sign*endgameScore
+        self.phase += sign*phase
+        self.evaluation = evaluation.taperedScore(self.midgameScore , self.endgameScore , self.phase)
+
+    '''
+        Compute the zobrist key of the current position from scratch, makeMove keeps it updated after that
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for row in range(8):
+            for col in range(8):
+                piece = self.board[row][col]
+                if piece != "--":
+                    key ^= ZOBRIST_PIECES[piece][row*8 + col]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        key ^= ZOBRIST_CASTLING[self.castlingRights]
+        if self.enPassantPossible != ():
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        return key
+
+    '''
+        Deep copy of the game for a search on another thread. The move cache (thousands of move lists) stays with the
+        original, the copy generates its own moves
+    '''
+    def copyForSearch(self):
+        cache = self.moveCache
+        self.moveCache = None
+        try:
+            return copy.deepcopy(self)
+        finally:
+            self.moveCache = cache
 
     '''
-        Takes a move and executes it (will not work for castling , pawn promotion , en-passant)
+        Takes a move and executes it
     '''
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.movesLog.append(move) # log the move so it can be used to undo if needed
+        self.makePackedMove(move.packed)
+
+    '''
+        Takes a packed move and executes it, this is what the search uses
+    '''
+    def makePackedMove(self, move):
+        start = move & 63
+        end = (move >> 6) & 63
+        startRow , startCol = start >> 3 , start & 7
+        endRow , endCol = end >> 3 , end & 7
+        pieceMoved = PIECES[(move >> 12) & 15]
+        pieceCaptured = PIECES[(move >> 16) & 15]
+        kind = (move >> 20) & 3
+
+        # save what the move can't give back, and take the old castling rights and en passant square out of the key,
+        # the new ones are put back at the end
+        rights = self.castlingRights
+        enPassant = self.enPassantPossible
+        key = self.zobristKey ^ ZOBRIST_CASTLING[rights] ^ ZOBRIST_BLACK_TO_MOVE
+        if enPassant != ():
+            key ^= ZOBRIST_EN_PASSANT[enPassant[1]]
+            self.stateLog.append(rights | (enPassant[0]*8 + enPassant[1] + 1) << 4 | self.halfmoveClock << 11)
+        else:
+            self.stateLog.append(rights | self.halfmoveClock << 11)
+        key ^= ZOBRIST_PIECES[pieceMoved][start]
+        if pieceCaptured != "--":
+            captureRow = startRow if kind == EN_PASSANT_MOVE else endRow
+            key ^= ZOBRIST_PIECES[pieceCaptured][captureRow*8 + endCol]
+
+        self.board[startRow][startCol] = "--"
+        self.board[endRow][endCol] = pieceMoved
+        self.packedMovesLog.append(move) # log the move so it can be used to undo if needed
         self.whiteToMove = not self.whiteToMove # opposite player's turn
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if pieceMoved == "wK":
+            self.whiteKingLocation = (endRow, endCol)
+        elif pieceMoved == "bK":
+            self.blackKingLocation = (endRow, endCol)
         
         # if Pawn Promotion is happening
-        if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + "Q"
+        if kind == PROMOTION_MOVE:
+            self.board[endRow][endCol] = pieceMoved[0] + PROMOTION_PIECES[(move >> 22) & 3]
 
         # enpassant move
-        if move.isEnPassantMove:
-            self.board[move.startRow][move.endCol] = "--"
+        elif kind == EN_PASSANT_MOVE:
+            self.board[startRow][endCol] = "--"
+
+        # castling
+        elif kind == CASTLE_MOVE:
+            rook = ZOBRIST_PIECES[pieceMoved[0] + 'R']
+            if endCol - startCol == 2:
+                self.board[endRow][endCol - 1] =  self.board[endRow][endCol + 1]
+                self.board[endRow][endCol + 1] = '--'
+                key ^= rook[end + 1] ^ rook[end - 1]
+            else:
+                self.board[endRow][endCol + 1] = self.board[endRow][endCol - 2]
+                self.board[endRow][endCol - 2] = '--'
+                key ^= rook[end - 2] ^ rook[end + 1]
 
         # updating enPassantPossible
-        if move.pieceMoved[1] == 'P' and abs(move.startRow-move.endRow) == 2:# only on 2 square advances
-            self.enPassantPossible = ((move.startRow+move.endRow//2), move.startCol)
+        if pieceMoved[1] == 'P' and abs(startRow - endRow) == 2:# only on 2 square advances
+            self.enPassantPossible = SQUARE_COORDINATES[(start + end) >> 1]
         else : # this makes sure that only one enpassant is possible at a time and that too immediately after a 2 square advance
             self.enPassantPossible = ()
-        
 
-        # castling
-        if move.isCastleMove:
-            if move.endCol - move.startCol == 2:
-                self.board[move.endRow][move.endCol - 1] =  self.board[move.endRow][move.endCol + 1]
-                self.board[move.endRow][move.endCol + 1] = '--'
-            else:
-                self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2]
-                self.board[move.endRow][move.endCol - 2] = '--'
+        # update castling Rights - whenever a king or a rook leaves its square or a rook is captured on it
+        rights &= CASTLING_RIGHTS_KEPT[start] & CASTLING_RIGHTS_KEPT[end]
+        self.castlingRights = rights
+        self.halfmoveClock = 0 if pieceMoved[1] == 'P' or pieceCaptured != "--" else self.halfmoveClock + 1
 
-        # update castling Rights - whenever it is a rook or kings move
-        self.updateCastleRights(move)
-        self.castlingRightLog.append(castleRights(self.currCastlingRight.wks , self.currCastlingRight.bks,
-                                              self.currCastlingRight.wqs , self.currCastlingRight.bqs))
+        key ^= ZOBRIST_PIECES[self.board[endRow][endCol]][end] # promoted piece if promotion
+        key ^= ZOBRIST_CASTLING[rights]
+        if self.enPassantPossible != ():
+            key ^= ZOBRIST_EN_PASSANT[self.enPassantPossible[1]]
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+        self.updateEvaluation(move, 1)
 
     """
-        update the castle rights given a move
+        The castling rights as a castleRights object, the game state itself keeps them as the bits of castlingRights
     """
-    def updateCastleRights(self , move):
-        if move.pieceMoved == 'bK':
-            self.currCastlingRight.bqs = False
-            self.currCastlingRight.bks = False
-        elif move.pieceMoved == 'wK':
-            self.currCastlingRight.wks = False
-            self.currCastlingRight.wqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0: # left rook
-                    self.currCastlingRight.wqs = False
-                elif move.startCol == 7: # right rook
-                    self.currCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0: # left rook
-                    self.currCastlingRight.bqs = False
-                elif move.startCol == 7: # right rook
-                    self.currCastlingRight.bks = False
+    @property
+    def currCastlingRight(self):
+        rights = self.castlingRights
+        return castleRights(bool(rights & WHITE_KING_SIDE) , bool(rights & BLACK_KING_SIDE) ,
+                            bool(rights & WHITE_QUEEN_SIDE) , bool(rights & BLACK_QUEEN_SIDE))
+
+    @currCastlingRight.setter
+    def currCastlingRight(self , rights):
+        self.castlingRights = rights.getIndex()
+
+    '''
+        All the moves played so far as Move objects
+    '''
+    @property
+    def movesLog(self):
+        return [Move.fromPacked(move) for move in self.packedMovesLog]
 
     '''
         Undo the last move
     '''
     def undoMove(self):
-        if len(self.movesLog) != 0: #there should be some move
-            move = self.movesLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+        if len(self.packedMovesLog) != 0: #there should be some move
+            move = self.packedMovesLog.pop()
+            start = move & 63
+            end = (move >> 6) & 63
+            startRow , startCol = start >> 3 , start & 7
+            endRow , endCol = end >> 3 , end & 7
+            pieceMoved = PIECES[(move >> 12) & 15]
+            pieceCaptured = PIECES[(move >> 16) & 15]
+            kind = (move >> 20) & 3
+
+            self.board[startRow][startCol] = pieceMoved
+            self.board[endRow][endCol] = pieceCaptured
             self.whiteToMove = not self.whiteToMove
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
+            if pieceMoved == "wK":
+                self.whiteKingLocation = (startRow, startCol)
+            elif pieceMoved == "bK":
+                self.blackKingLocation = (startRow, startCol)
 
             # undo enPassant
-            if move.isEnPassantMove:
-                self.board[move.endRow][move.endCol] = "--"
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enPassantPossible = (move.endRow, move.endCol)
-            
-            # undo 2 square advance
-            if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-                self.enPassantPossible = ()
+            if kind == EN_PASSANT_MOVE:
+                self.board[endRow][endCol] = "--"
+                self.board[startRow][endCol] = pieceCaptured
 
             # undo castling
-            self.castlingRightLog.pop()
-            self.currCastlingRight = self.castlingRightLog[-1]
-            
-            if move.isCastleMove:
-                if move.endCol - move.startCol == 2 :
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1]
-                    self.board[move.endRow][move.endCol - 1] = '--'
+            elif kind == CASTLE_MOVE:
+                if endCol - startCol == 2 :
+                    self.board[endRow][endCol + 1] = self.board[endRow][endCol - 1]
+                    self.board[endRow][endCol - 1] = '--'
                 else:
-                    self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1]
-                    self.board[move.endRow][move.endCol + 1] = '--'
+                    self.board[endRow][endCol - 2] = self.board[endRow][endCol + 1]
+                    self.board[endRow][endCol + 1] = '--'
+            
+            # restore the castling rights, en passant square and halfmove clock of the previous position
+            state = self.stateLog.pop()
+            self.castlingRights = state & 15
+            self.enPassantPossible = SQUARE_COORDINATES[((state >> 4) & 127) - 1] if (state >> 4) & 127 else ()
+            self.halfmoveClock = state >> 11
+
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            self.updateEvaluation(move, -1)
 
             self.checkmate = False
             self.stalemate = False
 
     '''
-        All moves considering checks(King Under Attack)
+        All moves considering checks as Move objects, for the UI
     '''
     def getValidMoves(self):
+        return [Move.fromPacked(move) for move in self.getValidPackedMoves()]
+
+    '''
+        All moves considering checks(King Under Attack) as packed moves.
+        With a moveCache the moves of a position seen before are taken from it, checkmate, stalemate and inCheck
+        are set the same way as when they are generated
+    '''
+    def getValidPackedMoves(self):
+        cache = self.moveCache
+        if cache is None:
+            moves = self.generateValidPackedMoves()
+        else:
+            cached = cache.get(self.zobristKey)
+            if cached is None:
+                moves = self.generateValidPackedMoves()
+                cache.put(self.zobristKey, (array('I', moves), self.inCheck))
+            else:
+                moves = list(cached[0])
+                self.inCheck = cached[1]
+        if len(moves) == 0:
+            if self.inCheck:
+                self.checkmate = True
+            else:
+                self.stalemate = True
+        return moves
+
+    '''
+        Generate the legal moves from scratch, also sets inCheck
+    '''
+    def generateValidPackedMoves(self):
         tempEnPassantPossible = self.enPassantPossible
-        tempCastleRights = castleRights(self.currCastlingRight.wks , self.currCastlingRight.bks,
-                                        self.currCastlingRight.wqs , self.currCastlingRight.bqs)
+        tempCastleRights = self.castlingRights
         moves = []
         self.inCheck , self.pins , self.checks = self.checkForPinsAndChecks()
+        self.attackMap = self.getAttackMap('b' if self.whiteToMove else 'w') # shared by king moves and castling
         if self.whiteToMove:
             kingRow = self.whiteKingLocation[0]
             kingCol = self.whiteKingLocation[1]
@@ -161,30 +564,23 @@ class GameState():
         
         if self.inCheck:
             if len(self.checks) == 1: # only 1 check -> block check or move kings
-                moves = self.getAllPossibleMoves()
-                if self.whiteToMove:
-                    self.getCastleMoves(self.whiteKingLocation[0] , self.whiteKingLocation[1] , moves)  
-                else:
-                    self.getCastleMoves(self.blackKingLocation[0] , self.blackKingLocation[1] , moves)
+                self.getKingMoves(kingRow , kingCol , moves)
                 # to block one of piece should be between kings and enemy's piece
                 check = self.checks[0]
                 checkRow = check[0]
                 checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = [] # block where piece can move
-                if pieceChecking == 'N': # if it's knight we must capture knight
-                    validSquares = [(checkRow , checkCol)]
-                else:
+                validSquares = [(checkRow , checkCol)] # a knight can only be captured
+                if self.board[checkRow][checkCol][1] != 'N':
                     for i in range(1,8):
                         validSquare = (kingRow + check[2]*i , kingCol + check[3]*i)
-                        validSquares.append(validSquare)
                         if validSquare[0] == checkRow and validSquare[1] == checkCol:
                             break
-                # get rid of the moves that don't block check or move king
-                for i in range(len(moves)-1 , -1 , -1):
-                    if moves[i].pieceMoved[1] != 'K':
-                        if not (moves[i].endRow , moves[i].endCol) in validSquares:
-                            moves.remove(moves[i])
+                        validSquares.append(validSquare)
+                # only look for the moves that land on those squares instead of generating everything
+                pinned = {(pin[0] , pin[1]) for pin in self.pins} # a pinned piece can never stop a check
+                for row , col in validSquares:
+                    self.getMovesToSquare(row , col , pinned , moves)
+                self.getEnPassantEvasions(moves)
             else: # double checks
                 self.getKingMoves(kingRow , kingCol , moves)
         else: # no checks means all are valid
@@ -194,15 +590,268 @@ class GameState():
             else:
                 self.getCastleMoves(self.blackKingLocation[0] , self.blackKingLocation[1] , moves)
         self.enPassantPossible = tempEnPassantPossible
-        self.currCastlingRight = tempCastleRights
-        if len(moves) == 0:
-            if self.inCheck:
-                self.checkmate = True
-            else:
-                self.stalemate = True
+        self.castlingRights = tempCastleRights
+        return moves
+
+    '''
+        Moves of our pieces other than the king to the square (row, col), found by looking backwards from the square.
+        Used for check evasions : the square is either the checking piece or a square between it and our king
+    '''
+    def getMovesToSquare(self , row , col , pinned , moves):
+        board = self.board
+        ourColor = 'w' if self.whiteToMove else 'b'
+        capture = board[row][col] != "--"
+        sq = row*8 + col
+        for startRow , startCol in KNIGHT_SQUARES[sq]:
+            if board[startRow][startCol] == ourColor + 'N' and (startRow , startCol) not in pinned:
+                moves.append(packMove(startRow , startCol , row , col , board))
+        rays = RAY_SQUARES[sq]
+        for j in range(8):
+            slider = 'R' if j < 4 else 'B'
+            for startRow , startCol in rays[j]:
+                piece = board[startRow][startCol]
+                if piece != "--":
+                    if piece[0] == ourColor and (piece[1] == slider or piece[1] == 'Q') and (startRow , startCol) not in pinned:
+                        moves.append(packMove(startRow , startCol , row , col , board))
+                    break
+        pawnRow = row + 1 if self.whiteToMove else row - 1 # where one of our pawns would come from
+        if not 0 <= pawnRow < 8:
+            return
+        if capture:
+            for startCol in (col - 1 , col + 1):
+                if 0 <= startCol < 8 and board[pawnRow][startCol] == ourColor + 'P' and (pawnRow , startCol) not in pinned:
+                    self.addPawnMove(pawnRow , startCol , row , col , moves)
+        elif board[pawnRow][col] == ourColor + 'P':
+            if (pawnRow , col) not in pinned:
+                self.addPawnMove(pawnRow , col , row , col , moves)
+        elif board[pawnRow][col] == "--" and row == (4 if self.whiteToMove else 3): # a double push blocks
+            startRow = 6 if self.whiteToMove else 1
+            if board[startRow][col] == ourColor + 'P' and (startRow , col) not in pinned:
+                moves.append(packMove(startRow , col , row , col , board))
+
+    '''
+        En passant captures that get our king out of check, isEnPassantLegal plays them out to be sure
+    '''
+    def getEnPassantEvasions(self , moves):
+        if self.enPassantPossible == ():
+            return
+        endRow , endCol = self.enPassantPossible
+        ourPawn = ('w' if self.whiteToMove else 'b') + 'P'
+        row = endRow + 1 if self.whiteToMove else endRow - 1
+        for col in (endCol - 1 , endCol + 1):
+            if 0 <= col < 8 and self.board[row][col] == ourPawn and self.isEnPassantLegal(row , col , endRow , endCol):
+                moves.append(packMove(row , col , endRow , endCol , self.board , EN_PASSANT_MOVE))
 
+    '''
+        Only the captures (en passant included) and promotions among the valid moves, as packed moves.
+        Made for the quiescence search, the quiet moves are never generated. Doesn't set checkmate or stalemate
+    '''
+    def getCapturePackedMoves(self):
+        self.inCheck , pins , self.checks = self.checkForPinsAndChecks()
+        if self.inCheck: # rare in the quiescence search, the evasions are filtered from the valid moves
+            return [move for move in self.getEvasions() if (move >> 16) & 15 or (move >> 20) & 3 == PROMOTION_MOVE]
+
+        board = self.board
+        ourColor , enemyColor = ('w' , 'b') if self.whiteToMove else ('b' , 'w')
+        pinDirections = {(pin[0] , pin[1]) : (pin[2] , pin[3]) for pin in pins}
+        pawnStep = -1 if self.whiteToMove else 1
+        lastRow = 0 if self.whiteToMove else 7
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != ourColor:
+                    continue
+                type = piece[1]
+                pin = pinDirections.get((row , col))
+                if type == 'P':
+                    endRow = row + pawnStep
+                    if endRow == lastRow and board[endRow][col] == "--" and (pin is None or pin[1] == 0):
+                        self.addPawnMove(row , col , endRow , col , moves)
+                    for endCol in (col - 1 , col + 1):
+                        if 0 <= endCol < 8 and (pin is None or pin == (pawnStep , endCol - col) or pin == (-pawnStep , col - endCol)):
+                            if board[endRow][endCol][0] == enemyColor:
+                                self.addPawnMove(row , col , endRow , endCol , moves)
+                            elif (endRow , endCol) == self.enPassantPossible and self.isEnPassantLegal(row , col , endRow , endCol):
+                                moves.append(packMove(row , col , endRow , endCol , board , EN_PASSANT_MOVE))
+                elif type == 'N':
+                    if pin is None: # a pinned knight can never move
+                        for endRow , endCol in KNIGHT_SQUARES[row*8 + col]:
+                            if board[endRow][endCol][0] == enemyColor:
+                                moves.append(packMove(row , col , endRow , endCol , board))
+                elif type == 'K':
+                    for endRow , endCol in KING_SQUARES[row*8 + col]:
+                        if board[endRow][endCol][0] == enemyColor and not self.isSquareAttacked(endRow , endCol , enemyColor):
+                            moves.append(packMove(row , col , endRow , endCol , board))
+                else:
+                    rays = RAY_SQUARES[row*8 + col]
+                    for j in (range(4) if type == 'R' else range(4 , 8) if type == 'B' else range(8)):
+                        if pin is not None and pin != KING_OFFSETS[j] and pin != (-KING_OFFSETS[j][0] , -KING_OFFSETS[j][1]):
+                            continue
+                        for endRow , endCol in rays[j]:
+                            endPiece = board[endRow][endCol]
+                            if endPiece != "--":
+                                if endPiece[0] == enemyColor:
+                                    moves.append(packMove(row , col , endRow , endCol , board))
+                                break
+        return moves
+
+    '''
+        Valid moves of a position in check, kept for the other stage of the same position so they are generated once
+    '''
+    def getEvasions(self):
+        if self.evasions is not None and self.evasions[0] == self.zobristKey:
+            return self.evasions[1]
+        checkmate , stalemate = self.checkmate , self.stalemate
+        moves = self.getValidPackedMoves()
+        self.checkmate , self.stalemate = checkmate , stalemate
+        self.evasions = (self.zobristKey , moves)
+        return moves
+
+    '''
+        Only the valid moves that neither capture nor promote, as packed moves, generated directly like
+        getCapturePackedMoves : pawn pushes, knight, king and slider moves to empty squares and castling
+    '''
+    def getQuietPackedMoves(self):
+        self.inCheck , pins , self.checks = self.checkForPinsAndChecks()
+        if self.inCheck:
+            return [move for move in self.getEvasions() if not (move >> 16) & 15 and (move >> 20) & 3 != PROMOTION_MOVE]
+
+        board = self.board
+        ourColor , enemyColor = ('w' , 'b') if self.whiteToMove else ('b' , 'w')
+        self.attackMap = self.getAttackMap(enemyColor) # for the king moves and castling
+        pinDirections = {(pin[0] , pin[1]) : (pin[2] , pin[3]) for pin in pins}
+        pawnStep = -1 if self.whiteToMove else 1
+        lastRow , startRow = (0 , 6) if self.whiteToMove else (7 , 1)
+        moves = []
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != ourColor:
+                    continue
+                type = piece[1]
+                pin = pinDirections.get((row , col))
+                if type == 'P':
+                    endRow = row + pawnStep
+                    if endRow != lastRow and board[endRow][col] == "--" and (pin is None or pin[1] == 0):
+                        moves.append(packMove(row , col , endRow , col , board))
+                        if row == startRow and board[endRow + pawnStep][col] == "--":
+                            moves.append(packMove(row , col , endRow + pawnStep , col , board))
+                elif type == 'N':
+                    if pin is None:
+                        for endRow , endCol in KNIGHT_SQUARES[row*8 + col]:
+                            if board[endRow][endCol] == "--":
+                                moves.append(packMove(row , col , endRow , endCol , board))
+                elif type == 'K':
+                    for endRow , endCol in KING_SQUARES[row*8 + col]:
+                        if board[endRow][endCol] == "--" and not (self.attackMap >> (endRow*8 + endCol)) & 1:
+                            moves.append(packMove(row , col , endRow , endCol , board))
+                    self.getCastleMoves(row , col , moves)
+                else:
+                    rays = RAY_SQUARES[row*8 + col]
+                    for j in (range(4) if type == 'R' else range(4 , 8) if type == 'B' else range(8)):
+                        if pin is not None and pin != KING_OFFSETS[j] and pin != (-KING_OFFSETS[j][0] , -KING_OFFSETS[j][1]):
+                            continue
+                        for endRow , endCol in rays[j]:
+                            if board[endRow][endCol] != "--":
+                                break
+                            moves.append(packMove(row , col , endRow , endCol , board))
         return moves
 
+    '''
+        Is the packed move a valid move in this position, without generating the moves.
+        For moves that come from somewhere else (the transposition table, the killer moves of the search),
+        castling is never accepted here
+    '''
+    def isValidPackedMove(self , move):
+        start = move & 63
+        end = (move >> 6) & 63
+        startRow , startCol = start >> 3 , start & 7
+        endRow , endCol = end >> 3 , end & 7
+        pieceMoved = PIECES[(move >> 12) & 15]
+        pieceCaptured = PIECES[(move >> 16) & 15]
+        kind = (move >> 20) & 3
+        ourColor = 'w' if self.whiteToMove else 'b'
+        board = self.board
+        if pieceMoved[0] != ourColor or board[startRow][startCol] != pieceMoved or pieceCaptured[0] == ourColor \
+                or kind == CASTLE_MOVE:
+            return False
+        if kind == EN_PASSANT_MOVE:
+            if (endRow , endCol) != self.enPassantPossible or board[startRow][endCol] != pieceCaptured:
+                return False
+        elif board[endRow][endCol] != pieceCaptured:
+            return False
+
+        # can the piece get there
+        type = pieceMoved[1]
+        if type == 'P':
+            step = -1 if self.whiteToMove else 1
+            if (kind == PROMOTION_MOVE) != (endRow == (0 if self.whiteToMove else 7)):
+                return False
+            if pieceCaptured != "--":
+                if endRow != startRow + step or abs(endCol - startCol) != 1:
+                    return False
+            elif endCol != startCol:
+                return False
+            elif endRow != startRow + step and not (startRow == (6 if self.whiteToMove else 1) and
+                                                    endRow == startRow + 2*step and board[startRow + step][startCol] == "--"):
+                return False
+        elif kind != NORMAL_MOVE:
+            return False
+        elif type == 'N':
+            if (endRow , endCol) not in KNIGHT_SQUARES[start]:
+                return False
+        elif type == 'K':
+            if (endRow , endCol) not in KING_SQUARES[start]:
+                return False
+        else:
+            rays = RAY_SQUARES[start]
+            for j in (range(4) if type == 'R' else range(4 , 8) if type == 'B' else range(8)):
+                if (endRow , endCol) in rays[j]:
+                    between = rays[j][:rays[j].index((endRow , endCol))]
+                    if any(board[row][col] != "--" for row , col in between):
+                        return False
+                    break
+            else:
+                return False
+
+        # play it out to see if it leaves our king in check
+        self.makePackedMove(move)
+        kingRow , kingCol = self.blackKingLocation if self.whiteToMove else self.whiteKingLocation
+        legal = not self.isSquareAttacked(kingRow , kingCol , 'w' if self.whiteToMove else 'b')
+        self.undoMove()
+        return legal
+
+    '''
+        The valid moves in stages as a generator : the hash move, the captures and promotions (in captureOrder),
+        the killer moves, then the quiet moves (in quietOrder). A stage is only generated when the previous ones
+        are used up, so nothing more is generated once the consumer stops. Every move comes out once.
+        captureOrder and quietOrder are sort keys for packed moves, highest first
+    '''
+    def getStagedPackedMoves(self , hashMove = None , killers = () , captureOrder = None , quietOrder = None):
+        if hashMove is not None and self.isValidPackedMove(hashMove):
+            yield hashMove
+        else:
+            hashMove = None
+        captures = self.getCapturePackedMoves()
+        if captureOrder is not None:
+            captures.sort(key = captureOrder , reverse = True)
+        for move in captures:
+            if move != hashMove:
+                yield move
+        usedKillers = []
+        for killer in killers:
+            if killer is not None and killer != hashMove and killer not in usedKillers and not (killer >> 16) & 15 \
+                    and (killer >> 20) & 3 != PROMOTION_MOVE and self.isValidPackedMove(killer):
+                usedKillers.append(killer)
+                yield killer
+        quiets = self.getQuietPackedMoves()
+        if quietOrder is not None:
+            quiets.sort(key = quietOrder , reverse = True)
+        for move in quiets:
+            if move != hashMove and move not in usedKillers:
+                yield move
+
 
     # Naive Algorithm
     # def getValidMoves(self):
@@ -246,14 +895,75 @@ class GameState():
     '''
 
     def squareUnderAttack(self, row, col):
-        self.whiteToMove = not self.whiteToMove # switch to opponent's point of view
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove # switch back to original turn
-        for move in oppMoves:
-            if move.endRow == row and move.endCol == col: # square is under attack
+        return self.isSquareAttacked(row , col , 'b' if self.whiteToMove else 'w')
+
+    '''
+        Determine if a piece of enemyColor attacks the square(row, col), looking backwards from the square :
+        a knight a knight's jump away, a pawn or king next to it, or a slider at the end of a ray.
+        The king of the other color doesn't block rays, so squares behind it along a checking ray count as attacked
+    '''
+    def isSquareAttacked(self, row, col, enemyColor):
+        board = self.board
+        sq = row*8 + col
+        for endRow , endCol in KNIGHT_SQUARES[sq]:
+            if board[endRow][endCol] == enemyColor + 'N':
+                return True
+        for endRow , endCol in KING_SQUARES[sq]:
+            if board[endRow][endCol] == enemyColor + 'K':
                 return True
+        pawnRow = row + 1 if enemyColor == 'w' else row - 1 # white pawns attack upwards
+        if 0 <= pawnRow < 8:
+            if (col > 0 and board[pawnRow][col-1] == enemyColor + 'P') or (col < 7 and board[pawnRow][col+1] == enemyColor + 'P'):
+                return True
+        ourKing = ('b' if enemyColor == 'w' else 'w') + 'K'
+        rays = RAY_SQUARES[sq]
+        for j in range(8):
+            slider = 'R' if j < 4 else 'B'
+            for endRow , endCol in rays[j]:
+                endPiece = board[endRow][endCol]
+                if endPiece != '--' and endPiece != ourKing:
+                    if endPiece[0] == enemyColor and (endPiece[1] == slider or endPiece[1] == 'Q'):
+                        return True
+                    break
         return False
 
+    '''
+        All the squares attacked by enemyColor as bits (1 << (row*8 + col)), computed once per position.
+        Like isSquareAttacked the king of the other color doesn't block rays
+    '''
+    def getAttackMap(self, enemyColor):
+        board = self.board
+        ourKing = ('b' if enemyColor == 'w' else 'w') + 'K'
+        pawnStep = -1 if enemyColor == 'w' else 1
+        attacks = 0
+        for row in range(8):
+            for col in range(8):
+                piece = board[row][col]
+                if piece[0] != enemyColor:
+                    continue
+                sq = row*8 + col
+                type = piece[1]
+                if type == 'P':
+                    endRow = row + pawnStep
+                    if 0 <= endRow < 8:
+                        if col > 0:
+                            attacks |= 1 << (endRow*8 + col - 1)
+                        if col < 7:
+                            attacks |= 1 << (endRow*8 + col + 1)
+                elif type == 'N':
+                    attacks |= KNIGHT_MASKS[sq]
+                elif type == 'K':
+                    attacks |= KING_MASKS[sq]
+                else:
+                    rays = RAY_SQUARES[sq]
+                    for j in (range(4) if type == 'R' else range(4, 8) if type == 'B' else range(8)):
+                        for endRow , endCol in rays[j]:
+                            attacks |= 1 << (endRow*8 + endCol)
+                            endPiece = board[endRow][endCol]
+                            if endPiece != '--' and endPiece != ourKing:
+                                break
+        return attacks
+
     '''
         All moves without considering checks(King Under Attack)
     '''
@@ -283,47 +993,73 @@ class GameState():
 
         if self.whiteToMove:
             if row-1 >=0 and self.board[row-1][col] == "--": # If the white pawn can be advanced one square
-                if not piecePinned or pinDirection == (-1,0):
-                    moves.append(Move((row, col), (row-1, col), self.board))
+                if not piecePinned or pinDirection in ((-1,0) , (1,0)):
+                    self.addPawnMove(row, col, row-1, col, moves)
                     if row == 6 and self.board[row-2][col] == "--": # If the white pawn can advance 2 squares on initial move
-                        moves.append(Move((row, col), (row-2, col), self.board))
+                        moves.append(packMove(row, col, row-2, col, self.board))
             
             # Capturing moves by capturing pieces of opposite color
             if col-1 >=0 and self.board[row-1][col-1][0] == 'b': # left diagonal move
                 if not piecePinned or pinDirection == (-1,-1):
-                    moves.append(Move((row, col), (row-1, col-1), self.board))
-            elif (row-1, col-1) == self.enPassantPossible:
-                moves.append(Move((row, col), (row-1, col-1), self.board, isEnPassantMove = True))
+                    self.addPawnMove(row, col, row-1, col-1, moves)
+            elif (row-1, col-1) == self.enPassantPossible and self.isEnPassantLegal(row, col, row-1, col-1):
+                moves.append(packMove(row, col, row-1, col-1, self.board, EN_PASSANT_MOVE))
 
 
             if col+1 < 8 and self.board[row-1][col+1][0] == 'b':  # right diagonal move
                 if not piecePinned or pinDirection == (-1,1):
-                    moves.append(Move((row, col), (row-1, col+1), self.board))
-            elif (row-1, col+1) == self.enPassantPossible:
-                moves.append(Move((row, col), (row-1, col+1), self.board, isEnPassantMove = True))
+                    self.addPawnMove(row, col, row-1, col+1, moves)
+            elif (row-1, col+1) == self.enPassantPossible and self.isEnPassantLegal(row, col, row-1, col+1):
+                moves.append(packMove(row, col, row-1, col+1, self.board, EN_PASSANT_MOVE))
                  
         else: # black pawn moves
             if row+1 < 8 and self.board[row+1][col] == "--": # If the pawn can be advanced one square
-                if not piecePinned or pinDirection == (1,0):
-                    moves.append(Move((row, col), (row+1, col), self.board))
+                if not piecePinned or pinDirection in ((1,0) , (-1,0)):
+                    self.addPawnMove(row, col, row+1, col, moves)
                     if row == 1 and self.board[row+2][col] == "--": # If the black pawn can be advanced 2 squares on the initial move
-                        moves.append(Move((row, col), (row+2, col), self.board))
+                        moves.append(packMove(row, col, row+2, col, self.board))
             
             # Capturing moves by capturing pieces of opposite color
             if col-1 >=0 and self.board[row+1][col-1][0] == 'w': # right diagonal move
                 if not piecePinned or pinDirection == (1,-1):
-                    moves.append(Move((row, col), (row+1, col-1), self.board))
-            elif (row+1, col-1) == self.enPassantPossible:
-                moves.append(Move((row, col), (row+1, col-1), self.board, isEnPassantMove = True))
+                    self.addPawnMove(row, col, row+1, col-1, moves)
+            elif (row+1, col-1) == self.enPassantPossible and self.isEnPassantLegal(row, col, row+1, col-1):
+                moves.append(packMove(row, col, row+1, col-1, self.board, EN_PASSANT_MOVE))
 
             if col+1 < 8 and self.board[row+1][col+1][0] == 'w':  # left diagonal move
                 if not piecePinned or pinDirection == (1,1):
-                    moves.append(Move((row, col), (row+1, col+1), self.board))
-            elif (row+1, col+1) == self.enPassantPossible:
-                moves.append(Move((row, col), (row+1, col+1), self.board, isEnPassantMove = True))
+                    self.addPawnMove(row, col, row+1, col+1, moves)
+            elif (row+1, col+1) == self.enPassantPossible and self.isEnPassantLegal(row, col, row+1, col+1):
+                moves.append(packMove(row, col, row+1, col+1, self.board, EN_PASSANT_MOVE))
             
         # add pawn promotion
 
+    '''
+        Add a pawn move, a pawn reaching the last row is added once for every piece it can be promoted to
+    '''
+    def addPawnMove(self, startRow, startCol, endRow, endCol, moves):
+        if endRow == 0 or endRow == 7:
+            for promotion in range(len(PROMOTION_PIECES)):
+                moves.append(packMove(startRow, startCol, endRow, endCol, self.board, PROMOTION_MOVE, promotion))
+        else:
+            moves.append(packMove(startRow, startCol, endRow, endCol, self.board))
+
+    '''
+        En passant removes two pawns from the same row at once, which the pin detection can't see,
+        so play the capture out on the board and check whether our king is left in check
+    '''
+    def isEnPassantLegal(self, row, col, endRow, endCol):
+        pawn = self.board[row][col]
+        capturedPawn = self.board[row][endCol]
+        self.board[row][col] = "--"
+        self.board[row][endCol] = "--"
+        self.board[endRow][endCol] = pawn
+        inCheck = self.checkForPinsAndChecks()[0]
+        self.board[row][col] = pawn
+        self.board[row][endCol] = capturedPawn
+        self.board[endRow][endCol] = "--"
+        return not inCheck
+
     '''
         Get all the possible moves for rook 
     '''
@@ -348,9 +1084,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0] , -d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == '--':
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                         elif endPiece[0] == enemyColor:   # if we capture then we need to break 
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                             break
                         else: # if our piece is there then also we need to break
                             break
@@ -378,7 +1114,7 @@ class GameState():
                 if not piecePinned:
                     endPiece = self.board[endRow][endCol]
                     if endPiece[0] != ourColor:
-                        moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                        moves.append(packMove(row , col , endRow , endCol , self.board))
 
 
     '''
@@ -404,9 +1140,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0] , -d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == '--':
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                         elif endPiece[0] == enemyColor:   # if we capture then we need to break 
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                             break
                         else: # if our piece is there then also we need to break
                             break
@@ -439,9 +1175,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0] , -d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == '--':
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                         elif endPiece[0] == enemyColor:   # if we capture then we need to break 
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                             break
                         else: # if our piece is there then also we need to break
                             break
@@ -465,9 +1201,9 @@ class GameState():
                     if not piecePinned or pinDirection == d or pinDirection == (-d[0] , -d[1]):
                         endPiece = self.board[endRow][endCol]
                         if endPiece == '--':
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                         elif endPiece[0] == enemyColor:   # if we capture then we need to break 
-                            moves.append(Move((row,col) , (endRow , endCol) , self.board))
+                            moves.append(packMove(row , col , endRow , endCol , self.board))
                             break
                         else: # if our piece is there then also we need to break
                             break
@@ -481,54 +1217,36 @@ class GameState():
         Get all the possible moves for king 
     '''
     def getKingMoves(self , row , col ,moves):
-        rowMoves = [-1,-1,-1,0,0,1,1,1]
-        colMoves = [-1,0,1,-1,1,-1,0,1]
         ourColor = 'w' if self.whiteToMove else 'b'
-        for m in range(8):
-            endRow = row + rowMoves[m]
-            endCol = col + colMoves[m]
-            if endRow>=0 and endRow<8 and endCol>=0 and endCol<8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != ourColor: # not our piece
-
-                    #place the king on the square and check if it would receive a check
-                    if ourColor == 'w':
-                        self.whiteKingLocation = (endRow , endCol)
-                    else:
-                        self.blackKingLocation = (endRow , endCol)
-                    inCheck , pins , checks = self.checkForPinsAndChecks()
-
-                    if not inCheck:
-                        moves.append(Move((row,col) , (endRow , endCol) , self.board))
-
-                    # placing king back on it's location
-                    if ourColor == 'w':
-                        self.whiteKingLocation = (row , col)
-                    else:
-                        self.blackKingLocation = (row , col)    
+        for endRow , endCol in KING_SQUARES[row*8 + col]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece[0] != ourColor: # not our piece
+                # the king can't step onto a square the enemy attacks
+                if not (self.attackMap >> (endRow*8 + endCol)) & 1:
+                    moves.append(packMove(row , col , endRow , endCol , self.board))
 
     
     """
         Generate all possible castle moves for king
     """
     def getCastleMoves(self , row , col , moves):
-        if self.squareUnderAttack(row , col , ):
+        if self.inCheck:
             return # can't castle
-        if (self.whiteToMove and self.currCastlingRight.wks) or (not self.whiteToMove and self.currCastlingRight.bks):
+        if self.castlingRights & (WHITE_KING_SIDE if self.whiteToMove else BLACK_KING_SIDE):
             self.getKingSideCastleMoves(row , col , moves)
         
-        if (self.whiteToMove and self.currCastlingRight.wqs) or (not self.whiteToMove and self.currCastlingRight.bqs):
+        if self.castlingRights & (WHITE_QUEEN_SIDE if self.whiteToMove else BLACK_QUEEN_SIDE):
             self.getQueenSideCastleMoves(row , col , moves)
     
     def getKingSideCastleMoves(self , row , col , moves):
         if self.board[row][col+1] == '--' and self.board[row][col+2] == '--':
-            if not self.squareUnderAttack(row , col + 1) and not self.squareUnderAttack(row , col+2):
-                moves.append(Move((row , col) , (row , col + 2) , self.board , isCastleMove = True))
+            if not (self.attackMap >> (row*8 + col + 1)) & 3: # neither square the king passes is attacked
+                moves.append(packMove(row , col , row , col + 2 , self.board , CASTLE_MOVE))
 
     def getQueenSideCastleMoves(self , row , col , moves):
-        if self.board[row][col-1] == '--' and self.board[row][col-2] == '--' and self.board[row][col-3]:
-            if not self.squareUnderAttack(row , col - 1) and not self.squareUnderAttack(row , col - 2):
-                moves.append(Move((row , col) , (row , col - 2) , self.board , isCastleMove = True))
+        if self.board[row][col-1] == '--' and self.board[row][col-2] == '--' and self.board[row][col-3] == '--':
+            if not (self.attackMap >> (row*8 + col - 2)) & 3:
+                moves.append(packMove(row , col , row , col - 2 , self.board , CASTLE_MOVE))
 
 
     
@@ -599,9 +1317,18 @@ class castleRights():
         self.bks = bks
         self.wqs = wqs
         self.bqs = bqs
+
+    """
+        The four rights as a 4 bit number
+    """
+    def getIndex(self):
+        return self.wks | self.wqs << 1 | self.bks << 2 | self.bqs << 3
     
 
 class Move():
+    # only built for the UI and notation, so no per instance dict
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'promotionPiece', 'isCastleMove', 'isEnPassantMove', 'moveID', 'packed')
 
     # Mapping to map row and column to rank and file respectively
     ranksToRows = {"8" : 0, "7" : 1, "6" : 2, "5" : 3, "4" : 4, "3" : 5, "2" : 6, "1" : 7}
@@ -611,7 +1338,10 @@ class Move():
     colsToFiles = {cols : files for files, cols in filesToCols.items()}
 
 
-    def __init__(self, startSquare, endSquare, board, isEnPassantMove = False , isCastleMove = False):
+    # promotion piece in the ten thousands of the moveID, a queen adds nothing so a move clicked in the UI is a queen promotion
+    promotionCodes = {piece : code for code, piece in enumerate(PROMOTION_PIECES)}
+
+    def __init__(self, startSquare, endSquare, board, isEnPassantMove = False , isCastleMove = False , promotionPiece = 'Q'):
         self.startRow = startSquare[0]
         self.startCol = startSquare[1]
         self.endRow = endSquare[0]
@@ -620,6 +1350,7 @@ class Move():
         self.pieceCaptured = board[self.endRow][self.endCol]
         
         self.isPawnPromotion = (self.pieceMoved == "wP" and self.endRow == 0) or (self.pieceMoved == "bP" and self.endRow == 7)
+        self.promotionPiece = promotionPiece
         
         self.isCastleMove = isCastleMove
 
@@ -627,7 +1358,43 @@ class Move():
         if self.isEnPassantMove:
             self.pieceCaptured = "wP" if self.pieceMoved == "bP" else "bP"
 
+        self.setMoveID()
+        if self.isEnPassantMove:
+            kind = EN_PASSANT_MOVE
+        elif self.isCastleMove:
+            kind = CASTLE_MOVE
+        elif self.isPawnPromotion:
+            kind = PROMOTION_MOVE
+        else:
+            kind = NORMAL_MOVE
+        self.packed = packMove(self.startRow, self.startCol, self.endRow, self.endCol, board, kind,
+                               self.promotionCodes[promotionPiece] if self.isPawnPromotion else 0)
+
+    """
+        Build the Move of a packed move, it carries everything so no board is needed
+    """
+    @staticmethod
+    def fromPacked(packed):
+        move = Move.__new__(Move)
+        start = packed & 63
+        end = (packed >> 6) & 63
+        kind = (packed >> 20) & 3
+        move.startRow , move.startCol = start >> 3 , start & 7
+        move.endRow , move.endCol = end >> 3 , end & 7
+        move.pieceMoved = PIECES[(packed >> 12) & 15]
+        move.pieceCaptured = PIECES[(packed >> 16) & 15]
+        move.isPawnPromotion = kind == PROMOTION_MOVE
+        move.promotionPiece = PROMOTION_PIECES[(packed >> 22) & 3]
+        move.isCastleMove = kind == CASTLE_MOVE
+        move.isEnPassantMove = kind == EN_PASSANT_MOVE
+        move.packed = packed
+        move.setMoveID()
+        return move
+
+    def setMoveID(self):
         self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        if self.isPawnPromotion:
+            self.moveID += self.promotionCodes[self.promotionPiece] * 10000
 
     """
         overriding the equals method
@@ -638,7 +1405,10 @@ class Move():
         return False
 
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionPiece.lower()
+        return notation
 
     def getRankFile(self, row, col):
         return self.colsToFiles[col] + self.rowsToRanks[row]
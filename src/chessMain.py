@@ -3,42 +3,71 @@
 """
 
 import pygame as pg
-import math
-from pygame.constants import KEYDOWN
 import chessEngine
-import smartMoveFinder
+import bitboardEngine
+import transpositionTable
+import parallelSearch
+import backgroundSearch
+import moveCache
+import openingBook
+import bitbases
+import boardRenderer
+import spriteCache
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8
 SQUARE_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 28 # we'll use it for animation
 IMAGES = {}
+USE_BITBOARDS = True # generate the moves with the bitboard backend instead of scanning the 2D board
+HASH_SIZE_MB = 16 # memory of the AI's transposition table
+MOVE_CACHE_ENTRIES = 4096 # positions whose legal moves are remembered, 0 to always generate them
+AI_THINKING_TIME = 2 # seconds the AI searches for each move
+AI_WORKERS = 1 # processes the AI searches with, more than 1 splits the root moves over a process pool
+OPENING_BOOK = None # path of a Polyglot opening book (.bin) the AI plays its first moves from, None for no book
+PONDER = True # let the AI think on the human's expected reply during the human's turn
+BITBASES = bitbases.DEFAULT_DIRECTORY # directory of the endgame tables made by bitbases.py, unused if they aren't there
+SPRITE_CACHE = spriteCache.CACHE_PATH # file of the pieces scaled to SQUARE_SIZE, None to scale the PNGs at every launch
 
 """
-    Initialize global dictionary of images. called only once
+    Initialize global dictionary of images. called only once, from the sprite cache when it has SQUARE_SIZE
 """
 def loadImages():
-    pieces = ['wQ' , 'wK' , 'wP' , 'wR' , 'wN' , 'wB' , 'bQ' , 'bK' , 'bP' , 'bR' , 'bN' , 'bB']
-    for piece in pieces:
-        IMAGES[piece] = pg.transform.scale(pg.image.load(f"./images/{piece}.png") , (SQUARE_SIZE , SQUARE_SIZE))
+    IMAGES.update(spriteCache.loadSprites(SQUARE_SIZE, SPRITE_CACHE))
 
     # now we can access any image like IMAGES['wP']
 
 
+"""
+    Create a new game with the move generation backend selected by USE_BITBOARDS
+"""
+def newGameState():
+    gs = bitboardEngine.BitboardGameState() if USE_BITBOARDS else chessEngine.GameState()
+    if MOVE_CACHE_ENTRIES > 0:
+        gs.moveCache = moveCache.MoveCache(MOVE_CACHE_ENTRIES)
+    return gs
+
 
 """
-    The main driver for our code. this will update user input and also changes graphics
+    The main driver for our code. this will update user input and also changes graphics.
+    maxFrames stops the game after that many frames (to time the start up), None plays until the window is closed
 """
-def main():
-    pg.init()
+def main(maxFrames = None):
+    pg.display.init() # only the display, the font is started by the first text and sound is never used
     screen = pg.display.set_mode((WIDTH , HEIGHT))
     clock = pg.time.Clock()
-    screen.fill(pg.Color('white'))
-
-    gs = chessEngine.GameState()
     loadImages()
+    renderer = boardRenderer.BoardRenderer(screen, IMAGES, SQUARE_SIZE) # only draws the squares that changed
 
+    gs = newGameState()
     validMoves = gs.getValidMoves()
+    drawGameState(renderer, gs, validMoves, ()) # the board is shown before the AI is set up
+    hashTable = transpositionTable.TranspositionTable(HASH_SIZE_MB) # kept for the whole game
+    endgames = bitbases.Bitbases(BITBASES)
+    parallelAI = parallelSearch.ParallelSearch(AI_WORKERS, HASH_SIZE_MB, type(gs), BITBASES) if AI_WORKERS > 1 else None
+    book = openingBook.OpeningBook(OPENING_BOOK) if OPENING_BOOK is not None else None
+    ai = backgroundSearch.BackgroundSearch(hashTable, AI_THINKING_TIME, endgames, parallelAI) # searches in a thread
+
     moveMade = False # Flag variable for when move is made
     animate = False # Flag variable for when we want to animate
 
@@ -48,6 +77,7 @@ def main():
     gameOver = False
     playerOne = True # if a human is playing white,then this will be true and if AI is playing then this will be False
     playerTwo = False # same as above but for Black
+    frames = 0
     while running:
 
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
@@ -55,6 +85,8 @@ def main():
         for e in pg.event.get():
             if e.type == pg.QUIT:
                 running = False
+            elif e.type in (pg.WINDOWEXPOSED, pg.VIDEOEXPOSE): # the window was covered or restored
+                renderer.invalidate()
             elif e.type == pg.MOUSEBUTTONDOWN:  #mouse handler
                 if not gameOver and humanTurn:
                     location = pg.mouse.get_pos() # returns a tuple (x,y) of mouse coordinates
@@ -73,6 +105,7 @@ def main():
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
                                 gs.makeMove(validMoves[i])
+                                ai.humanMoved(validMoves[i])
                                 moveMade = True
                                 animate = True
                                 # reset user clicks
@@ -84,13 +117,16 @@ def main():
                             playerClicks = [squareSelected]
             elif e.type == pg.KEYDOWN:    #keyboard handler
                 if e.key == pg.K_z:  # control + z then undo move
+                    ai.cancel()
                     gs.undoMove()
                     gs.undoMove() # comment this line for 2 player game, uncomment for player vs AI
                     moveMade = True
                     animate = False
                     gameOver = False
                 elif e.key == pg.K_r: # reset the board when 'r' is pressed
-                    gs = chessEngine.GameState()
+                    ai.cancel()
+                    gs = newGameState()
+                    hashTable.clear()
                     validMoves = gs.getValidMoves()
                     squareSelected = ()
                     playerClicks = []
@@ -99,118 +135,79 @@ def main():
                     gameOver = False
 
         # AI Move finder 
+        # the search runs in the background, every frame checks whether it is done
         if not gameOver and not humanTurn:
-            AIMove = smartMoveFinder.findBestMoveMinMax(gs, validMoves)
-            if AIMove is None:
-                AIMove = smartMoveFinder.findRandomMove(validMoves)
-            gs.makeMove(AIMove)
-            moveMade = True
-            animate = True
+            if ai.isThinking():
+                AIMove = ai.getMove() # None until the search is done
+            else:
+                AIMove = book.findMove(gs, validMoves) if book is not None else None # no search while in the book
+                if AIMove is None:
+                    ai.think(gs)
+            if AIMove is not None:
+                gs.makeMove(AIMove)
+                moveMade = True
+                animate = True
 
 
         if moveMade:
             if(animate):
-                animateMove(gs.movesLog[-1], screen, gs.board, clock)
+                renderer.animateMove(gs.movesLog[-1], gs.board, clock)
             validMoves = gs.getValidMoves()
             animate = False
             moveMade = False
+            humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+            if PONDER and humanTurn and not (playerOne and playerTwo) and validMoves:
+                ai.ponder(gs, validMoves)
 
-        drawGameState(screen , gs, validMoves, squareSelected)
-
+        text = None
         if gs.checkmate:
             gameOver = True
             if gs.whiteToMove:
-                drawText(screen, "Black wins by checkmate")
+                text = "Black wins by checkmate"
             else:
-                drawText(screen, "White wins by checkmate")
+                text = "White wins by checkmate"
         elif gs.stalemate:
             gameOver = True
-            drawText(screen, "Stalemate")
+            text = "Stalemate"
+        drawGameState(renderer, gs, validMoves, squareSelected, text)
 
         clock.tick(MAX_FPS)
-        pg.display.flip()
+        frames += 1
+        if maxFrames is not None and frames >= maxFrames:
+            running = False
 
+    ai.cancel()
+    if gs.moveCache is not None:
+        print("move cache :", gs.moveCache.stats())
+    if parallelAI is not None:
+        parallelAI.close()
+    if book is not None:
+        book.close()
+    endgames.close()
 
 
 """
-    Responsible for graphics of current game state
+    Responsible for graphics of current game state, only what changed since the last frame is drawn and updated
 """
-def drawGameState(screen , gs, validMoves, squareSelected):
-    drawBoard(screen) #draw squares on the board
-    highlightSquares(screen, gs, validMoves, squareSelected)
-    drawPieces(screen , gs.board) #draw pieces on top of that squares
-
+def drawGameState(renderer, gs, validMoves, squareSelected, text = None):
+    dirty = renderer.draw(gs.board, highlightedSquares(gs, validMoves, squareSelected), text)
+    if dirty:
+        pg.display.update(dirty)
 
 
-def drawBoard(screen):
-    global colors
-    colors = [pg.Color('white') , pg.Color('gray')]
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            color = colors[(row+col)%2]# sum of the row number and column number in all white squares is even
-            pg.draw.rect(screen , color , pg.Rect(col*SQUARE_SIZE , row*SQUARE_SIZE , SQUARE_SIZE , SQUARE_SIZE))
-
-
-
-def drawPieces(screen , board):
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            piece = board[row][col]
-            if piece != "--": # not empty square then draw the piece
-                screen.blit(IMAGES[piece] , pg.Rect(col*SQUARE_SIZE , row*SQUARE_SIZE , SQUARE_SIZE , SQUARE_SIZE))
-
 '''
-    Highlight the selected piece and it's valid moves
+    Highlight the selected piece and it's valid moves, as (row, col) -> boardRenderer.SELECTED or MOVE_TARGET
 '''
-def highlightSquares(screen, gs, validMoves, squareSelected):
+def highlightedSquares(gs, validMoves, squareSelected):
+    highlights = {}
     if squareSelected != ():
         row, col = squareSelected
         if gs.board[row][col][0] == ('w' if gs.whiteToMove else 'b'): # square selected is of the same color whose turn is there
-            # highlight the selected square
-            surface = pg.Surface((SQUARE_SIZE, SQUARE_SIZE))
-            surface.set_alpha(100) # transparency value 0(transparent) to 255(opaque)
-            surface.fill(pg.Color('blue'))
-            screen.blit(surface, (col*SQUARE_SIZE, row*SQUARE_SIZE))
-            # highlighting the valid moves from that piece
-            surface.fill(pg.Color("yellow"))
-            for move in validMoves:
-                if move.startRow == row and move.startCol == col:
-                    screen.blit(surface, (move.endCol*SQUARE_SIZE, move.endRow*SQUARE_SIZE))
-
-            
-
-'''
-    Animating a move
-'''
-
-def animateMove(move, screen, board, clock):
-    global colors
-    coordinates = [] # list of coordinates that the animation will go through
-    deltaRow = move.endRow - move.startRow
-    deltaCol = move.endCol - move.startCol
-    framesPerSquareMove = 13
-    frameCount = math.isqrt((deltaRow * deltaRow) + (deltaCol*deltaCol)) * framesPerSquareMove
-    for frame in range(frameCount+1):
-        row, col = ((move.startRow + deltaRow*frame/frameCount, move.startCol + deltaCol*frame/frameCount))
-        drawBoard(screen)
-        drawPieces(screen, board)
-        # Make it seem like the piece is not at endSquare by superimposing on it it's square Color 
-        color = colors[(move.endRow+move.endCol)%2]
-        endSquare = pg.Rect(move.endCol*SQUARE_SIZE, move.endRow*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-        pg.draw.rect(screen, color, endSquare)
-        # Draw captured piece too on the square 
-        if move.pieceCaptured != "--":
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        # draw the moving piece
-        screen.blit(IMAGES[move.pieceMoved], pg.Rect(col*SQUARE_SIZE, row*SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
-        pg.display.flip()
-        clock.tick(80)
-
-def drawText(screen, text):
-    font = pg.font.SysFont("arial", 36, True, False)
-    textObject = font.render(text, 0, pg.Color("red"))
-    textLocation = pg.Rect(0, 0, WIDTH, HEIGHT).move(WIDTH/2 - textObject.get_width()/2, HEIGHT/2 - textObject.get_height()/2)
-    screen.blit(textObject, textLocation)
+            highlights[squareSelected] = boardRenderer.SELECTED
+            for move in validMoves: # highlighting the valid moves from that piece
+                if move.startRow == row and move.startCol == col and move.promotionPiece == 'Q': # under-promotions share the square
+                    highlights[(move.endRow, move.endCol)] = boardRenderer.MOVE_TARGET
+    return highlights
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,202 @@
+"""
+    Runs EPD test suites (https://www.chessprogramming.org/Extended_Position_Description) : every line is a position
+    (the first four FEN fields) followed by operations like bm (best moves, in SAN), am (moves to avoid) and id.
+    Every position is searched with a time or node limit, the positions are spread over a pool of processes, and it
+    reports how many were solved, how long the solutions took to find and the nodes per second, so search changes
+    can be measured on standard suites (Win At Chess, Bratko-Kopec, ...). Doesn't need pygame.
+
+    python epdSuite.py wac.epd                      1 second per position, one process per core
+    python epdSuite.py wac.epd -n 200000 -j 4       200000 nodes per position in 4 processes
+    python epdSuite.py wac.epd -t 0.5 -v            every position's result as it is done
+
+    A position is solved when the move of the last completed iteration is one of the bm moves (or none of the am
+    moves), its time to solution is when the search found the solution and then kept it until the end.
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bitbases
+import bitboardEngine
+import chessEngine
+from searchStats import SearchStats
+from smartMoveFinder import searchBestMove, MAX_DEPTH
+from transpositionTable import TranspositionTable
+
+BACKENDS = {'board' : chessEngine.GameState, 'bitboard' : bitboardEngine.BitboardGameState}
+DEFAULT_TIME = 1 # seconds per position when there is no limit
+WORKER_HASH_MB = 16
+EPD_TOKEN = re.compile(r'"[^"]*"|;|[^\s;]+') # operands of the operations, quoted strings stay whole
+
+# state of a worker process, set up once by initWorker
+workerGameState = None
+workerTable = None
+workerBitbases = None
+
+
+def initWorker(backend, hashSizeMB):
+    global workerGameState, workerTable, workerBitbases
+    workerGameState = BACKENDS[backend]()
+    workerTable = TranspositionTable(hashSizeMB)
+    workerBitbases = bitbases.Bitbases()
+
+
+"""
+    FEN (with the clocks of the hmvc and fmvn operations) and the operations of an EPD line, as a dict of the
+    operation name to its list of operands. Raises ValueError for a line that isn't EPD
+"""
+def parseEPD(line):
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError(f"invalid EPD : {line}")
+    operations = {}
+    operation = None
+    for token in EPD_TOKEN.findall(fields[4] if len(fields) > 4 else ""):
+        if token == ";":
+            operation = None
+        elif operation is None:
+            operation = token
+            operations[operation] = []
+        else:
+            operations[operation].append(token.strip('"'))
+    halfmoveClock = operations.get("hmvc", ["0"])[0]
+    fullmoveNumber = operations.get("fmvn", ["1"])[0]
+    return " ".join(fields[:4] + [halfmoveClock, fullmoveNumber]), operations
+
+
+"""
+    The positions of an EPD file as (id, fen, best moves, moves to avoid), the moves in SAN.
+    Positions without bm or am can't be scored and are left out
+"""
+def readSuite(path):
+    positions = []
+    with open(path) as file:
+        for number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fen, operations = parseEPD(line)
+            if "bm" not in operations and "am" not in operations:
+                continue
+            name = operations.get("id", [f"{os.path.basename(path)}:{number}"])[0]
+            positions.append((name, fen, operations.get("bm", []), operations.get("am", [])))
+    return positions
+
+
+"""
+    Runs in a worker : searches one position and returns (move in SAN, solved, seconds to the solution or None,
+    depth, nodes, seconds, error or None). Every position starts with an empty transposition table
+"""
+def solvePosition(fen, bestMoves, avoidMoves, timeLimit, nodeLimit):
+    gs = workerGameState
+    try:
+        gs.loadFEN(fen)
+        packedMoves = gs.getValidPackedMoves()
+        best = {gs.parseSAN(san, packedMoves) for san in bestMoves}
+        avoid = {gs.parseSAN(san, packedMoves) for san in avoidMoves}
+    except (ValueError, KeyError, IndexError) as error:
+        return None, False, None, 0, 0, 0, str(error)
+    def isSolution(move):
+        return move is not None and (move in best if best else move not in avoid)
+
+    workerTable.clear()
+    stats = SearchStats(timed = False)
+    depth = MAX_DEPTH if timeLimit is not None or nodeLimit is not None else 1
+    result = searchBestMove(gs, gs.getValidMoves(), depth, timeLimit, workerTable, nodeLimit, bitbases = workerBitbases,
+                            stats = stats)
+    if result.move is None:
+        return None, False, None, result.depth, result.nodes, result.time, "no legal move"
+    elapsed = 0
+    solvedAt = None # time of the iteration since which every iteration found a solution
+    for _, _, seconds, move in stats.iterations:
+        elapsed += seconds
+        if not isSolution(move):
+            solvedAt = None
+        elif solvedAt is None:
+            solvedAt = elapsed
+    solved = isSolution(result.move.packed)
+    return (gs.getSAN(result.move.packed, packedMoves), solved, solvedAt if solved else None, result.depth,
+            result.nodes, result.time, None)
+
+
+class SuiteResult():
+    def __init__(self, positions, results, wallTime):
+        self.positions = positions # (id, fen, best moves, moves to avoid)
+        self.results = results # what solvePosition returned for each position
+        self.wallTime = wallTime # seconds
+        self.solved = sum(1 for result in results if result[1])
+        self.errors = sum(1 for result in results if result[6] is not None)
+        self.nodes = sum(result[4] for result in results)
+        self.searchTime = sum(result[5] for result in results) # seconds, added up over the processes
+
+    def meanTimeToSolution(self):
+        times = [result[2] for result in self.results if result[1]]
+        return sum(times) / len(times) if times else 0
+
+    def nodesPerSecond(self):
+        return self.nodes / self.searchTime if self.searchTime > 0 else 0
+
+    def report(self):
+        return (f"solved {self.solved}/{len(self.positions)}  mean time to solution {self.meanTimeToSolution():.3f}s  "
+                f"{self.nodes} nodes  {int(self.nodesPerSecond())} nodes/s per process  "
+                f"{int(self.nodes / max(self.wallTime, 1e-9))} nodes/s in all  wall time {self.wallTime:.1f}s"
+                + (f"  {self.errors} positions with errors" if self.errors else ""))
+
+
+"""
+    Search every position with the limits in a pool of workers processes, show(index, result) is called as soon as
+    a position is done (in any order). Returns a SuiteResult
+"""
+def runSuite(positions, timeLimit = None, nodeLimit = None, workers = None, backend = "bitboard",
+             hashSizeMB = WORKER_HASH_MB, show = None):
+    if timeLimit is None and nodeLimit is None:
+        timeLimit = DEFAULT_TIME
+    workers = workers if workers is not None else os.cpu_count() or 1
+    results = [None]*len(positions)
+    startTime = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer = initWorker, initargs = (backend, hashSizeMB)) as executor:
+        futures = {executor.submit(solvePosition, fen, bestMoves, avoidMoves, timeLimit, nodeLimit) : index
+                   for index, (_, fen, bestMoves, avoidMoves) in enumerate(positions)}
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            if show is not None:
+                show(index, results[index])
+    return SuiteResult(positions, results, time.perf_counter() - startTime)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Run EPD test suites")
+    parser.add_argument("suites", nargs = "+", help = "EPD files")
+    parser.add_argument("-t", "--time", type = float, help = f"seconds per position (default : {DEFAULT_TIME})")
+    parser.add_argument("-n", "--nodes", type = int, help = "nodes per position")
+    parser.add_argument("-j", "--workers", type = int, help = "search processes (default : one per core)")
+    parser.add_argument("-b", "--backend", choices = sorted(BACKENDS), default = "bitboard")
+    parser.add_argument("--hash", type = int, default = WORKER_HASH_MB, help = "transposition table MB per process")
+    parser.add_argument("-v", "--verbose", action = "store_true", help = "show every position's result")
+    args = parser.parse_args(argv)
+
+    for path in args.suites:
+        positions = readSuite(path)
+        print(f"{path} : {len(positions)} positions")
+
+        def show(index, result):
+            name, _, bestMoves, avoidMoves = positions[index]
+            move, solved, solvedAt, depth, nodes, elapsed, error = result
+            if error is not None:
+                print(f"  {name:<16} error : {error}")
+                return
+            expected = ("bm " + " ".join(bestMoves)) if bestMoves else ("am " + " ".join(avoidMoves))
+            found = f"solved in {solvedAt:.3f}s" if solved else "not solved"
+            print(f"  {name:<16} {move:<8} {expected:<16} {found:<20} depth {depth:<3} {nodes} nodes")
+        suite = runSuite(positions, args.time, args.nodes, args.workers, args.backend, args.hash,
+                         show if args.verbose else None)
+        print(suite.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""
+    Material and piece-square table evaluation, in centipawns and positive when white is better.
+    Every piece has a midgame and an endgame score on every square, the two are blended by the game phase
+    (how much material apart from pawns and kings is left). GameState keeps the three numbers up to date move by move,
+    evaluateBoard is the same evaluation done from scratch.
+    Tables from https://www.chessprogramming.org/Simplified_Evaluation_Function, material from PeSTO.
+"""
+
+MIDGAME_VALUES = {'P' : 82, 'N' : 337, 'B' : 365, 'R' : 477, 'Q' : 1025, 'K' : 0}
+ENDGAME_VALUES = {'P' : 94, 'N' : 281, 'B' : 297, 'R' : 512, 'Q' : 936, 'K' : 0}
+PHASE_WEIGHTS = {'P' : 0, 'N' : 1, 'B' : 1, 'R' : 2, 'Q' : 4, 'K' : 0}
+TOTAL_PHASE = 24 # phase of the starting position, 24 is a pure midgame and 0 a pure endgame
+
+# tables are seen from white's side, first row is the 8th rank like the board
+PAWN_TABLE = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+     5,   5,  10,  25,  25,  10,   5,   5,
+     0,   0,   0,  20,  20,   0,   0,   0,
+     5,  -5, -10,   0,   0, -10,  -5,   5,
+     5,  10,  10, -20, -20,  10,  10,   5,
+     0,   0,   0,   0,   0,   0,   0,   0,
+]
+PAWN_ENDGAME_TABLE = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+    80,  80,  80,  80,  80,  80,  80,  80,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    30,  30,  30,  30,  30,  30,  30,  30,
+    15,  15,  15,  15,  15,  15,  15,  15,
+     5,   5,   5,   5,   5,   5,   5,   5,
+     0,   0,   0,   0,   0,   0,   0,   0,
+     0,   0,   0,   0,   0,   0,   0,   0,
+]
+KNIGHT_TABLE = [
+   -50, -40, -30, -30, -30, -30, -40, -50,
+   -40, -20,   0,   0,   0,   0, -20, -40,
+   -30,   0,  10,  15,  15,  10,   0, -30,
+   -30,   5,  15,  20,  20,  15,   5, -30,
+   -30,   0,  15,  20,  20,  15,   0, -30,
+   -30,   5,  10,  15,  15,  10,   5, -30,
+   -40, -20,   0,   5,   5,   0, -20, -40,
+   -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+   -20, -10, -10, -10, -10, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,  10,  10,   5,   0, -10,
+   -10,   5,   5,  10,  10,   5,   5, -10,
+   -10,   0,  10,  10,  10,  10,   0, -10,
+   -10,  10,  10,  10,  10,  10,  10, -10,
+   -10,   5,   0,   0,   0,   0,   5, -10,
+   -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK_TABLE = [
+     0,   0,   0,   0,   0,   0,   0,   0,
+     5,  10,  10,  10,  10,  10,  10,   5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+    -5,   0,   0,   0,   0,   0,   0,  -5,
+     0,   0,   0,   5,   5,   0,   0,   0,
+]
+QUEEN_TABLE = [
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+   -10,   0,   0,   0,   0,   0,   0, -10,
+   -10,   0,   5,   5,   5,   5,   0, -10,
+    -5,   0,   5,   5,   5,   5,   0,  -5,
+     0,   0,   5,   5,   5,   5,   0,  -5,
+   -10,   5,   5,   5,   5,   5,   0, -10,
+   -10,   0,   5,   0,   0,   0,   0, -10,
+   -20, -10, -10,  -5,  -5, -10, -10, -20,
+]
+KING_TABLE = [
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -30, -40, -40, -50, -50, -40, -40, -30,
+   -20, -30, -30, -40, -40, -30, -30, -20,
+   -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,   0,   0,   0,   0,  20,  20,
+    20,  30,  10,   0,   0,  10,  30,  20,
+]
+KING_ENDGAME_TABLE = [
+   -50, -40, -30, -20, -20, -30, -40, -50,
+   -30, -20, -10,   0,   0, -10, -20, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  30,  40,  40,  30, -10, -30,
+   -30, -10,  20,  30,  30,  20, -10, -30,
+   -30, -30,   0,   0,   0,   0, -30, -30,
+   -50, -30, -30, -30, -30, -30, -30, -50,
+]
+
+MIDGAME_TABLES = {'P' : PAWN_TABLE, 'N' : KNIGHT_TABLE, 'B' : BISHOP_TABLE, 'R' : ROOK_TABLE, 'Q' : QUEEN_TABLE,
+                  'K' : KING_TABLE}
+ENDGAME_TABLES = {'P' : PAWN_ENDGAME_TABLE, 'N' : KNIGHT_TABLE, 'B' : BISHOP_TABLE, 'R' : ROOK_TABLE,
+                  'Q' : QUEEN_TABLE, 'K' : KING_ENDGAME_TABLE}
+
+
+"""
+    Material plus table score of every piece on every square (row*8 + col), black's are mirrored and negative
+"""
+def buildScores(values, tables):
+    scores = {}
+    for piece in 'PNBRQK':
+        scores['w' + piece] = [values[piece] + tables[piece][sq] for sq in range(64)]
+        scores['b' + piece] = [-(values[piece] + tables[piece][(7 - sq//8)*8 + sq % 8]) for sq in range(64)]
+    return scores
+
+
+MIDGAME_SCORES = buildScores(MIDGAME_VALUES, MIDGAME_TABLES)
+ENDGAME_SCORES = buildScores(ENDGAME_VALUES, ENDGAME_TABLES)
+
+
+"""
+    Blend the midgame and endgame scores, promotions can push the phase over TOTAL_PHASE
+"""
+def taperedScore(midgameScore, endgameScore, phase):
+    phase = min(phase, TOTAL_PHASE)
+    return (midgameScore*phase + endgameScore*(TOTAL_PHASE - phase)) // TOTAL_PHASE
+
+
+"""
+    Midgame score, endgame score and phase of a board from scratch
+"""
+def scoreBoard(board):
+    midgameScore = 0
+    endgameScore = 0
+    phase = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece != "--":
+                midgameScore += MIDGAME_SCORES[piece][row*8 + col]
+                endgameScore += ENDGAME_SCORES[piece][row*8 + col]
+                phase += PHASE_WEIGHTS[piece[1]]
+    return midgameScore, endgameScore, phase
+
+
+def evaluateBoard(board):
+    return taperedScore(*scoreBoard(board))
+
+
+# mobility proxies : squares a piece could move to, not counting pins and checks, in centipawns per square
+MOBILITY_PIECES = ['P', 'N', 'B', 'R', 'Q'] # a pawn counts 1 if the square in front of it is empty
+MOBILITY_WEIGHTS = {'P' : 2, 'N' : 4, 'B' : 5, 'R' : 2, 'Q' : 1}
+MOBILITY_DIRECTIONS = {'N' : [(-2,-1) , (-2,1) , (2,-1) , (2,1) , (-1,2) , (1,2) , (1,-2) , (-1,-2)],
+                       'B' : [(-1,-1) , (-1,1) , (1,-1) , (1,1)], 'R' : [(-1,0) , (1,0) , (0,-1) , (0,1)],
+                       'Q' : [(-1,-1) , (-1,1) , (1,-1) , (1,1) , (-1,0) , (1,0) , (0,-1) , (0,1)]}
+
+
+"""
+    White's minus black's mobility of every piece type in MOBILITY_PIECES, as a dict
+"""
+def mobilityCounts(board):
+    counts = {piece : 0 for piece in MOBILITY_PIECES}
+    for row in range(8):
+        for col in range(8):
+            piece = board[row][col]
+            if piece == "--" or piece[1] == 'K':
+                continue
+            color, type = piece
+            sign = 1 if color == 'w' else -1
+            if type == 'P':
+                aheadRow = row - 1 if color == 'w' else row + 1
+                if 0 <= aheadRow < 8 and board[aheadRow][col] == "--":
+                    counts['P'] += sign
+                continue
+            for dRow, dCol in MOBILITY_DIRECTIONS[type]:
+                endRow, endCol = row + dRow, col + dCol
+                while 0 <= endRow < 8 and 0 <= endCol < 8:
+                    endPiece = board[endRow][endCol]
+                    if endPiece[0] != color:
+                        counts[type] += sign
+                    if endPiece != "--" or type == 'N': # knights jump once, sliders stop at the first piece
+                        break
+                    endRow, endCol = endRow + dRow, endCol + dCol
+    return counts
+
+
+def mobilityScore(board):
+    counts = mobilityCounts(board)
+    return sum(MOBILITY_WEIGHTS[piece]*counts[piece] for piece in MOBILITY_PIECES)
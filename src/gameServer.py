@@ -0,0 +1,351 @@
+"""
+    asyncio server hosting many games at once over a TCP or Unix socket, without pygame. Clients create sessions,
+    play moves in them and ask for the engine's reply, the searches run in a bounded pool of worker processes so
+    a long search never holds up the other sessions.
+
+    python gameServer.py                            TCP on 127.0.0.1:7777, one search process per core
+    python gameServer.py --unix /tmp/chess.sock -j 4
+
+    The protocol is one command per line, every answer is one line starting with the session id it is about :
+        new [fen <fen>]                         -> session <id>
+        move <id> <move>                        -> ok <id> <fen> [checkmate | stalemate]
+        go <id> [depth <n>] [movetime <ms>] [nodes <n>]
+                                                -> bestmove <id> <move> score <cp | mate n> depth <n> nodes <n>
+                                                   queue_ms <ms> search_ms <ms>, and the move is played
+        fen <id>                                -> fen <id> <fen>
+        close <id>                              -> closed <id>
+        stats                                   -> stats sessions <n> queued <n> running <n> done <n> rejected <n>
+                                                   p50_ms <ms> p95_ms <ms> max_ms <ms>
+    Moves are in coordinate notation (e2e4, e7e8q), errors are answered with error <id> <reason>.
+    go answers when the search is done, other commands are answered meanwhile.
+
+    A session only keeps the FEN of its position, so an idle session costs a few hundred bytes. A session can have
+    one search queued or running at a time and the queue is first come first served, so a busy client can't starve
+    the others. When MAX_QUEUED searches are waiting new ones are refused with error <id> busy (backpressure).
+    A session belongs to the connection that created it : other connections get error <id> no such session, and
+    its sessions are closed (and their queued searches dropped) when the connection ends. Sessions left unused for
+    SESSION_IDLE_TIMEOUT seconds are closed too.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import bitbases
+import bitboardEngine
+import moveCache
+from smartMoveFinder import Search, MAX_DEPTH
+from transpositionTable import TranspositionTable
+from uci import START_FEN, scoreString
+
+DEFAULT_PORT = 7777
+DEFAULT_MOVE_TIME = 1000 # milliseconds a go without limits searches
+MAX_MOVE_TIME = 30000
+MAX_QUEUED = 256 # searches waiting for a worker before new ones are refused
+WORKER_HASH_MB = 16
+MOVE_CACHE_ENTRIES = 16384
+LATENCY_SAMPLES = 1000 # latencies of the last searches kept for the stats
+SESSION_IDLE_TIMEOUT = 3600 # seconds without a command before a session is closed, None to keep them
+IDLE_CHECK_INTERVAL = 60 # seconds between the looks for idle sessions
+
+# state of a worker process, set up once by initWorker
+workerGameState = None
+workerTable = None
+workerBitbases = None
+
+
+def initWorker(hashSizeMB):
+    global workerGameState, workerTable, workerBitbases
+    workerGameState = bitboardEngine.BitboardGameState()
+    workerTable = TranspositionTable(hashSizeMB) # shared by all the sessions the worker searches for
+    workerBitbases = bitbases.Bitbases()
+
+
+"""
+    Runs in a worker : best move of a position as (notation or None, score, depth, nodes)
+"""
+def searchPosition(fen, depth, timeLimit, nodeLimit):
+    workerGameState.loadFEN(fen)
+    search = Search(workerGameState, workerTable, timeLimit, nodeLimit, bitbases = workerBitbases)
+    result = search.iterativeDeepening(workerGameState.getValidMoves(), depth)
+    move = result.move.getChessNotation() if result.move is not None else None
+    return move, result.score, result.depth, result.nodes
+
+
+class Session():
+    __slots__ = ('id', 'fen', 'searching', 'client', 'lastUsed')
+
+    def __init__(self, id, fen, client):
+        self.id = id
+        self.fen = fen
+        self.searching = False # a search is queued or running
+        self.client = client # Client of the connection that created it, the only one that can use it
+        self.lastUsed = time.monotonic()
+
+
+class Client():
+    __slots__ = ('sessions',)
+
+    def __init__(self):
+        self.sessions = set() # ids of the sessions the connection created and hasn't closed
+
+
+class GameServer():
+    def __init__(self, workers = None, maxQueued = MAX_QUEUED, idleTimeout = SESSION_IDLE_TIMEOUT):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer = initWorker, initargs = (WORKER_HASH_MB,))
+        self.sessions = {}
+        self.nextID = 1
+        self.queue = asyncio.Queue(maxQueued) # (session, search arguments, future of the answer, time queued)
+        self.gs = bitboardEngine.BitboardGameState() # checks and plays the moves of every session in turn
+        self.gs.moveCache = moveCache.MoveCache(MOVE_CACHE_ENTRIES) # sessions often share positions (openings)
+        self.running = 0
+        self.done = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen = LATENCY_SAMPLES)
+        self.dispatchers = []
+        self.idleTimeout = idleTimeout
+
+    '''
+        Start one dispatcher per worker, each hands the queued searches to the pool one at a time, and the task
+        closing the idle sessions
+    '''
+    def start(self):
+        self.dispatchers = [asyncio.create_task(self.dispatch()) for _ in range(self.workers)]
+        if self.idleTimeout is not None:
+            self.dispatchers.append(asyncio.create_task(self.closeIdleSessions()))
+
+    def close(self):
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        self.executor.shutdown(wait = False, cancel_futures = True)
+
+    async def dispatch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            session, args, answer, queuedAt = await self.queue.get()
+            if answer.cancelled(): # its connection ended while it was queued
+                self.queue.task_done()
+                continue
+            self.running += 1
+            startedAt = time.perf_counter()
+            try:
+                found = await loop.run_in_executor(self.executor, searchPosition, *args)
+            except Exception as error:
+                found = error
+            finally:
+                self.running -= 1
+                self.queue.task_done()
+            finishedAt = time.perf_counter()
+            self.latencies.append(finishedAt - queuedAt)
+            self.done += 1
+            if not answer.cancelled():
+                answer.set_result((found, startedAt - queuedAt, finishedAt - startedAt))
+
+    async def closeIdleSessions(self):
+        while True:
+            await asyncio.sleep(min(IDLE_CHECK_INTERVAL, self.idleTimeout))
+            oldest = time.monotonic() - self.idleTimeout
+            for session in [session for session in self.sessions.values()
+                            if session.lastUsed < oldest and not session.searching]:
+                self.closeSession(session)
+
+    def closeSession(self, session):
+        self.sessions.pop(session.id, None)
+        session.client.sessions.discard(session.id)
+
+    async def handleClient(self, reader, writer):
+        tasks = set()
+        client = Client()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tokens = line.decode(errors = "replace").split()
+                if not tokens:
+                    continue
+                queued = self.submit(tokens[1:], client) if tokens[0] == "go" else self.handle(tokens, client)
+                if isinstance(queued, str):
+                    writer.write((queued + "\n").encode())
+                    await writer.drain() # a client that doesn't read its answers stops being read
+                else: # answered when the search is done, the next commands are read meanwhile
+                    task = asyncio.create_task(self.answerSearch(*queued, writer))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            for sessionID in list(client.sessions):
+                self.closeSession(self.sessions[sessionID])
+            writer.close()
+
+    '''
+        Answer of every command except go, from the connection of client
+    '''
+    def handle(self, tokens, client):
+        command = tokens[0]
+        if command == "new":
+            fen = " ".join(tokens[2:]) if len(tokens) > 2 and tokens[1] == "fen" else START_FEN
+            try:
+                self.gs.loadFEN(fen)
+            except (ValueError, KeyError, IndexError):
+                return "error 0 invalid fen"
+            if any(sum(row.count(king) for row in self.gs.board) != 1 for king in ("wK", "bK")):
+                return "error 0 invalid fen"
+            session = Session(self.nextID, self.gs.getFEN(), client)
+            self.sessions[session.id] = session
+            client.sessions.add(session.id)
+            self.nextID += 1
+            return f"session {session.id}"
+        if command == "stats":
+            return self.stats()
+        session = self.getSession(tokens, client)
+        if isinstance(session, str):
+            return session
+        if command == "move":
+            if session.searching:
+                return f"error {session.id} busy"
+            if len(tokens) < 3:
+                return f"error {session.id} no move"
+            return self.play(session, tokens[2])
+        if command == "fen":
+            return f"fen {session.id} {session.fen}"
+        if command == "close":
+            self.closeSession(session)
+            return f"closed {session.id}"
+        return f"error {session.id} unknown command {command}"
+
+    '''
+        Session of the id in tokens[1] if client created it, or the error to answer. Another connection's sessions
+        are answered as not existing so their ids can't be probed
+    '''
+    def getSession(self, tokens, client):
+        if len(tokens) < 2:
+            return "error 0 no session id"
+        try:
+            session = self.sessions.get(int(tokens[1]))
+        except ValueError:
+            return "error 0 no session id"
+        if session is None or session.client is not client:
+            return f"error {tokens[1]} no such session"
+        session.lastUsed = time.monotonic()
+        return session
+
+    '''
+        Play a move in a session, the answer says so or why it couldn't
+    '''
+    def play(self, session, notation):
+        gs = self.gs
+        gs.loadFEN(session.fen)
+        for move in gs.getValidMoves():
+            if move.getChessNotation() == notation:
+                gs.makeMove(move)
+                session.fen = gs.getFEN()
+                gs.getValidMoves() # sets checkmate and stalemate
+                end = " checkmate" if gs.checkmate else " stalemate" if gs.stalemate else ""
+                return f"ok {session.id} {session.fen}{end}"
+        return f"error {session.id} illegal move {notation}"
+
+    '''
+        Queue a search for the session in tokens[0], returns (session, future of the search) or the error to answer.
+        It is queued before the next command is read, so a move sent right after go is refused as busy
+    '''
+    def submit(self, tokens, client):
+        session = self.getSession(["go"] + tokens, client)
+        if isinstance(session, str):
+            return session
+        if session.searching:
+            return f"error {session.id} busy"
+        params = {}
+        for i in range(1, len(tokens) - 1):
+            if tokens[i] in ("depth", "movetime", "nodes") and tokens[i + 1].isdigit():
+                params[tokens[i]] = int(tokens[i + 1])
+        depth = min(params.get("depth", MAX_DEPTH), MAX_DEPTH)
+        moveTime = params.get("movetime", DEFAULT_MOVE_TIME if "depth" not in params and "nodes" not in params else None)
+        timeLimit = min(moveTime, MAX_MOVE_TIME) / 1000 if moveTime is not None else MAX_MOVE_TIME / 1000
+        answer = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((session, (session.fen, depth, timeLimit, params.get("nodes")), answer,
+                                   time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return f"error {session.id} busy"
+        session.searching = True
+        return session, answer
+
+    async def answerSearch(self, session, answer, writer):
+        try:
+            writer.write((await self.finishSearch(session, answer) + "\n").encode())
+            await writer.drain()
+        finally:
+            session.searching = False
+
+    '''
+        Play the move the search found and answer with it
+    '''
+    async def finishSearch(self, session, answer):
+        found, queued, searched = await answer
+        session.searching = False
+        if isinstance(found, Exception):
+            return f"error {session.id} search failed {found!r}"
+        move, score, depth, nodes = found
+        if move is None:
+            return f"bestmove {session.id} 0000"
+        if session.id in self.sessions: # it may have been closed meanwhile
+            self.play(session, move)
+        return (f"bestmove {session.id} {move} score {scoreString(score)} depth {depth} nodes {nodes} "
+                f"queue_ms {int(queued*1000)} search_ms {int(searched*1000)}")
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+        def percentile(fraction):
+            return int(latencies[min(int(len(latencies)*fraction), len(latencies) - 1)]*1000) if latencies else 0
+        return (f"stats sessions {len(self.sessions)} queued {self.queue.qsize()} running {self.running} "
+                f"done {self.done} rejected {self.rejected} p50_ms {percentile(0.5)} p95_ms {percentile(0.95)} "
+                f"max_ms {percentile(1)}")
+
+
+async def serve(server, host = "127.0.0.1", port = DEFAULT_PORT, unixPath = None):
+    server.start()
+    if unixPath is not None:
+        listener = await asyncio.start_unix_server(server.handleClient, unixPath)
+    else:
+        listener = await asyncio.start_server(server.handleClient, host, port)
+    print(f"serving on {unixPath or f'{host}:{port}'} with {server.workers} search processes", flush = True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Serve many games over a socket")
+    parser.add_argument("--host", default = "127.0.0.1")
+    parser.add_argument("--port", type = int, default = DEFAULT_PORT)
+    parser.add_argument("--unix", help = "listen on this Unix socket instead of TCP")
+    parser.add_argument("-j", "--workers", type = int, help = "search processes (default : one per core)")
+    parser.add_argument("--max-queued", type = int, default = MAX_QUEUED, help = "searches waiting before refusing")
+    parser.add_argument("--idle-timeout", type = float, default = SESSION_IDLE_TIMEOUT,
+                        help = f"seconds before an unused session is closed, 0 to keep them (default : "
+                               f"{SESSION_IDLE_TIMEOUT})")
+    args = parser.parse_args(argv)
+
+    async def run():
+        await serve(GameServer(args.workers, args.max_queued, args.idle_timeout or None), args.host, args.port,
+                    args.unix)
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""
+    Least recently used cache of the legal moves of positions by their zobrist key (which includes the side to move,
+    the castling rights and the en passant square), for a GameState that keeps coming back to the same positions :
+    the game after an undo, the UI redrawing, or a search reaching a position again through another move order.
+
+    gs.moveCache = MoveCache(4096)
+"""
+from collections import OrderedDict
+
+
+class MoveCache():
+    def __init__(self, maxEntries = 4096):
+        self.maxEntries = maxEntries # bounds the memory, about 350 bytes per entry
+        self.entries = OrderedDict() # key -> (array('I') of packed moves, inCheck), the most recently used last
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.maxEntries:
+            self.entries.popitem(last = False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def hitRate(self):
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0
+
+    def stats(self):
+        return f"{len(self.entries)}/{self.maxEntries} entries, {self.hits} hits, {self.misses} misses, " \
+               f"{self.hitRate():.1%} hit rate"
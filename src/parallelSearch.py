@@ -0,0 +1,167 @@
+"""
+    Parallel search : the root moves of every iteration of the iterative deepening are split over worker processes.
+    The best move of the previous iteration is searched first with the full window, the other root moves are then
+    searched by all the workers at once with a null window around its score (principal variation search at the root)
+    and a move that beats it is searched again with the full window to get its exact score.
+    Every worker keeps its own game state and transposition table for as long as the pool lives, so a worker still
+    knows the positions it searched in the previous iterations and the previous moves of the game.
+    With one worker the root moves are searched one after another in a fixed order and the result is deterministic.
+
+    with ParallelSearch(workers = 8) as search:
+        move = search.findBestMove(gs, gs.getValidMoves(), timeLimit = 2)
+"""
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import bitbases
+import bitboardEngine
+import smartMoveFinder
+from smartMoveFinder import Search, SearchResult, SearchTimeout, DEPTH, MAX_DEPTH, MATE_THRESHOLD, INFINITY
+from transpositionTable import TranspositionTable
+
+# state of a worker process, set up once by initWorker
+workerGameState = None
+workerTable = None
+workerBitbases = None
+STOP_POLL_INTERVAL = 0.05 # seconds between looks at the stop event while waiting for the workers
+workerSearchID = None
+
+
+def initWorker(gameStateClass, hashSizeMB, bitbaseDirectory):
+    global workerGameState, workerTable, workerBitbases
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # ctrl+c is handled by the main process, which shuts the pool down
+    workerGameState = gameStateClass()
+    workerTable = TranspositionTable(hashSizeMB)
+    if bitbaseDirectory is not None: # memory mapped, so all the workers share the same pages
+        workerBitbases = bitbases.Bitbases(bitbaseDirectory)
+
+
+"""
+    Runs in a worker : score of one root move of the position, or None if the deadline (a time.time()) passed first.
+    Returns (score, nodes)
+"""
+def searchRootMove(searchID, fen, move, depth, alpha, beta, deadline):
+    global workerSearchID
+    if workerSearchID != searchID: # entries of older searches are replaced first
+        workerTable.newSearch()
+        workerSearchID = searchID
+    if workerGameState.getFEN() != fen:
+        workerGameState.loadFEN(fen)
+    search = Search(workerGameState, workerTable, bitbases = workerBitbases)
+    if deadline is not None:
+        search.deadline = time.perf_counter() + deadline - time.time()
+        search.completedDepth = depth - 1 # the main process finished the shallower iterations, so stopping is allowed
+    try:
+        score = search.searchRootMove(move, depth, alpha, beta)
+    except SearchTimeout:
+        score = None
+    return score, search.nodes
+
+
+class ParallelSearch():
+    def __init__(self, workers = None, hashSizeMB = 16, gameStateClass = bitboardEngine.BitboardGameState,
+                 bitbaseDirectory = None):
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(self.workers, initializer = initWorker,
+                                            initargs = (gameStateClass, hashSizeMB, bitbaseDirectory))
+        self.searchID = 0
+        self.nodes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    '''
+        Stop the workers, searches that are still queued are dropped
+    '''
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait = True, cancel_futures = True)
+            self.executor = None
+
+    '''
+        Same as smartMoveFinder.findBestMoveMinMax
+    '''
+    def findBestMove(self, gs, validMoves, timeLimit = None):
+        depth = DEPTH if timeLimit is None else MAX_DEPTH
+        return self.search(gs, validMoves, depth, timeLimit).move
+
+    '''
+        Same as smartMoveFinder.searchBestMove, returns the SearchResult of the last completed iteration.
+        Setting stopEvent ends the search after the first iteration, the workers finish the root move they are on
+    '''
+    def search(self, gs, validMoves, depth = DEPTH, timeLimit = None, stopEvent = None):
+        startTime = time.perf_counter()
+        deadline = time.time() + timeLimit if timeLimit is not None else None
+        self.searchID += 1
+        self.nodes = 0
+        result = SearchResult(None, 0, 0, 0, 0)
+        if len(validMoves) == 0:
+            result.score = -smartMoveFinder.CHECKMATE if gs.inCheck else smartMoveFinder.STALEMATE
+            return result
+        fen = gs.getFEN()
+        rootMoves = [move.packed for move in validMoves]
+        movesByPacked = {move.packed : move for move in validMoves} # rootMoves is reordered, validMoves isn't
+        for iteration in range(1, depth + 1):
+            # the first iteration always finishes so there is a move to return
+            found = self.searchIteration(fen, rootMoves, iteration, deadline if iteration > 1 else None,
+                                         stopEvent if iteration > 1 else None)
+            if found is None:
+                break
+            score, bestMove = found
+            result = SearchResult(movesByPacked[bestMove], score, iteration, self.nodes,
+                                  time.perf_counter() - startTime)
+            if abs(score) > MATE_THRESHOLD: # a forced mate was found, deeper won't change it
+                break
+            rootMoves.remove(bestMove)
+            rootMoves.insert(0, bestMove) # the best move is searched first in the next iteration
+        result.nodes = self.nodes
+        result.time = time.perf_counter() - startTime
+        return result
+
+    '''
+        One iteration over the root moves, returns (score, best packed move) or None if it ran out of time
+    '''
+    def searchIteration(self, fen, rootMoves, depth, deadline, stopEvent = None):
+        def submit(move, alpha, beta):
+            return self.executor.submit(searchRootMove, self.searchID, fen, move, depth, alpha, beta, deadline)
+
+        score, nodes = submit(rootMoves[0], -INFINITY, INFINITY).result()
+        self.nodes += nodes
+        if score is None:
+            return None
+        bestScore, bestMove = score, rootMoves[0]
+
+        pending = {submit(move, bestScore, bestScore + 1) : (move, bestScore, False) for move in rootMoves[1:]}
+        order = {move : i for i, move in enumerate(rootMoves)}
+        timedOut = False
+        while pending:
+            done, _ = wait(pending, STOP_POLL_INTERVAL, FIRST_COMPLETED)
+            if stopEvent is not None and stopEvent.is_set():
+                timedOut = True
+                done = ()
+            # handle the finished searches in root move order so that one worker gives the same result every time
+            for future in sorted(done, key = lambda future: order[pending[future][0]]):
+                move, alpha, fullWindow = pending.pop(future)
+                score, nodes = future.result()
+                self.nodes += nodes
+                if score is None:
+                    timedOut = True
+                elif fullWindow:
+                    if score > bestScore:
+                        bestScore, bestMove = score, move
+                elif score > alpha: # it beats the best move it was compared with, find out by how much
+                    pending[submit(move, bestScore, INFINITY)] = (move, bestScore, True)
+            if timedOut:
+                for future in pending:
+                    future.cancel()
+                if stopEvent is None or not stopEvent.is_set(): # when stopped from outside don't wait for them
+                    for future, _ in list(pending.items()):
+                        if not future.cancelled():
+                            self.nodes += future.result()[1]
+                return None
+        return bestScore, bestMove
@@ -0,0 +1,145 @@
+"""
+    Perft : counts all the leaf nodes of the move tree to a given depth and compares them with the known values of
+    standard test positions (https://www.chessprogramming.org/Perft_Results).
+    Any bug in the move generation (pins, checks, castling, en passant, promotion) changes the counts, and the time it
+    takes measures the speed of getValidMoves, makeMove and undoMove. Doesn't need pygame.
+
+    python perft.py                           all positions to depth 3
+    python perft.py -d 4 -p kiwipete --divide node count of every root move of kiwipete at depth 4
+    python perft.py -d 5 -j 8                 split the root moves over 8 processes
+    python perft.py --fen "<fen>" -d 3        any other position
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chessEngine
+import bitboardEngine
+
+BACKENDS = {'board' : chessEngine.GameState, 'bitboard' : bitboardEngine.BitboardGameState}
+
+# name, FEN and the node counts from depth 1 onwards
+POSITIONS = [
+    ("startpos", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("position6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+
+def newGameState(backend, fen):
+    gs = BACKENDS[backend]()
+    gs.loadFEN(fen)
+    return gs
+
+
+"""
+    Number of leaf nodes depth plies from the current position, the last ply is counted without playing it
+"""
+def perft(gs, depth):
+    if depth == 0:
+        return 1
+    moves = gs.getValidPackedMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makePackedMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+"""
+    Perft of the position after a root move, runs in a worker process so it rebuilds the position from the FEN
+"""
+def perftRootMove(backend, fen, notation, depth):
+    gs = newGameState(backend, fen)
+    for move in gs.getValidMoves():
+        if move.getChessNotation() == notation:
+            gs.makeMove(move)
+            return perft(gs, depth - 1)
+    raise ValueError(f"{notation} is not a legal move in {fen}")
+
+
+"""
+    Node count of every root move as a list of (notation, nodes)
+"""
+def divide(backend, fen, depth, executor = None):
+    notations = [move.getChessNotation() for move in newGameState(backend, fen).getValidMoves()]
+    if executor is None:
+        counts = [perftRootMove(backend, fen, notation, depth) for notation in notations]
+    else:
+        counts = list(executor.map(perftRootMove, [backend]*len(notations), [fen]*len(notations), notations,
+                                   [depth]*len(notations)))
+    return list(zip(notations, counts))
+
+
+def runPosition(name, fen, expected, depths, backend, executor, showDivide):
+    print(f"{name} ({backend}) {fen}")
+    passed = True
+    for depth in depths:
+        startTime = time.perf_counter()
+        if depth == 0:
+            results = []
+            nodes = 1
+        else:
+            results = divide(backend, fen, depth, executor)
+            nodes = sum(count for _, count in results)
+        elapsed = time.perf_counter() - startTime
+        if depth == 0 or depth > len(expected):
+            status = "    "
+        elif nodes == expected[depth - 1]:
+            status = "OK  "
+        else:
+            status = "FAIL"
+            passed = False
+        reference = f"{expected[depth - 1]:>12}" if 0 < depth <= len(expected) else " "*12
+        print(f"  depth {depth}  {nodes:>12} nodes  expected {reference}  {status} {elapsed:8.2f}s "
+              f"{nodes / max(elapsed, 1e-9):>10.0f} nodes/s")
+        if showDivide:
+            for notation, count in results:
+                print(f"    {notation:<6}{count}")
+    return passed
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Move generation node counts and speed")
+    parser.add_argument("-d", "--depth", type = int, default = 3)
+    parser.add_argument("-p", "--position", action = "append", choices = [name for name, _, _ in POSITIONS],
+                        help = "standard position to run, can be repeated (default : all of them)")
+    parser.add_argument("--fen", help = "run this position instead of the standard ones")
+    parser.add_argument("-b", "--backend", choices = sorted(BACKENDS), default = "bitboard")
+    parser.add_argument("--divide", action = "store_true", help = "only run the given depth and show every root move")
+    parser.add_argument("-j", "--processes", type = int, default = 1, help = "split the root moves over processes")
+    args = parser.parse_args(argv)
+
+    if args.fen:
+        positions = [("fen", args.fen, [])]
+    else:
+        positions = [position for position in POSITIONS if not args.position or position[0] in args.position]
+    depths = [args.depth] if args.divide else range(1, args.depth + 1)
+
+    executor = ProcessPoolExecutor(args.processes) if args.processes > 1 else None
+    try:
+        passed = True
+        for name, fen, expected in positions:
+            passed = runPosition(name, fen, expected, depths, args.backend, executor, args.divide) and passed
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    print("all node counts match" if passed else "NODE COUNT MISMATCH")
+    return 0 if passed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
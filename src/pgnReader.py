@@ -0,0 +1,220 @@
+"""
+    Streams games out of PGN files (https://www.chessprogramming.org/Portable_Game_Notation) of any size, plain or
+    compressed with gzip (.gz) or bzip2 (.bz2), and replays them with the engine's own rules, to mine games for
+    opening books, position statistics or evaluation tuning. Everything is a generator : the file is read a line at a
+    time and only the game being read is kept, so the memory doesn't grow with the size of the file.
+
+    for game in readGames(openPGN("games.pgn.gz")):       headers and SAN moves, nothing replayed
+        for gs, move in replayGame(game):                  the position before every packed move, live
+            ...
+
+    scan(paths, workers) spreads the files over a process pool, plain files are also split into chunks of about
+    CHUNK_BYTES (cut at the start of a game), and yields what the chunk function returns for every chunk.
+
+    python pgnReader.py games.pgn big.pgn.bz2 -j 8     replay every game and show the games per second
+"""
+import argparse
+import bz2
+import gzip
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import bitboardEngine
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+CHUNK_BYTES = 16*1024*1024 # plain files are read by the workers in chunks of about this many bytes
+HEADER = re.compile(r'\[(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# tokens of the movetext : comments, NAGs, variations, move numbers, results and everything else is a move (but e.p.)
+MOVETEXT_TOKEN = re.compile(r'\{[^}]*\}?|;[^\n]*|\$\d+|[()]|\d+\.+|1-0|0-1|1/2-1/2|\*|[^\s{}();$]+')
+RESULTS = {"1-0", "0-1", "1/2-1/2", "*"}
+
+# game state of the process, reused for every game it replays
+processGameState = None
+
+
+class PGNGame():
+    __slots__ = ('headers', 'moves', 'result')
+
+    def __init__(self, headers, moves, result):
+        self.headers = headers # tag name -> value
+        self.moves = moves # moves of the main line in SAN, variations and comments left out
+        self.result = result # "1-0", "0-1", "1/2-1/2" or "*"
+
+    def startFEN(self):
+        return self.headers.get("FEN", START_FEN)
+
+
+"""
+    Text lines of a PGN file, decompressed by its extension
+"""
+def openPGN(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding = "utf-8", errors = "replace")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding = "utf-8", errors = "replace")
+    return open(path, encoding = "utf-8", errors = "replace")
+
+
+"""
+    Lines of the bytes start to end of a plain file, a chunk of scan. The chunk starts at the first game that starts
+    at or after start and has every game that starts before end, so the chunks of a file split its games between them
+"""
+def readChunk(path, start, end):
+    with open(path, "rb") as file:
+        if start > 0:
+            file.seek(start - 1)
+            file.readline() # the rest of a line that started in the previous chunk, nothing when one starts at start
+        else:
+            file.seek(start)
+        position = file.tell()
+        line = file.readline()
+        while line and not line.startswith(b"[Event "):
+            position = file.tell()
+            line = file.readline()
+        inGame = False
+        while line:
+            if line.startswith(b"[Event "):
+                if position >= end:
+                    return
+                inGame = True
+            if inGame:
+                yield line.decode("utf-8", errors = "replace")
+            position = file.tell()
+            line = file.readline()
+
+
+"""
+    The games of lines of PGN text one by one, as PGNGame
+"""
+def readGames(lines):
+    headers = {}
+    movetext = []
+    for line in lines:
+        if line.startswith("%"): # escaped line
+            continue
+        stripped = line.strip()
+        if stripped.startswith("["):
+            if movetext or (headers and stripped.startswith("[Event ")): # the headers of the next game
+                yield parseMovetext(headers, movetext)
+                headers = {}
+                movetext = []
+            match = HEADER.match(stripped)
+            if match is not None:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace("\\\\", "\\")
+        elif stripped:
+            movetext.append(line)
+    if movetext or headers:
+        yield parseMovetext(headers, movetext)
+
+
+def parseMovetext(headers, movetext):
+    moves = []
+    result = headers.get("Result", "*")
+    variationDepth = 0
+    for token in MOVETEXT_TOKEN.findall("".join(movetext)):
+        first = token[0]
+        if first == "(":
+            variationDepth += 1
+        elif first == ")":
+            variationDepth = max(variationDepth - 1, 0)
+        elif variationDepth or first in "{;$" or first.isdigit() and token[-1] == "." or token == "e.p.":
+            continue # e.p. is written after en passant captures in older files
+        elif token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return PGNGame(headers, moves, result)
+
+
+"""
+    Replay a game with the engine's rules, yields (gs, packed move) with gs the position before the move, the move is
+    played when the next one is asked for. gs is reused (the process's own game state when none is given), so keep
+    what you need out of it (getFEN, zobristKey, ...) rather than gs itself. Raises ValueError at a move that isn't
+    legal or a FEN that can't be read
+"""
+def replayGame(game, gs = None):
+    if gs is None:
+        gs = getGameState()
+    gs.loadFEN(game.startFEN())
+    for san in game.moves:
+        move = gs.parseSAN(san, gs.getValidPackedMoves())
+        yield gs, move
+        gs.makePackedMove(move)
+
+
+def getGameState():
+    global processGameState
+    if processGameState is None:
+        processGameState = bitboardEngine.BitboardGameState()
+    return processGameState
+
+
+"""
+    Chunk function of scan, replays every game : (games, positions, games that couldn't be replayed)
+"""
+def countChunk(path, start = None, end = None):
+    games = positions = errors = 0
+    lines = openPGN(path) if start is None else readChunk(path, start, end)
+    try:
+        for game in readGames(lines):
+            games += 1
+            try:
+                for _ in replayGame(game):
+                    positions += 1
+            except (ValueError, KeyError, IndexError):
+                errors += 1
+    finally:
+        if hasattr(lines, "close"):
+            lines.close()
+    return games, positions, errors
+
+
+"""
+    The (path, start, end) chunks of the files, compressed files can't be split so they are one chunk (start None)
+"""
+def chunksOf(paths, chunkBytes = CHUNK_BYTES):
+    chunks = []
+    for path in paths:
+        size = os.path.getsize(path)
+        if path.endswith((".gz", ".bz2")) or size <= chunkBytes:
+            chunks.append((path, None, None))
+        else:
+            chunks.extend((path, start, min(start + chunkBytes, size)) for start in range(0, size, chunkBytes))
+    return chunks
+
+
+"""
+    Run chunkFunction(path, start, end) on every chunk of the files in a pool of worker processes and yield what it
+    returns as the chunks are done. chunkFunction has to be a module level function so the workers can import it
+"""
+def scan(paths, workers = None, chunkFunction = countChunk, chunkBytes = CHUNK_BYTES):
+    workers = workers if workers is not None else os.cpu_count() or 1
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(chunkFunction, *chunk) for chunk in chunksOf(paths, chunkBytes)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Replay the games of PGN files")
+    parser.add_argument("files", nargs = "+", help = "PGN files, .gz and .bz2 are decompressed")
+    parser.add_argument("-j", "--workers", type = int, help = "processes (default : one per core)")
+    args = parser.parse_args(argv)
+
+    startTime = time.perf_counter()
+    games = positions = errors = 0
+    for chunkGames, chunkPositions, chunkErrors in scan(args.files, args.workers):
+        games += chunkGames
+        positions += chunkPositions
+        errors += chunkErrors
+    elapsed = max(time.perf_counter() - startTime, 1e-9)
+    print(f"{games} games  {positions} positions  {errors} games with illegal moves  {elapsed:.1f}s  "
+          f"{games / elapsed:.0f} games/s  {positions / elapsed:.0f} positions/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+    Opt-in statistics of a search, to find out where the time of a slow search goes. Give a SearchStats to the
+    search and its result comes back with it filled in :
+
+    stats = SearchStats(info = print, infoInterval = 1) # info lines every second, info is optional
+    result = smartMoveFinder.searchBestMove(gs, gs.getValidMoves(), 6, stats = stats)
+    print(result.stats.report())
+    result.stats.asDict() # the same as plain numbers, to log or compare
+
+    python searchStats.py -d 5                      profile a search of the starting position
+    python searchStats.py --fen "<fen>" -t 2        any position, searched for 2 seconds
+
+    It counts the nodes, the leaf evaluations (quiescence nodes, where the static evaluation is read), the nodes of
+    every iteration and the branching factor between iterations, the transposition table and move cache hit rates,
+    and splits the time between move generation, makeMove, undoMove and the evaluation update. The time split comes
+    from timing wrappers put on the game state's own methods for the length of the search and taken off after, so a
+    search without a SearchStats runs the same code as before and only checks self.stats once per iteration.
+    SearchStats(timed = False) leaves the wrappers out : only the counts, for benchmarks where the speed matters.
+    The wrappers slow a search down by about a tenth, the times they report are each method's own time (a method
+    called by another one is only counted once) and the rest of the search is counted as "search".
+"""
+import argparse
+import sys
+import time
+
+import bitboardEngine
+import chessEngine
+import smartMoveFinder
+
+BACKENDS = {'board' : chessEngine.GameState, 'bitboard' : bitboardEngine.BitboardGameState}
+
+# game state methods that are timed and the part of the search their time counts for
+TIMED_METHODS = {'getValidPackedMoves' : 'moveGeneration', 'getCapturePackedMoves' : 'moveGeneration',
+                 'getQuietPackedMoves' : 'moveGeneration', 'isValidPackedMove' : 'moveGeneration',
+                 'makePackedMove' : 'makeMove', 'undoMove' : 'undoMove', 'updateEvaluation' : 'evaluation'}
+SECTIONS = ('moveGeneration', 'makeMove', 'undoMove', 'evaluation', 'search')
+
+
+class SearchStats():
+    def __init__(self, info = None, infoInterval = None, timed = True):
+        self.info = info # called with UCI style info lines, None for no lines
+        self.infoInterval = infoInterval # seconds between info lines during an iteration (timed only), None for none
+        self.timed = timed # split the time between the parts of the search
+        self.nodes = 0
+        self.leafEvaluations = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.time = 0 # seconds
+        self.times = dict.fromkeys(SECTIONS, 0.0) # seconds of the search spent in every section
+        self.iterations = [] # (depth, nodes, seconds, packed best move) of every completed iteration
+        self.tableProbes = 0
+        self.tableHits = 0
+        self.moveCacheHits = 0
+        self.moveCacheMisses = 0
+        self.search = None # the running Search
+        self.startTime = 0
+        self.nextInfo = float('inf')
+        self.nested = 0.0 # time of the timed calls made inside the running timed call
+
+    '''
+        Called by Search.iterativeDeepening before the first iteration : put the timing wrappers on the game state
+    '''
+    def start(self, search):
+        self.search = search
+        gs = search.gs
+        if self.timed:
+            for name, section in TIMED_METHODS.items():
+                setattr(gs, name, self.timedMethod(getattr(gs, name), section))
+        table = search.transpositionTable
+        self.tableProbes, self.tableHits = -table.probes, -table.hits
+        cache = gs.moveCache
+        if cache is not None:
+            self.moveCacheHits, self.moveCacheMisses = -cache.hits, -cache.misses
+        self.startTime = time.perf_counter()
+        if self.info is not None and self.infoInterval is not None and self.timed:
+            self.nextInfo = self.startTime + self.infoInterval
+
+    '''
+        Called by Search.iterativeDeepening after every completed iteration
+    '''
+    def iterationDone(self, search, depth, move):
+        now = time.perf_counter()
+        previousNodes = sum(iteration[1] for iteration in self.iterations)
+        previousTime = sum(iteration[2] for iteration in self.iterations)
+        self.iterations.append((depth, search.nodes - previousNodes, now - self.startTime - previousTime, move))
+        if self.info is not None:
+            elapsed = now - self.startTime
+            self.info(f"info depth {depth} nodes {search.nodes} "
+                      f"nps {int(search.nodes / max(elapsed, 1e-9))} time {int(elapsed*1000)}")
+
+    '''
+        Called by Search.iterativeDeepening when the search ends : take the wrappers off and fill in the totals
+    '''
+    def finish(self, search):
+        self.time = time.perf_counter() - self.startTime
+        gs = search.gs
+        for name in TIMED_METHODS:
+            if name in vars(gs):
+                delattr(gs, name)
+        self.nodes = search.nodes
+        self.leafEvaluations = search.quiescenceNodes
+        self.cutoffs = search.cutoffs
+        self.firstMoveCutoffs = search.firstMoveCutoffs
+        if not self.timed:
+            self.times = dict.fromkeys(SECTIONS[:-1], 0.0)
+        self.times['search'] = max(self.time - sum(self.times[section] for section in SECTIONS[:-1]), 0)
+        table = search.transpositionTable
+        self.tableProbes += table.probes
+        self.tableHits += table.hits
+        cache = gs.moveCache
+        if cache is not None:
+            self.moveCacheHits += cache.hits
+            self.moveCacheMisses += cache.misses
+        self.search = None
+        self.nextInfo = float('inf')
+        if self.info is not None:
+            for line in self.report().splitlines():
+                self.info("info string " + line)
+
+    '''
+        The method wrapped so its own time (without the timed methods it calls) is added to the section
+    '''
+    def timedMethod(self, method, section):
+        times = self.times
+        def wrapper(*args):
+            outer = self.nested
+            self.nested = 0.0
+            start = time.perf_counter()
+            try:
+                return method(*args)
+            finally:
+                elapsed = time.perf_counter() - start
+                times[section] += elapsed - self.nested
+                self.nested = outer + elapsed
+                if start >= self.nextInfo:
+                    self.sendProgress(start)
+        return wrapper
+
+    '''
+        Periodic info line of the running search
+    '''
+    def sendProgress(self, now):
+        self.nextInfo = now + self.infoInterval
+        search = self.search
+        elapsed = now - self.startTime
+        self.info(f"info depth {search.completedDepth + 1} nodes {search.nodes} "
+                  f"nps {int(search.nodes / max(elapsed, 1e-9))} time {int(elapsed*1000)} "
+                  f"hashfull {search.transpositionTable.hashfull()}")
+
+    def nodesPerSecond(self):
+        return self.nodes / self.time if self.time > 0 else 0
+
+    '''
+        Nodes of every iteration divided by the nodes of the one before, by depth
+    '''
+    def branchingFactors(self):
+        return {iteration[0] : iteration[1] / previous[1] for previous, iteration in zip(self.iterations, self.iterations[1:])
+                if previous[1]}
+
+    def tableHitRate(self):
+        return self.tableHits / self.tableProbes if self.tableProbes else 0
+
+    def moveCacheHitRate(self):
+        lookups = self.moveCacheHits + self.moveCacheMisses
+        return self.moveCacheHits / lookups if lookups else 0
+
+    def asDict(self):
+        return {'nodes' : self.nodes, 'leafEvaluations' : self.leafEvaluations, 'time' : self.time,
+                'nodesPerSecond' : self.nodesPerSecond(), 'times' : dict(self.times),
+                'iterations' : [{'depth' : depth, 'nodes' : nodes, 'time' : seconds}
+                                for depth, nodes, seconds, _ in self.iterations],
+                'branchingFactors' : self.branchingFactors(), 'cutoffs' : self.cutoffs,
+                'firstMoveCutoffs' : self.firstMoveCutoffs, 'tableProbes' : self.tableProbes,
+                'tableHitRate' : self.tableHitRate(), 'moveCacheHits' : self.moveCacheHits,
+                'moveCacheMisses' : self.moveCacheMisses, 'moveCacheHitRate' : self.moveCacheHitRate()}
+
+    def report(self):
+        lines = [f"{self.nodes} nodes  {self.leafEvaluations} leaf evaluations  {self.time:.3f}s  "
+                 f"{int(self.nodesPerSecond())} nodes/s"]
+        if self.timed:
+            lines.append("time  " + "  ".join(f"{section} {self.times[section] / self.time:.0%}" if self.time else section
+                                             for section in SECTIONS))
+        factors = self.branchingFactors()
+        lines.append("depth nodes  " + "  ".join(f"{depth}:{nodes}" + (f" (x{factors[depth]:.1f})" if depth in factors else "")
+                                                for depth, nodes, _, _ in self.iterations))
+        ordering = self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0
+        lines.append(f"hash table {self.tableHitRate():.1%} hits of {self.tableProbes}  move cache "
+                     f"{self.moveCacheHitRate():.1%} hits of {self.moveCacheHits + self.moveCacheMisses}  "
+                     f"first move cutoffs {ordering:.1%}")
+        return "\n".join(lines)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Profile a search of a position")
+    parser.add_argument("--fen", help = "position to search (default : the starting position)")
+    parser.add_argument("-d", "--depth", type = int, default = smartMoveFinder.DEPTH)
+    parser.add_argument("-t", "--time", type = float, help = "search for this many seconds instead of to a depth")
+    parser.add_argument("-b", "--backend", choices = sorted(BACKENDS), default = "bitboard")
+    parser.add_argument("--info", type = float, metavar = "SECONDS", help = "print info lines this often")
+    args = parser.parse_args(argv)
+
+    gs = BACKENDS[args.backend]()
+    if args.fen:
+        gs.loadFEN(args.fen)
+    depth = smartMoveFinder.MAX_DEPTH if args.time is not None else args.depth
+    stats = SearchStats(print if args.info is not None else None, args.info)
+    result = smartMoveFinder.searchBestMove(gs, gs.getValidMoves(), depth, args.time, stats = stats)
+    print(f"best move {result.move.getChessNotation() if result.move else None}  score {result.score}  depth {result.depth}")
+    print(stats.report())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,357 @@
+"""
+    Headless matches between two engine configurations, to find out whether a change (a faster move generator,
+    another evaluation, more thinking time) makes the engine stronger. The games are played in a pool of processes
+    without pygame, every opening is played twice with the colors swapped, and after every game the Elo difference
+    and a sequential probability ratio test (SPRT) are updated. The SPRT stops the match as soon as it is sure enough
+    that the first engine is at least elo1 stronger (accepted, H1) or at most elo0 stronger (rejected, H0).
+
+    python selfPlay.py --engine name=new,time=0.1 --engine name=old,time=0.1,backend=board -g 2000
+    python selfPlay.py --engine depth=4 --engine depth=3 -g 200 --openings openings.txt --pgn games.pgn
+
+    An engine is a comma separated list of key=value : name, time (seconds per move), depth, nodes, hash (MB),
+    bitbases (true or false) and backend, the game state class it plays with : board, bitboard or module.Class of
+    any GameState subclass, which is how evaluation variants are tried. With a time limit the faster engine searches
+    deeper, so a speed optimization shows up as strength. The openings file has one opening per line, a FEN or moves
+    in SAN from the starting position. Games end by checkmate, stalemate, threefold repetition, the 50 move rule,
+    insufficient material or, after MAX_PLIES, adjudication as a draw.
+"""
+import argparse
+import importlib
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import bitbases
+import bitboardEngine
+import chessEngine
+from smartMoveFinder import Search, MAX_DEPTH
+from transpositionTable import TranspositionTable
+
+BACKENDS = {'board' : chessEngine.GameState, 'bitboard' : bitboardEngine.BitboardGameState}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MAX_PLIES = 400 # a game this long is adjudicated as a draw
+DEFAULT_TIME = 0.1 # seconds per move of an engine without limits
+DEFAULT_HASH_MB = 16
+# openings used when no file is given, each is played with both colors
+OPENINGS = ["e4 e5 Nf3 Nc6 Bb5", "e4 e5 Nf3 Nc6 Bc4", "e4 c5 Nf3 d6 d4", "e4 c5 Nc3 Nc6 g3", "e4 e6 d4 d5 Nc3",
+            "e4 c6 d4 d5 e5", "e4 d5 exd5 Qxd5 Nc3", "e4 Nf6 e5 Nd5 d4", "d4 d5 c4 e6 Nc3", "d4 d5 c4 c6 Nf3",
+            "d4 Nf6 c4 g6 Nc3", "d4 Nf6 c4 e6 Nf3", "d4 f5 g3 Nf6 Bg2", "c4 e5 Nc3 Nf6 g3", "Nf3 d5 g3 Nf6 Bg2",
+            "c4 c5 Nf3 Nc6 Nc3", "e4 g6 d4 Bg7 Nc3", "d4 Nf6 Bg5 e6 e4", "e4 e5 f4 exf4 Nf3", "d4 d5 Bf4 Nf6 e3"]
+
+# engines of a worker process, set up once by initWorker : (configuration, game state, transposition table, bitbases)
+workerEngines = None
+
+
+"""
+    Engine configuration of a key=value,key=value string
+"""
+def parseEngine(text, number):
+    config = {'name' : f"engine{number}", 'time' : None, 'depth' : None, 'nodes' : None, 'hash' : DEFAULT_HASH_MB,
+              'bitbases' : False, 'backend' : 'bitboard'}
+    for item in filter(None, text.split(",")):
+        key, _, value = item.partition("=")
+        if key not in config:
+            raise ValueError(f"unknown engine option {key}")
+        if key == 'time':
+            config[key] = float(value)
+        elif key in ('depth', 'nodes', 'hash'):
+            config[key] = int(value)
+        elif key == 'bitbases':
+            config[key] = value.lower() in ("true", "1", "yes")
+        else:
+            config[key] = value
+    if config['time'] is None and config['depth'] is None and config['nodes'] is None:
+        config['time'] = DEFAULT_TIME
+    gameStateClass(config['backend']) # fail here rather than in the workers
+    return config
+
+
+"""
+    Game state class of a backend name : board, bitboard or module.Class
+"""
+def gameStateClass(backend):
+    if backend in BACKENDS:
+        return BACKENDS[backend]
+    moduleName, _, className = backend.rpartition(".")
+    if not moduleName:
+        raise ValueError(f"unknown backend {backend}")
+    return getattr(importlib.import_module(moduleName), className)
+
+
+"""
+    Openings as start FENs : a line with a / is a FEN, any other line moves in SAN from the starting position
+"""
+def loadOpenings(lines):
+    gs = bitboardEngine.BitboardGameState()
+    openings = []
+    for line in lines:
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+        if "/" in line:
+            gs.loadFEN(line)
+        else:
+            gs.loadFEN(START_FEN)
+            for san in line.split():
+                if not san[0].isdigit(): # move numbers
+                    gs.makePackedMove(gs.parseSAN(san))
+        openings.append(gs.getFEN())
+    return openings
+
+
+def initWorker(configs):
+    global workerEngines
+    workerEngines = []
+    for config in configs:
+        engineBitbases = bitbases.Bitbases() if config['bitbases'] else None
+        workerEngines.append((config, gameStateClass(config['backend'])(), TranspositionTable(config['hash']),
+                              engineBitbases))
+
+
+"""
+    How the game of gs has ended, or None if it goes on
+"""
+def gameOver(gs, moves):
+    if not moves:
+        return ("0-1" if gs.whiteToMove else "1-0", "checkmate") if gs.inCheck else ("1/2-1/2", "stalemate")
+    if gs.halfmoveClock >= 100:
+        return "1/2-1/2", "50 move rule"
+    if gs.getRepetitions() >= 3:
+        return "1/2-1/2", "threefold repetition"
+    if gs.isInsufficientMaterial():
+        return "1/2-1/2", "insufficient material"
+    if len(gs.packedMovesLog) >= MAX_PLIES:
+        return "1/2-1/2", "adjudication"
+    return None
+
+
+"""
+    Runs in a worker : plays a game from the FEN, the first engine of the worker has white when firstIsWhite.
+    Returns (result, reason, moves in SAN, seconds used by each engine)
+"""
+def playGame(fen, firstIsWhite):
+    for _, gs, table, _ in workerEngines:
+        gs.loadFEN(fen)
+        table.clear()
+    referee = workerEngines[0][1]
+    engineTimes = [0.0, 0.0]
+    sanMoves = []
+    while True:
+        moves = referee.getValidPackedMoves()
+        ended = gameOver(referee, moves)
+        if ended is not None:
+            return ended[0], ended[1], sanMoves, engineTimes
+        engine = 0 if referee.whiteToMove == firstIsWhite else 1
+        config, gs, table, engineBitbases = workerEngines[engine]
+        startTime = time.perf_counter()
+        search = Search(gs, table, config['time'], config['nodes'], bitbases = engineBitbases)
+        result = search.iterativeDeepening(gs.getValidMoves(), config['depth'] or MAX_DEPTH)
+        engineTimes[engine] += time.perf_counter() - startTime
+        move = result.move.packed if result.move is not None else moves[0]
+        sanMoves.append(referee.getSAN(move, moves))
+        for _, engineGameState, _, _ in workerEngines:
+            engineGameState.makePackedMove(move)
+
+
+class MatchScore():
+    def __init__(self, elo0 = 0, elo1 = 10, alpha = 0.05, beta = 0.05):
+        self.wins = 0 # of the first engine
+        self.losses = 0
+        self.draws = 0
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lowerBound = math.log(beta / (1 - alpha)) # the SPRT accepts H0 below it and H1 above the upper one
+        self.upperBound = math.log((1 - beta) / alpha)
+
+    def games(self):
+        return self.wins + self.losses + self.draws
+
+    def add(self, score):
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+
+    '''
+        Mean score of the first engine and the variance of a game's score
+    '''
+    def scoreAndVariance(self):
+        games = self.games()
+        score = (self.wins + self.draws / 2) / games
+        variance = (self.wins*(1 - score)**2 + self.draws*(0.5 - score)**2 + self.losses*score**2) / games
+        return score, variance
+
+    '''
+        Elo difference of the first engine and the half width of its 95% confidence interval
+    '''
+    def elo(self):
+        if self.games() == 0:
+            return 0, float('inf')
+        score, variance = self.scoreAndVariance()
+        margin = 1.96*math.sqrt(variance / self.games())
+        return scoreToElo(score), (scoreToElo(score + margin) - scoreToElo(score - margin)) / 2
+
+    '''
+        Log likelihood ratio of H1 (elo1) against H0 (elo0), the normal approximation of the generalized SPRT
+    '''
+    def llr(self):
+        if self.games() == 0:
+            return 0
+        score, variance = self.scoreAndVariance()
+        if variance == 0:
+            return 0
+        score0 = eloToScore(self.elo0)
+        score1 = eloToScore(self.elo1)
+        return self.games()*(score1 - score0)*(2*score - score0 - score1) / (2*variance)
+
+    '''
+        "H1" when the first engine is at least elo1 stronger, "H0" when it is at most elo0 stronger, None until then
+    '''
+    def sprt(self):
+        llr = self.llr()
+        if llr >= self.upperBound:
+            return "H1"
+        if llr <= self.lowerBound:
+            return "H0"
+        return None
+
+    def status(self):
+        elo, margin = self.elo()
+        return (f"games {self.games()}  +{self.wins} -{self.losses} ={self.draws}  elo {elo:+.1f} +/- {margin:.1f}  "
+                f"LLR {self.llr():.2f} [{self.lowerBound:.2f}, {self.upperBound:.2f}]")
+
+
+def eloToScore(elo):
+    return 1 / (1 + 10**(-elo / 400))
+
+def scoreToElo(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400*math.log10(1 / score - 1)
+
+
+"""
+    A game in PGN from what playGame returned
+"""
+def gamePGN(names, fen, firstIsWhite, gameNumber, result, reason, sanMoves):
+    white, black = names if firstIsWhite else names[::-1]
+    headers = [("Event", "selfPlay"), ("Round", str(gameNumber)), ("White", white), ("Black", black), ("Result", result),
+               ("Termination", reason)]
+    if fen != START_FEN:
+        headers += [("SetUp", "1"), ("FEN", fen)]
+    gs = chessEngine.GameState()
+    gs.loadFEN(fen)
+    moveNumber = gs.getFullmoveNumber()
+    movetext = []
+    whiteToMove = gs.whiteToMove
+    for i, san in enumerate(sanMoves):
+        if whiteToMove:
+            movetext.append(f"{moveNumber}.")
+        elif i == 0:
+            movetext.append(f"{moveNumber}...")
+        movetext.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    movetext.append(result)
+    lines = [f'[{name} "{value}"]' for name, value in headers]
+    return "\n".join(lines) + "\n\n" + " ".join(movetext) + "\n\n"
+
+
+"""
+    Play up to games games between the two engine configurations, report(line) gets the score after every game.
+    Stops early when the SPRT decides unless sprt is False. Returns the MatchScore
+"""
+def runMatch(configs, openings, games, workers = None, score = None, sprt = True, report = print, pgnFile = None):
+    score = score if score is not None else MatchScore()
+    workers = workers if workers is not None else os.cpu_count() or 1
+    names = [config['name'] for config in configs]
+    schedule = ((openings[(i // 2) % len(openings)], i % 2 == 0) for i in range(games)) # every opening twice
+    gameNumber = 0
+    engineTimes = [0.0, 0.0]
+    with ProcessPoolExecutor(workers, initializer = initWorker, initargs = (configs,)) as executor:
+        running = {}
+        def submit():
+            for fen, firstIsWhite in schedule:
+                running[executor.submit(playGame, fen, firstIsWhite)] = (fen, firstIsWhite)
+                return
+        for _ in range(workers*2): # a few games queued per worker, so stopping early wastes little
+            submit()
+        while running:
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                fen, firstIsWhite = running.pop(future)
+                result, reason, sanMoves, times = future.result()
+                gameNumber += 1
+                engineTimes[0] += times[0]
+                engineTimes[1] += times[1]
+                if result == "1/2-1/2":
+                    score.add(0.5)
+                else:
+                    score.add(1 if (result == "1-0") == firstIsWhite else 0)
+                if pgnFile is not None:
+                    pgnFile.write(gamePGN(names, fen, firstIsWhite, gameNumber, result, reason, sanMoves))
+                report(score.status())
+                if not (sprt and score.sprt()):
+                    submit()
+        decision = score.sprt()
+    if gameNumber:
+        report(f"thinking time per game : {names[0]} {engineTimes[0] / gameNumber:.2f}s  "
+               f"{names[1]} {engineTimes[1] / gameNumber:.2f}s")
+    if decision == "H1":
+        report(f"SPRT : H1 accepted, {names[0]} is at least {score.elo1} elo stronger")
+    elif decision == "H0":
+        report(f"SPRT : H0 accepted, {names[0]} is at most {score.elo0} elo stronger")
+    return score
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Play two engine configurations against each other")
+    parser.add_argument("--engine", action = "append", default = [], help = "key=value,... (given twice)")
+    parser.add_argument("-g", "--games", type = int, default = 1000, help = "most games to play")
+    parser.add_argument("-j", "--workers", type = int, help = "processes (default : one per core)")
+    parser.add_argument("--openings", help = "file with one FEN or SAN move sequence per line")
+    parser.add_argument("--shuffle", action = "store_true", help = "play the openings in a random order")
+    parser.add_argument("--elo0", type = float, default = 0, help = "SPRT H0 : elo difference at most this")
+    parser.add_argument("--elo1", type = float, default = 10, help = "SPRT H1 : elo difference at least this")
+    parser.add_argument("--alpha", type = float, default = 0.05)
+    parser.add_argument("--beta", type = float, default = 0.05)
+    parser.add_argument("--no-sprt", action = "store_true", help = "play all the games even when the SPRT decides")
+    parser.add_argument("--pgn", help = "write the games to this PGN file")
+    args = parser.parse_args(argv)
+    if len(args.engine) != 2:
+        parser.error("give exactly two --engine")
+    try:
+        configs = [parseEngine(text, number) for number, text in enumerate(args.engine, 1)]
+        if args.openings:
+            with open(args.openings) as file:
+                openings = loadOpenings(file)
+        else:
+            openings = loadOpenings(OPENINGS)
+    except (ValueError, ImportError, AttributeError, OSError) as error:
+        parser.error(str(error))
+    if not openings:
+        parser.error("no openings")
+    if args.shuffle:
+        random.shuffle(openings)
+
+    score = MatchScore(args.elo0, args.elo1, args.alpha, args.beta)
+    startTime = time.perf_counter()
+    pgnFile = open(args.pgn, "w") if args.pgn else None
+    try:
+        runMatch(configs, openings, args.games, args.workers, score, not args.no_sprt, print, pgnFile)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if pgnFile is not None:
+            pgnFile.close()
+    print(f"{configs[0]['name']} vs {configs[1]['name']} : {score.status()}  {time.perf_counter() - startTime:.0f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,33 @@
 import random
+import time
+from transpositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from chessEngine import PIECES, PROMOTION_MOVE, PROMOTION_PIECES
+from evaluation import MIDGAME_VALUES, ENDGAME_VALUES
 
 pieceScore = {"K" : 200, "P" : 1, "B" : 3, "N" : 3, "R" : 5, "Q": 9} # Reference : https://en.wikipedia.org/wiki/Computer_chess#Leaf_evaluation
-CHECKMATE = 1300
+CHECKMATE = 100000 # evaluation is in centipawns (see evaluation.py)
 STALEMATE = 0
 DEPTH = 3
+MAX_DEPTH = 64 # depth limit of a search that is only limited by time
+MATE_THRESHOLD = CHECKMATE - 1000 # scores beyond this are forced mates
+INFINITY = CHECKMATE + 1
+MAX_PLY = 128 # deepest ply the killer moves are kept for
+MAX_QUIESCENCE_CHECKS = 2 # positions in check on a quiescence line whose every evasion is searched
+
+# move ordering : hash move first, then captures by MVV-LVA, promotions, the two killer moves and the quiet moves
+# by their history score. ORDER_VALUES is the value of a piece for MVV-LVA by its index in chessEngine.PIECES
+ORDER_VALUES = [0, 1, 2, 3, 4, 5, 6, 1, 2, 3, 4, 5, 6]
+HASH_MOVE_ORDER = 1 << 30
+CAPTURE_ORDER = 1 << 29
+PROMOTION_ORDER = 1 << 28
+KILLER_ORDER = 1 << 27
+MAX_HISTORY = 1 << 26 # history scores are halved when they get here so quiet moves stay behind the killers
+
+# delta pruning in the quiescence search : a capture is skipped when even winning the captured piece plus
+# DELTA_MARGIN can't bring the score up to alpha. CAPTURE_GAINS is the most a piece is worth, by its index in PIECES
+CAPTURE_GAINS = [0] + [max(MIDGAME_VALUES[piece[1]] , ENDGAME_VALUES[piece[1]]) for piece in PIECES[1:]]
+PROMOTION_GAINS = [max(MIDGAME_VALUES[piece] , ENDGAME_VALUES[piece]) - MIDGAME_VALUES['P'] for piece in PROMOTION_PIECES]
+DELTA_MARGIN = 200
 
 def findRandomMove(validMoves):
     return validMoves[random.randint(0 , len(validMoves) - 1)]
@@ -34,7 +58,7 @@ def findBestMove(gs, validMoves):
                 elif gs.stalemate:
                     score = STALEMATE
                 else:
-                    score = -turnMultiplier*(scoreBasedOnMaterial(gs.board)) # uncomment if mobilityWeight is not needed
+                    score = -turnMultiplier*gs.evaluation # uncomment if mobilityWeight is not needed
                     # score = turnMultiplier*(scoreBasedOnMaterial(gs.board) + mobilityWeight*len(gs.getValidMoves()))# comment if mobilityWeight is not needed
             
                 # gs.whiteToMove = not gs.whiteToMove# comment if mobilityWeight is not needed
@@ -50,42 +74,313 @@ def findBestMove(gs, validMoves):
     return bestPlayerMove
 
 
-def findBestMoveMinMax(gs , validMoves):
-    global nextMove
-    nextMove = None
-    findMoveMinMax(gs , validMoves , DEPTH , gs.whiteToMove)
-    return nextMove
+"""
+    Pass the same transposition table for every move of a game to reuse what earlier searches found.
+    Searches DEPTH plies, or as deep as it gets within timeLimit seconds if one is given
+"""
+def findBestMoveMinMax(gs , validMoves , transpositionTable = None , timeLimit = None , bitbases = None):
+    depth = DEPTH if timeLimit is None else MAX_DEPTH
+    return searchBestMove(gs , validMoves , depth , timeLimit , transpositionTable , bitbases = bitbases).move
 
-""" MinMax """
-def findMoveMinMax(gs , validMoves , depth , whiteToMove):
-    global nextMove
-    if depth == 0:
-        return scoreBasedOnMaterial(gs.board)
-    
-    if whiteToMove:
-        maxScore = -CHECKMATE
-        for move in validMoves:
-            gs.makeMove(move)
-            nextPossibleMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs , nextPossibleMoves , depth - 1 , False)
-            if score > maxScore:
-                maxScore = score
-                if depth == DEPTH:
-                    nextMove = move
+"""
+    Alpha-beta search with iterative deepening, returns the result of the last depth that was completely searched.
+    Every search keeps its state in its own Search object so several games can be searched at once
+"""
+def searchBestMove(gs , validMoves , depth = DEPTH , timeLimit = None , transpositionTable = None , nodeLimit = None ,
+                   stopEvent = None , bitbases = None , stats = None):
+    search = Search(gs , transpositionTable , timeLimit , nodeLimit , stopEvent , bitbases , stats)
+    return search.iterativeDeepening(validMoves , depth)
+
+"""
+    Sort packed moves from the most to the least promising : the hash move, captures of the most valuable victim by
+    the least valuable attacker, promotions (queen first), the killer moves of the ply and the quiet moves by history
+"""
+def orderMoves(validMoves , hashMove , killers , history):
+    def orderScore(move):
+        if move == hashMove:
+            return HASH_MOVE_ORDER
+        captured = (move >> 16) & 15
+        if captured:
+            return CAPTURE_ORDER + ORDER_VALUES[captured]*8 - ORDER_VALUES[(move >> 12) & 15]
+        if (move >> 20) & 3 == PROMOTION_MOVE:
+            return PROMOTION_ORDER - ((move >> 22) & 3)
+        if move == killers[0]:
+            return KILLER_ORDER + 1
+        if move == killers[1]:
+            return KILLER_ORDER
+        return history[(move >> 6) & 1023] # moved piece and end square
+    return sorted(validMoves , key = orderScore , reverse = True)
+
+"""
+    Order of the captures and promotions stage of GameState.getStagedPackedMoves, the same as in orderMoves
+"""
+def captureOrder(move):
+    captured = (move >> 16) & 15
+    if captured:
+        return CAPTURE_ORDER + ORDER_VALUES[captured]*8 - ORDER_VALUES[(move >> 12) & 15]
+    return PROMOTION_ORDER - ((move >> 22) & 3)
+
+"""
+    Mate scores are stored relative to the position in the transposition table and relative to the root in the search
+"""
+def scoreToTable(score , ply):
+    if score > MATE_THRESHOLD:
+        return score + ply
+    if score < -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def scoreFromTable(score , ply):
+    if score > MATE_THRESHOLD:
+        return score - ply
+    if score < -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class SearchResult():
+    def __init__(self , move , score , depth , nodes , time , cutoffs = 0 , firstMoveCutoffs = 0):
+        self.move = move # None if there was no legal move
+        self.score = score # from the point of view of the side to move
+        self.depth = depth # depth of the last completed iteration
+        self.nodes = nodes
+        self.time = time # seconds
+        self.cutoffs = cutoffs # beta cutoffs
+        self.firstMoveCutoffs = firstMoveCutoffs # beta cutoffs by the first move tried, the higher the better the ordering
+        self.stats = None # the searchStats.SearchStats of the search if it was given one
+
+
+class Search():
+    def __init__(self , gs , transpositionTable = None , timeLimit = None , nodeLimit = None , stopEvent = None ,
+                 bitbases = None , stats = None):
+        self.gs = gs
+        self.transpositionTable = transpositionTable if transpositionTable is not None else TranspositionTable()
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.stopEvent = stopEvent # a threading.Event, setting it from another thread ends the search
+        self.bitbases = bitbases # bitbases.Bitbases with the exact scores of some endgames
+        self.stats = stats # a searchStats.SearchStats to fill in, None costs nothing
+        self.deadline = None
+        self.nodes = 0
+        self.completedDepth = 0
+        self.killers = [[None , None] for _ in range(MAX_PLY)] # two quiet moves per ply that caused a cutoff
+        self.history = [0]*1024 # cutoffs of quiet moves by moved piece and end square, see orderMoves
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.quiescenceNodes = 0
+
+    def iterativeDeepening(self , validMoves , maxDepth):
+        gs = self.gs
+        startTime = time.perf_counter()
+        if self.timeLimit is not None:
+            self.deadline = startTime + self.timeLimit
+        self.transpositionTable.newSearch()
+        self.nodes = 0
+        self.completedDepth = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.quiescenceNodes = 0
+        result = SearchResult(None , 0 , 0 , 0 , 0)
+        if self.stats is not None:
+            self.stats.start(self)
+        movesPlayed = len(gs.packedMovesLog)
+        rootMoves = {move.packed : move for move in validMoves}
+        for depth in range(1 , maxDepth + 1):
+            try:
+                score , move = self.negamax(list(rootMoves) , depth , 0 , -INFINITY , INFINITY)
+            except SearchTimeout:
+                # take back the moves of the interrupted iteration
+                while len(gs.packedMovesLog) > movesPlayed:
+                    gs.undoMove()
+                break
+            result = SearchResult(rootMoves.get(move) , score , depth , self.nodes , time.perf_counter() - startTime ,
+                                  self.cutoffs , self.firstMoveCutoffs)
+            self.completedDepth = depth
+            if self.stats is not None:
+                self.stats.iterationDone(self , depth , move)
+            if move is None or abs(score) > MATE_THRESHOLD: # no moves or a forced mate found, deeper won't change it
+                break
+        gs.checkmate = False
+        gs.stalemate = False
+        gs.getValidMoves() # restore checkmate, stalemate and inCheck of the root position
+        result.nodes = self.nodes
+        result.time = time.perf_counter() - startTime
+        if self.stats is not None:
+            self.stats.finish(self)
+            result.stats = self.stats
+        return result
+
+    """
+        Score of a single packed root move searched depth plies deep, for the side to move at the root.
+        Used by the parallel search, the game state is left as it was even when the search times out
+    """
+    def searchRootMove(self , move , depth , alpha , beta):
+        gs = self.gs
+        movesPlayed = len(gs.packedMovesLog)
+        gs.makePackedMove(move)
+        try:
+            score = -self.searchChild(depth - 1 , 1 , -beta , -alpha)
+        finally:
+            while len(gs.packedMovesLog) > movesPlayed:
+                gs.undoMove()
+        return score
+
+    """
+        Score of the position after a move, the leaves go straight to the quiescence search so the full move list
+        of the leaf positions is never generated. Endgames of the bitbases aren't searched at all. A position that
+        repeats one since the last irreversible move, or reaches the 50 move rule, is a draw (before the transposition
+        table, whose scores don't know the path that led to the position)
+    """
+    def searchChild(self , depth , ply , alpha , beta):
+        gs = self.gs
+        if gs.halfmoveClock >= 100 or gs.isRepeated():
+            self.nodes += 1
+            return STALEMATE
+        if self.bitbases is not None:
+            score = self.bitbases.probeScore(gs , ply)
+            if score is not None:
+                self.nodes += 1
+                return score
+        if depth == 0:
+            return self.quiescence(alpha , beta , ply)
+        return self.negamax(None , depth , ply , alpha , beta)[0]
+
+    """
+        Search only captures and promotions until the position is quiet, so the evaluation isn't taken in the middle
+        of an exchange. The side to move can always stand pat (keep the static evaluation) instead of capturing,
+        except when it is in check, then every evasion is searched. checks counts those positions on the line, after
+        MAX_QUIESCENCE_CHECKS of them only the capturing evasions are so a series of checks can't blow up the leaves
+    """
+    def quiescence(self , alpha , beta , ply , checks = 0):
+        gs = self.gs
+        self.nodes += 1
+        self.quiescenceNodes += 1
+        if self.nodes & 1023 == 0 and self.completedDepth > 0 and self.shouldStop():
+            raise SearchTimeout()
+
+        standPat = (1 if gs.whiteToMove else -1)*gs.evaluation # kept up to date by makeMove and undoMove
+        moves = gs.getCapturePackedMoves() # also sets gs.inCheck
+        evasions = gs.inCheck and ply < MAX_PLY and checks < MAX_QUIESCENCE_CHECKS
+        if evasions:
+            moves = gs.getValidPackedMoves()
+            if len(moves) == 0:
+                return -CHECKMATE + ply
+            bestScore = -INFINITY
+        else:
+            if standPat >= beta or ply >= MAX_PLY:
+                return standPat
+            bestScore = standPat
+            alpha = max(alpha , standPat)
+
+        for move in orderMoves(moves , None , (None , None) , self.history):
+            if not evasions:
+                gain = CAPTURE_GAINS[(move >> 16) & 15]
+                if (move >> 20) & 3 == PROMOTION_MOVE:
+                    if (move >> 22) & 3: # under promotions are left to the main search
+                        continue
+                    gain += PROMOTION_GAINS[0]
+                if standPat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            gs.makePackedMove(move)
+            score = -self.quiescence(-beta , -alpha , ply + 1 , checks + evasions)
             gs.undoMove()
-        return maxScore
-    else:
-        minScore = CHECKMATE
-        for move in validMoves:
-            gs.makeMove(move)
-            nextPossibleMoves = gs.getValidMoves()
-            score = findMoveMinMax(gs , nextPossibleMoves , depth - 1 , True)
-            if score < minScore:
-                minScore = score
-                if depth == DEPTH:
-                    nextMove = move
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return bestScore
+
+    """
+        A quiet move refuted the opponent's move : remember it as a killer of the ply and raise its history score
+    """
+    def updateQuietCutoff(self , move , depth , killers):
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        index = (move >> 6) & 1023
+        self.history[index] += depth*depth
+        if self.history[index] >= MAX_HISTORY:
+            self.history = [score // 2 for score in self.history]
+
+    """
+        Out of time, over the node limit or stopped from outside
+    """
+    def shouldStop(self):
+        return ((self.deadline is not None and time.perf_counter() > self.deadline)
+                or (self.nodeLimit is not None and self.nodes >= self.nodeLimit)
+                or (self.stopEvent is not None and self.stopEvent.is_set()))
+
+    """
+        NegaMax with alpha-beta pruning on packed moves, returns the score for the side to move and the best move.
+        Without a list of moves they are generated in stages (GameState.getStagedPackedMoves) : a transposition table
+        cutoff generates nothing and a cutoff by the hash move or a capture never generates the quiet moves
+    """
+    def negamax(self , validMoves , depth , ply , alpha , beta):
+        gs = self.gs
+        self.nodes += 1
+        # the first iteration always finishes so there is a move to return
+        if self.nodes & 1023 == 0 and self.completedDepth > 0 and self.shouldStop():
+            raise SearchTimeout()
+
+        if validMoves is not None and len(validMoves) == 0:
+            return (-CHECKMATE + ply if gs.inCheck else STALEMATE) , None
+        if depth == 0:
+            return self.quiescence(alpha , beta , ply) , None
+
+        alphaOriginal = alpha
+        key = gs.zobristKey
+        hashMove = None
+        entry = self.transpositionTable.probe(key)
+        if entry is not None:
+            hashMove = entry[4]
+            if ply > 0 and entry[1] >= depth:
+                score = scoreFromTable(entry[2] , ply)
+                bound = entry[3]
+                if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or (bound == UPPER_BOUND and score <= alpha):
+                    return score , None
+
+        bestScore = -INFINITY
+        bestMove = None
+        killers = self.killers[ply] if ply < MAX_PLY else [None , None]
+        if validMoves is None:
+            moves = gs.getStagedPackedMoves(hashMove , killers , captureOrder ,
+                                            lambda move: self.history[(move >> 6) & 1023])
+        else:
+            moves = orderMoves(validMoves , hashMove , killers , self.history)
+        i = -1
+        for i , move in enumerate(moves):
+            gs.makePackedMove(move)
+            score = -self.searchChild(depth - 1 , ply + 1 , -beta , -alpha)
             gs.undoMove()
-        return minScore
+            if score > bestScore:
+                bestScore = score
+                bestMove = move
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.cutoffs += 1
+                if i == 0:
+                    self.firstMoveCutoffs += 1
+                if not (move >> 16) & 15 and (move >> 20) & 3 != PROMOTION_MOVE:
+                    self.updateQuietCutoff(move , depth , killers)
+                break
+        if i < 0: # the staged generator found no legal move
+            return (-CHECKMATE + ply if gs.inCheck else STALEMATE) , None
+
+        if bestScore <= alphaOriginal:
+            bound = UPPER_BOUND
+        elif bestScore >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        self.transpositionTable.store(key , depth , scoreToTable(bestScore , ply) , bound , bestMove)
+        return bestScore , bestMove
 
 
 """
@@ -101,17 +396,7 @@ def scoreBoard(gs):
     elif gs.stalemate:
         return STALEMATE
 
-    
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScore[square[1]]
-            elif square[0] == 'b':
-                score -= pieceScore[square[1]]
-    
-    
-    return score    
+    return gs.evaluation # material and piece-square score kept up to date by makeMove and undoMove
 
 
 def scoreBasedOnMaterial(board):
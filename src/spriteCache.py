@@ -0,0 +1,141 @@
+"""
+    Piece sprites for the board, already scaled to the square size. Decoding and scaling the 12 PNGs of images/ is done
+    once per square size, the scaled pixels are kept in one packed file next to the images and read back as they are on
+    the next launches. The PNGs are used when the cache is missing, out of date (a PNG changed) or can't be read, and
+    the cache is written again when its directory can be written to. Paths are relative to this file, not to the
+    directory the game is started from.
+
+    sprites = loadSprites(64)                         piece name ('wP', 'bK', ...) -> Surface of 64x64
+    python spriteCache.py 64 80 96                     build the cache for these square sizes
+
+    Cache file : header (MAGIC, key of the PNGs, number of sizes), then (square size, offset) for every size, then for
+    every size the RGBA pixels of the pieces in SPRITE_NAMES order
+"""
+import argparse
+import os
+import struct
+import sys
+import time
+import zlib
+
+import pygame as pg
+
+IMAGES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "images")
+CACHE_PATH = os.path.join(IMAGES_DIRECTORY, "sprites.cache")
+SPRITE_NAMES = ['wP', 'wN', 'wB', 'wR', 'wQ', 'wK', 'bP', 'bN', 'bB', 'bR', 'bQ', 'bK']
+MAGIC = b"SPRITES1"
+HEADER = struct.Struct("<8sII") # magic, key of the PNGs, number of sizes
+ENTRY = struct.Struct("<II") # square size, offset of its pixels in the file
+
+
+"""
+    Key of the PNGs the cache was made from, changes when one of them is replaced
+"""
+def sourceKey(directory = IMAGES_DIRECTORY):
+    stamps = []
+    for name in SPRITE_NAMES:
+        stat = os.stat(os.path.join(directory, f"{name}.png"))
+        stamps.append(f"{name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return zlib.crc32(" ".join(stamps).encode())
+
+
+def loadPNGs(squareSize, directory = IMAGES_DIRECTORY):
+    return {name : pg.transform.scale(pg.image.load(os.path.join(directory, f"{name}.png")), (squareSize, squareSize))
+            for name in SPRITE_NAMES}
+
+
+"""
+    square size -> pixels of every size in the cache file, empty when there is no cache or it is out of date
+"""
+def readCache(cachePath, key):
+    try:
+        with open(cachePath, "rb") as file:
+            data = file.read()
+    except OSError:
+        return {}
+    if len(data) < HEADER.size:
+        return {}
+    magic, cacheKey, count = HEADER.unpack_from(data)
+    if magic != MAGIC or cacheKey != key or len(data) < HEADER.size + count*ENTRY.size:
+        return {}
+    sizes = {}
+    for index in range(count):
+        squareSize, offset = ENTRY.unpack_from(data, HEADER.size + index*ENTRY.size)
+        end = offset + squareSize*squareSize*4*len(SPRITE_NAMES)
+        if end > len(data):
+            return {}
+        sizes[squareSize] = data[offset:end]
+    return sizes
+
+
+"""
+    Write the pixels of every size (square size -> bytes) to the cache file, replaced at once so a game starting at the
+    same time never reads half of it. Returns False when it can't be written (read only install, ...)
+"""
+def writeCache(cachePath, key, sizes):
+    offset = HEADER.size + len(sizes)*ENTRY.size
+    header = [HEADER.pack(MAGIC, key, len(sizes))]
+    for squareSize, pixels in sorted(sizes.items()):
+        header.append(ENTRY.pack(squareSize, offset))
+        offset += len(pixels)
+    temporaryPath = f"{cachePath}.{os.getpid()}.tmp"
+    try:
+        with open(temporaryPath, "wb") as file:
+            file.write(b"".join(header))
+            for _, pixels in sorted(sizes.items()):
+                file.write(pixels)
+        os.replace(temporaryPath, cachePath)
+    except OSError:
+        try:
+            os.remove(temporaryPath)
+        except OSError:
+            pass
+        return False
+    return True
+
+
+"""
+    Piece name -> Surface of squareSize, from the cache when it has that size and from the PNGs otherwise (the size is
+    then added to the cache). Converted to the window's pixel format when there is a window. cachePath None never
+    uses a cache
+"""
+def loadSprites(squareSize, cachePath = CACHE_PATH, directory = IMAGES_DIRECTORY):
+    key = sourceKey(directory)
+    sizes = readCache(cachePath, key) if cachePath is not None else {}
+    pixels = sizes.get(squareSize)
+    if pixels is not None:
+        length = squareSize*squareSize*4
+        sprites = {name : pg.image.frombuffer(pixels[index*length:(index + 1)*length], (squareSize, squareSize), "RGBA")
+                   for index, name in enumerate(SPRITE_NAMES)}
+    else:
+        sprites = loadPNGs(squareSize, directory)
+        if cachePath is not None:
+            sizes[squareSize] = b"".join(pg.image.tobytes(sprites[name], "RGBA") for name in SPRITE_NAMES)
+            writeCache(cachePath, key, sizes)
+    if pg.display.get_surface() is not None:
+        sprites = {name : sprite.convert_alpha() for name, sprite in sprites.items()}
+    return sprites
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Build the cache of the scaled piece sprites")
+    parser.add_argument("sizes", nargs = "+", type = int, help = "square sizes in pixels")
+    parser.add_argument("-o", "--output", default = CACHE_PATH, help = f"cache file (default : {CACHE_PATH})")
+    args = parser.parse_args(argv)
+
+    key = sourceKey()
+    sizes = readCache(args.output, key)
+    startTime = time.perf_counter()
+    for squareSize in args.sizes:
+        sprites = loadPNGs(squareSize)
+        sizes[squareSize] = b"".join(pg.image.tobytes(sprites[name], "RGBA") for name in SPRITE_NAMES)
+    if not writeCache(args.output, key, sizes):
+        print(f"can't write {args.output}")
+        return 1
+    print(f"{args.output} : square sizes {' '.join(str(size) for size in sorted(sizes))}  "
+          f"{os.path.getsize(args.output)} bytes  built in {time.perf_counter() - startTime:.3f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
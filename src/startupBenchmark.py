@@ -0,0 +1,74 @@
+"""
+    Measures the cold start of the game : every run is a new Python process that imports chessMain and plays until its
+    first frame is on the screen, as when the game is launched. The time is split into starting the interpreter,
+    importing the modules and setting up the window up to the first frame, and every run is made with the sprite cache
+    and with the PNGs (SPRITE_CACHE None) to show what the cache saves.
+
+    python startupBenchmark.py                 10 runs of each
+    python startupBenchmark.py -n 30 --headless   without a window (SDL dummy video driver), for servers and CI
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+SOURCE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RUNS = 10
+PHASES = ["interpreter", "imports", "first frame", "total"]
+
+# run by every child process, prints when each phase ended (time.time, which is the same clock in all processes)
+CHILD = """
+import time
+started = time.time()
+import json, sys
+import chessMain
+imported = time.time()
+firstFrame = []
+drawGameState = chessMain.drawGameState
+def timedDrawGameState(*args, **kwargs):
+    drawGameState(*args, **kwargs)
+    if not firstFrame:
+        firstFrame.append(time.time())
+chessMain.drawGameState = timedDrawGameState
+chessMain.SPRITE_CACHE = None if sys.argv[1] == "png" else chessMain.SPRITE_CACHE
+chessMain.main(maxFrames = 1)
+print(json.dumps([started, imported, firstFrame[0]]))
+"""
+
+
+"""
+    Launch the game once and return the seconds of each of PHASES
+"""
+def timeStartup(mode, environment):
+    launched = time.time()
+    output = subprocess.run([sys.executable, "-c", CHILD, mode], cwd = SOURCE_DIRECTORY, env = environment,
+                            capture_output = True, text = True, check = True).stdout
+    started, imported, firstFrame = json.loads(output.strip().splitlines()[-1])
+    return [started - launched, imported - started, firstFrame - imported, firstFrame - launched]
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Measure the time from launching the game to its first frame")
+    parser.add_argument("-n", "--runs", type = int, default = DEFAULT_RUNS, help = f"launches of each (default : {DEFAULT_RUNS})")
+    parser.add_argument("--headless", action = "store_true", help = "use the SDL dummy video driver, no window")
+    args = parser.parse_args(argv)
+
+    environment = dict(os.environ, PYGAME_HIDE_SUPPORT_PROMPT = "1")
+    if args.headless:
+        environment["SDL_VIDEODRIVER"] = "dummy"
+    print(f"{'':<8}" + "".join(f"{phase:>24}" for phase in PHASES))
+    for mode in ("cache", "png"):
+        timeStartup(mode, environment) # builds the cache if it isn't there, and brings the files in the OS's cache
+        runs = [timeStartup(mode, environment) for _ in range(args.runs)]
+        columns = []
+        for index in range(len(PHASES)):
+            times = [run[index]*1000 for run in runs]
+            columns.append(f"{sum(times) / len(times):>10.1f} ms (min {min(times):>5.1f})")
+        print(f"{mode:<8}" + "".join(f"{column:>24}" for column in columns))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
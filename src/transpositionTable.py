@@ -0,0 +1,67 @@
+"""
+    Transposition table for the search, it remembers what was found about a position (by its zobrist key) so that
+    the same position reached through a different move order doesn't have to be searched again.
+"""
+import sys
+
+# what the stored score means
+EXACT = 0 # the score is the true value of the position
+LOWER_BOUND = 1 # the search failed high, the true value is at least the score
+UPPER_BOUND = 2 # the search failed low, the true value is at most the score
+
+# memory of one slot : the list pointer, the entry tuple (key, depth, score, bound, move, generation) and its 64 bit key
+BYTES_PER_ENTRY = 8 + sys.getsizeof((0,)*6) + sys.getsizeof(1 << 63)
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB = 16):
+        # the number of slots is a power of 2 so the slot of a key is just its lowest bits
+        slots = 1
+        while slots*2*BYTES_PER_ENTRY <= sizeMB*1024*1024:
+            slots *= 2
+        self.mask = slots - 1
+        self.entries = [None]*slots
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        self.entries = [None]*len(self.entries)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    '''
+        Called before every search, entries of older searches are replaced first
+    '''
+    def newSearch(self):
+        self.generation = (self.generation + 1) & 0xFF
+
+    '''
+        Returns the entry (key, depth, score, bound, move, generation) stored for the key or None
+    '''
+    def probe(self, key):
+        self.probes += 1
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        return None
+
+    '''
+        Store a search result, an entry of the current search is only replaced by a search that was at least as deep
+    '''
+    def store(self, key, depth, score, bound, move):
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            if move is None and entry is not None and entry[0] == key:
+                move = entry[4] # keep the best move we already knew for this position
+            self.entries[index] = (key, depth, score, bound, move, self.generation)
+
+    '''
+        Share of the slots in use, in per mill
+    '''
+    def hashfull(self):
+        sample = min(1000, len(self.entries))
+        return sum(1 for i in range(sample) if self.entries[i] is not None)*1000 // sample
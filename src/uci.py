@@ -0,0 +1,252 @@
+"""
+    UCI (Universal Chess Interface, https://www.chessprogramming.org/UCI) front end of the engine over stdin/stdout,
+    so the engine can be played by chess GUIs, match runners or other programs. It never imports pygame.
+
+    python uci.py
+
+    Supported commands : uci, isready, setoption name Hash value <MB>, setoption name BookFile value <path>,
+    setoption name OwnBook value <true | false>, setoption name BitbasePath value <directory>, ucinewgame,
+    position [startpos | fen <fen>] [moves <move> ...], go [depth <n>] [movetime <ms>] [wtime <ms>] [btime <ms>]
+    [winc <ms>] [binc <ms>] [movestogo <n>] [nodes <n>] [infinite], stop, debug [on | off] and quit.
+    The search runs in its own thread so that stop and isready are answered while it is thinking, go infinite
+    sends its bestmove only after stop. Malformed commands are ignored with an info string instead of ending the
+    engine.
+    With debug on every search sends an info line per iteration and every STATS_INFO_INTERVAL seconds, and its
+    statistics (searchStats.SearchStats) as info strings at the end.
+"""
+import sys
+import threading
+
+import bitbases
+import bitboardEngine
+import openingBook
+import searchStats
+import smartMoveFinder
+from smartMoveFinder import MAX_DEPTH, MATE_THRESHOLD, CHECKMATE
+from transpositionTable import TranspositionTable
+
+ENGINE_NAME = "BishopKara"
+ENGINE_AUTHOR = "BishopKara-Chess-Engine contributors"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+DEFAULT_HASH_MB = 16
+DEFAULT_MOVES_TO_GO = 30 # moves the remaining clock time is shared between when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 # seconds kept back for every move to answer in time
+STATS_INFO_INTERVAL = 1 # seconds between the info lines of a search in debug mode
+
+
+"""
+    Seconds to think for a move from the go parameters (in milliseconds), None when the time doesn't matter
+"""
+def thinkingTime(params, whiteToMove):
+    if "movetime" in params:
+        return max(params["movetime"] / 1000 - MOVE_OVERHEAD, 0.01)
+    clock = params.get("wtime" if whiteToMove else "btime")
+    if clock is None:
+        return None
+    increment = params.get("winc" if whiteToMove else "binc", 0) / 1000
+    movesToGo = params.get("movestogo", DEFAULT_MOVES_TO_GO)
+    clock /= 1000
+    budget = clock / max(movesToGo, 1) + increment*0.8
+    return max(min(budget, clock - MOVE_OVERHEAD), 0.01)
+
+
+"""
+    Score of a SearchResult the way UCI wants it : "cp <centipawns>" or "mate <moves>", negative when losing
+"""
+def scoreString(score):
+    if score > MATE_THRESHOLD:
+        return f"mate {(CHECKMATE - score + 1) // 2}"
+    if score < -MATE_THRESHOLD:
+        return f"mate -{(CHECKMATE + score) // 2}"
+    return f"cp {score}"
+
+
+class UCIEngine():
+    def __init__(self, output = sys.stdout):
+        self.output = output
+        self.gs = bitboardEngine.BitboardGameState()
+        self.transpositionTable = TranspositionTable(DEFAULT_HASH_MB)
+        self.searchThread = None
+        self.infinite = False # the running search was started by go infinite and only ends with stop
+        self.stopEvent = threading.Event()
+        self.book = None # openingBook.OpeningBook of the BookFile option
+        self.ownBook = True
+        self.bitbases = bitbases.Bitbases() # the endgame tables made by bitbases.py, if there are any
+        self.debug = False # send the search statistics
+
+    def send(self, line):
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    '''
+        Handle one line of input, returns False when the engine should quit
+    '''
+    def handle(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {DEFAULT_HASH_MB} min 1 max 4096")
+            self.send("option name OwnBook type check default true")
+            self.send("option name BookFile type string default <empty>")
+            self.send(f"option name BitbasePath type string default {bitbases.DEFAULT_DIRECTORY}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.setOption(tokens[1:])
+        elif command == "ucinewgame":
+            self.waitForSearch()
+            self.transpositionTable.clear()
+        elif command == "position":
+            self.waitForSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.waitForSearch()
+            self.go(tokens[1:])
+        elif command == "debug":
+            self.debug = len(tokens) < 2 or tokens[1] == "on"
+        elif command == "stop":
+            self.stopEvent.set()
+            self.waitForSearch()
+        elif command == "quit":
+            self.stopEvent.set()
+            self.waitForSearch()
+            return False
+        return True
+
+    def setOption(self, tokens):
+        if "name" in tokens and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1 : tokens.index("value")])
+            value = " ".join(tokens[tokens.index("value") + 1:])
+            if name.lower() == "hash":
+                try:
+                    sizeMB = max(1, int(value))
+                except ValueError:
+                    self.send(f"info string invalid Hash value {value}")
+                    return
+                self.waitForSearch()
+                self.transpositionTable = TranspositionTable(sizeMB)
+            elif name.lower() == "ownbook":
+                self.ownBook = value.lower() == "true"
+            elif name.lower() == "bitbasepath":
+                self.waitForSearch()
+                self.bitbases.close()
+                try:
+                    self.bitbases = bitbases.Bitbases(value)
+                except (OSError, ValueError) as error:
+                    self.bitbases = bitbases.Bitbases()
+                    self.send(f"info string no bitbases : {error}")
+            elif name.lower() == "bookfile":
+                self.waitForSearch()
+                if self.book is not None:
+                    self.book.close()
+                    self.book = None
+                if value and value != "<empty>":
+                    try:
+                        self.book = openingBook.OpeningBook(value)
+                    except (OSError, ValueError) as error:
+                        self.send(f"info string no opening book : {error}")
+
+    def setPosition(self, tokens):
+        if "moves" in tokens:
+            moves = tokens[tokens.index("moves") + 1:]
+            tokens = tokens[:tokens.index("moves")]
+        else:
+            moves = []
+        if not tokens or tokens[0] not in ("startpos", "fen"):
+            self.send("info string position needs startpos or fen")
+            return
+        if tokens[0] == "startpos":
+            self.gs.loadFEN(START_FEN)
+        else:
+            try:
+                self.gs.loadFEN(" ".join(tokens[1:]))
+            except (ValueError, KeyError, IndexError) as error:
+                self.gs.loadFEN(START_FEN) # rather than a half loaded position
+                self.send(f"info string invalid fen : {error}")
+                return
+            if any(sum(row.count(king) for row in self.gs.board) != 1 for king in ("wK", "bK")):
+                self.gs.loadFEN(START_FEN) # the move generation needs both kings
+                self.send("info string invalid fen : one king per side is needed")
+                return
+        for notation in moves:
+            for move in self.gs.getValidMoves():
+                if move.getChessNotation() == notation:
+                    self.gs.makeMove(move)
+                    break
+            else:
+                self.send(f"info string illegal move {notation}")
+                break
+
+    def go(self, tokens):
+        if self.book is not None and self.ownBook and "infinite" not in tokens:
+            move = self.book.findMove(self.gs, self.gs.getValidMoves())
+            if move is not None:
+                self.send("info string book move")
+                self.send(f"bestmove {move.getChessNotation()}")
+                return
+        params = {}
+        for i in range(len(tokens) - 1):
+            if tokens[i] in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes"):
+                try:
+                    params[tokens[i]] = int(tokens[i + 1])
+                except ValueError:
+                    self.send(f"info string invalid {tokens[i]} {tokens[i + 1]}")
+        depth = params.get("depth", MAX_DEPTH)
+        self.infinite = "infinite" in tokens
+        timeLimit = None if self.infinite else thinkingTime(params, self.gs.whiteToMove)
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target = self.search, daemon = True,
+                                             args = (depth, timeLimit, params.get("nodes"), self.infinite))
+        self.searchThread.start()
+
+    '''
+        Runs in the search thread and answers with bestmove when the search ends, an infinite search that ends by
+        itself (mate found, MAX_DEPTH) holds its bestmove until stop
+    '''
+    def search(self, depth, timeLimit, nodeLimit, infinite = False):
+        stats = searchStats.SearchStats(self.send, STATS_INFO_INTERVAL) if self.debug else None
+        result = smartMoveFinder.searchBestMove(self.gs, self.gs.getValidMoves(), depth, timeLimit,
+                                                self.transpositionTable, nodeLimit, self.stopEvent, self.bitbases, stats)
+        if infinite:
+            self.stopEvent.wait()
+        if result.move is None:
+            self.send("bestmove 0000")
+            return
+        nps = int(result.nodes / result.time) if result.time > 0 else 0
+        self.send(f"info depth {result.depth} score {scoreString(result.score)} nodes {result.nodes} nps {nps} "
+                  f"time {int(result.time*1000)} hashfull {self.transpositionTable.hashfull()} "
+                  f"pv {result.move.getChessNotation()}")
+        self.send(f"bestmove {result.move.getChessNotation()}")
+
+    '''
+        Wait for the running search to end, an infinite one is stopped first (a command that needs the search to be
+        over came without stop) since it would never end
+    '''
+    def waitForSearch(self):
+        if self.searchThread is not None:
+            if self.infinite:
+                self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main(lines = sys.stdin, output = sys.stdout):
+    engine = UCIEngine(output)
+    for line in lines:
+        if not engine.handle(line):
+            break
+    engine.stopEvent.set()
+    engine.waitForSearch()
+    if engine.book is not None:
+        engine.book.close()
+    engine.bitbases.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import bitboardEngine
+import parallelSearch
+from smartMoveFinder import searchBestMove
+from transpositionTable import TranspositionTable
+
+FENS = ["r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+        "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"]
+
+
+def test_one_worker_matches_serial_search():
+    with parallelSearch.ParallelSearch(1) as parallel:
+        for fen in FENS:
+            for depth in (2, 3):
+                gs = bitboardEngine.BitboardGameState()
+                gs.loadFEN(fen)
+                serial = searchBestMove(gs, gs.getValidMoves(), depth, None, TranspositionTable(16))
+                gs.loadFEN(fen)
+                found = parallel.search(gs, gs.getValidMoves(), depth)
+                assert found.move.getChessNotation() == serial.move.getChessNotation()
+                assert found.score == serial.score
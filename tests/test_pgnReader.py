@@ -0,0 +1,46 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import pgnReader
+
+GAME = '[Event "Test {}"]\n[Result "1-0"]\n\n1. e4 e5 2. Qh5 Nc6 3. Bc4 Nf6 4. Qxf7# 1-0\n\n'
+
+
+def writeGames(path, count):
+    games = [GAME.format(index) for index in range(count)]
+    with open(path, "w", newline = "\n") as file:
+        file.write("".join(games))
+    return games
+
+
+def countChunks(path, chunkBytes):
+    total = [0, 0, 0]
+    for chunk in pgnReader.chunksOf([str(path)], chunkBytes):
+        for index, value in enumerate(pgnReader.countChunk(*chunk)):
+            total[index] += value
+    return total
+
+
+def test_chunk_boundaries_on_game_starts(tmp_path):
+    path = tmp_path / "games.pgn"
+    games = writeGames(path, 10)
+    assert len(set(len(game) for game in games)) == 1 # every chunk starts exactly on an [Event line
+    assert countChunks(path, len(games[0])) == [10, 70, 0]
+
+
+def test_chunk_boundaries_inside_games(tmp_path):
+    path = tmp_path / "games.pgn"
+    games = writeGames(path, 10)
+    for chunkBytes in (7, len(games[0]) - 1, len(games[0]) + 1, 3*len(games[0]) // 2):
+        assert countChunks(path, chunkBytes) == [10, 70, 0]
+
+
+def test_en_passant_suffix_is_skipped(tmp_path):
+    path = tmp_path / "games.pgn"
+    path.write_text('[Event "Old"]\n[Result "*"]\n\n1. e4 Nf6 2. e5 d5 3. exd6 e.p. exd6 *\n')
+    with pgnReader.openPGN(str(path)) as lines:
+        game = next(pgnReader.readGames(lines))
+    assert game.moves == ["e4", "Nf6", "e5", "d5", "exd6", "exd6"]
+    assert countChunks(path, 1 << 20) == [1, 6, 0]